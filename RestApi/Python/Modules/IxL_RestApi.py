@@ -10,26 +10,34 @@ import json
 import sys
 import pprint
 import time
-import subprocess
 import os
 import re
 import datetime
+import threading
+
+import restRetry
+import traceEvents
 
 class IxLoadRestApiException(Exception):
     def __init__(self, msg=None):
         showErrorMsg = '\nIxLoadRestApiException error: {0}\n\n'.format(msg)
-        print(showErrorMsg)
-        if Main.enableDebugLogFile:
-            with open(Main.debugLogFile, 'a') as restLogFile:
+        # With several sessions in threads, the error goes to the log file of the session of this thread
+        debugLogFile = getattr(Main.threadLog, 'debugLogFile', Main.debugLogFile)
+        if getattr(Main.threadLog, 'logStdout', True):
+            print(showErrorMsg)
+        if getattr(Main.threadLog, 'enableDebugLogFile', Main.enableDebugLogFile):
+            with open(debugLogFile, 'a') as restLogFile:
                 restLogFile.write(showErrorMsg)
 
 
 class Main():
     debugLogFile = None
     enableDebugLogFile = False
+    threadLog = threading.local()
 
     def __init__(self, apiServerIp, apiServerIpPort, useHttps=False, apiKey=None, verifySsl=False, deleteSession=True,
-                 osPlatform='windows', generateRestLogFile='ixLoadRestApiLog.txt', robotFrameworkStdout=False):
+                 osPlatform='windows', generateRestLogFile='ixLoadRestApiLog.txt', robotFrameworkStdout=False,
+                 traceFile=None, logStdout=True, retryPolicy=None):
         """
         Description
            Initialize the class variables
@@ -45,6 +53,11 @@ class Main():
            generateRestLogFile: <bool>: True = generate a complete log file.
                                 Filename = ixLoadRestApiLog.txt
            robotFrameworkStdout: <bool>: True = Display print statements on stdout.
+           traceFile: <str>: Record a span timeline of the test in Chrome trace-event JSON format.
+                      Open it in chrome://tracing or https://ui.perfetto.dev. None = disabled.
+           logStdout: <bool>: False = Only write to the log file. Ex: For several sessions run in parallel.
+           retryPolicy: <restRetry.RetryPolicy>: Retries the requests rejected on a locked resource, 503 and
+                        connection resets. None = restRetry.defaultPolicy, shared by all the Main objects.
         """
         from requests.exceptions import ConnectionError
         from requests.packages.urllib3.connection import HTTPConnection
@@ -70,8 +83,19 @@ class Main():
         self.verifySsl = verifySsl
         self.generateRestLogFile = generateRestLogFile
         self.robotFrameworkStdout = robotFrameworkStdout
+        self.logStdout = logStdout
         Main.debugLogFile = self.generateRestLogFile
         Main.enableDebugLogFile = self.generateRestLogFile
+        self.tracer = traceEvents.TraceRecorder(traceFile)
+        self.statsSinks = []
+        self.runRecorder = None
+        # Set by abortActiveTest: the run history records the run as aborted
+        self.runAborted = False
+        self.logFollower = None
+        self.activeTestMonitor = None
+        self.retryPolicy = retryPolicy or restRetry.defaultPolicy
+        self.statCatalog = None
+        self.rateLimiter = None
 
         if apiKey:
             self.apiKey = apiKey
@@ -97,46 +121,57 @@ class Main():
             with open(self.restLogFile, 'w') as restLogFile:
                 restLogFile.write('')
 
+        Main.threadLog.debugLogFile = Main.debugLogFile
+        Main.threadLog.enableDebugLogFile = Main.enableDebugLogFile
+        Main.threadLog.logStdout = logStdout
+
     # CONNECT
     def connect(self, ixLoadVersion=None, sessionId=None, timeout=90):
         """
         For new session, provide the ixLoadVersion.
         If connecting to an existing session, provide the sessionId
         """
-        self.ixLoadVersion = ixLoadVersion
-
-        # http://10.219.x.x:8080/api/v0/sessions
-        if sessionId is None:
-            response = self.post(self.httpHeader+'/api/v0/sessions', data=({'ixLoadVersion': ixLoadVersion}))
-            response = requests.get(self.httpHeader+'/api/v0/sessions', verify=self.verifySsl)
-
-            try:
-                sessionId = response.json()[-1]['sessionId']
-            except:
-                raise IxLoadRestApiException('connect failed. No sessionId created')
-
-        self.sessionId = str(sessionId)
-        self.sessionIdUrl = self.httpHeader+'/api/v0/sessions/'+self.sessionId
-
-        # Start operations
-        if ixLoadVersion is not None:
-            response = self.post(self.sessionIdUrl+'/operations/start')
-
-            self.logInfo('\n\n', timestamp=False)
-            for counter in range(1,90+1):
-                response = self.get(self.sessionIdUrl)
-                currentStatus = response.json()['isActive']
-                self.logInfo('\tCurrentStatus: {0}'.format(currentStatus), timestamp=False)
-                if counter < timeout and currentStatus != True:
-                    self.logInfo('\tWait {0}/{1} seconds'.format(counter, timeout), timestamp=False)
-                    time.sleep(1)
-                    continue
+        with self.tracer.span('connect', ixLoadVersion=ixLoadVersion, sessionId=sessionId):
+            self.ixLoadVersion = ixLoadVersion
+
+            # http://10.219.x.x:8080/api/v0/sessions
+            if sessionId is None:
+                response = self.post(self.httpHeader+'/api/v0/sessions', data=({'ixLoadVersion': ixLoadVersion}))
+
+                # The Location header has the new session. The last session of the list could be the one
+                # created by another script or thread at the same time.
+                if response.headers.get('Location'):
+                    sessionId = response.headers['Location'].rstrip('/').split('/')[-1]
+                else:
+                    response = requests.get(self.httpHeader+'/api/v0/sessions', verify=self.verifySsl)
+
+                    try:
+                        sessionId = response.json()[-1]['sessionId']
+                    except:
+                        raise IxLoadRestApiException('connect failed. No sessionId created')
+
+            self.sessionId = str(sessionId)
+            self.sessionIdUrl = self.httpHeader+'/api/v0/sessions/'+self.sessionId
+
+            # Start operations
+            if ixLoadVersion is not None:
+                response = self.post(self.sessionIdUrl+'/operations/start')
+
+                self.logInfo('\n\n', timestamp=False)
+                for counter in range(1,90+1):
+                    response = self.get(self.sessionIdUrl)
+                    currentStatus = response.json()['isActive']
+                    self.logInfo('\tCurrentStatus: {0}'.format(currentStatus), timestamp=False)
+                    if counter < timeout and currentStatus != True:
+                        self.logInfo('\tWait {0}/{1} seconds'.format(counter, timeout), timestamp=False)
+                        time.sleep(1)
+                        continue
 
-                if counter < timeout and currentStatus == True:
-                    break
+                    if counter < timeout and currentStatus == True:
+                        break
 
-                if counter == timeout and currentStatus != True:
-                    raise IxLoadRestApiException('New session ID failed to become active')
+                    if counter == timeout and currentStatus != True:
+                        raise IxLoadRestApiException('New session ID failed to become active')
 
     def logInfo(self, msg, end='\n', timestamp=True):
         """
@@ -154,7 +189,8 @@ class Main():
             # No timestamp and no newline are mainly for verifying states and status
             msg = msg
 
-        print('{0}'.format(msg), end=end)
+        if self.logStdout:
+            print('{0}'.format(msg), end=end)
         if self.generateRestLogFile != False:
             with open(self.restLogFile, 'a') as restLogFile:
                 restLogFile.write(msg+end)
@@ -185,7 +221,8 @@ class Main():
             # No timestamp and no newline are mainly for verifying states and status
             msg = '\nError: {0}'.format(msg)
 
-        print('{0}'.format(msg), end=end)
+        if self.logStdout:
+            print('{0}'.format(msg), end=end)
         if self.generateRestLogFile:
             with open(self.restLogFile, 'a') as restLogFile:
                 restLogFile.write('Error: '+msg+end)
@@ -193,6 +230,66 @@ class Main():
         if self.robotFrameworkStdout:
             self.robotStdout.log_to_console(msg)
 
+    def logRetry(self, method, url, reason, attempt, delay):
+        """
+        Description
+           Called by the retry policy before it sends a request again.
+        """
+        self.logInfo('{0} {1}: {2}. Retry {3}/{4} in {5:.1f} secs'.format(
+            method, url, reason, attempt, self.retryPolicy.maxRetries, delay))
+        self.tracer.instant('http retry', category='http', method=method, url=url, reason=reason, attempt=attempt)
+
+    def retryMetrics(self):
+        """
+        Description
+           The retry counters of the retry policy of this object. See restRetry.RetryPolicy.metrics.
+        """
+        return self.retryPolicy.metrics()
+
+    def throttle(self, method):
+        """
+        Description
+           Wait for a token of the rate limiter before a request. See enableRateLimiter.
+        """
+        if self.rateLimiter:
+            waited = self.rateLimiter.acquire(method)
+            if waited:
+                self.tracer.instant('throttled', category='http', method=method, seconds=waited)
+
+    def sendRequest(self, method, restApi, **kwargs):
+        """
+        Description
+           Send one HTTP request after waiting for the rate limiter. One attempt of the retry policy.
+        """
+        self.throttle(method)
+        return requests.request(method, restApi, verify=self.verifySsl, **kwargs)
+
+    def enableRateLimiter(self, pollRate=10, pollBurst=20, mutateRate=2, mutateBurst=5, stateDir=None):
+        """
+        Description
+           Limit the request rate to the gateway, shared by all the scripts on this host that
+           enable it for the same gateway. See rateLimiter.py.
+
+        Parameters
+           pollRate: <float>: GET requests per second. None = No limit.
+           pollBurst: <int>: The amount of GET requests that can be sent at once after an idle time.
+           mutateRate: <float>: POST, PATCH and DELETE requests per second. None = No limit.
+           mutateBurst: <int>: The amount of mutating requests that can be sent at once.
+           stateDir: <str>: The folder of the shared state files. None = The temp folder.
+
+        Return
+           The rateLimiter.RateLimiter. Its metrics() has the time spent throttled.
+        """
+        import rateLimiter
+
+        try:
+            self.rateLimiter = rateLimiter.RateLimiter(self.httpHeader.split('://')[-1], pollRate=pollRate, pollBurst=pollBurst,
+                                                       mutateRate=mutateRate, mutateBurst=mutateBurst, stateDir=stateDir)
+        except rateLimiter.RateLimiterException as errMsg:
+            raise IxLoadRestApiException('enableRateLimiter: {0}'.format(errMsg))
+
+        return self.rateLimiter
+
     def get(self, restApi, data={}, silentMode=False, ignoreError=False):
         """
         Description
@@ -207,18 +304,20 @@ class Main():
         if silentMode is False:
             self.logInfo('\n\tGET: {0}\n\tHEADERS: {1}'.format(restApi, self.jsonHeader))
 
-        try:
-            response = requests.get(restApi, headers=self.jsonHeader, verify=self.verifySsl)
-            if silentMode is False:
-                self.logInfo('\tSTATUS CODE: %s' % response.status_code, timestamp=False)
+        with self.tracer.span('GET', category='http', url=restApi):
+            try:
+                response = self.retryPolicy.call('GET', lambda: self.sendRequest('GET', restApi, headers=self.jsonHeader),
+                                                 url=restApi, onRetry=self.logRetry)
+                if silentMode is False:
+                    self.logInfo('\tSTATUS CODE: %s' % response.status_code, timestamp=False)
 
-            if not str(response.status_code).startswith('2'):
-                if ignoreError == False:
-                    raise IxLoadRestApiException('http GET error:{0}\n'.format(response.text))
-            return response
+                if not str(response.status_code).startswith('2'):
+                    if ignoreError == False:
+                        raise IxLoadRestApiException('http GET error:{0}\n'.format(response.text))
+                return response
 
-        except requests.exceptions.RequestException as errMsg:
-            raise IxLoadRestApiException('http GET error: {0}\n'.format(errMsg))
+            except requests.exceptions.RequestException as errMsg:
+                raise IxLoadRestApiException('http GET error: {0}\n'.format(errMsg))
 
     def post(self, restApi, data={}, headers=None, silentMode=False, ignoreError=False):
         """
@@ -243,24 +342,26 @@ class Main():
         if silentMode == False:
             self.logInfo('\n\tPOST: {0}\n\tDATA: {1}\n\tHEADERS: {2}'.format(restApi, data, self.jsonHeader))
 
-        try:
-            response = requests.post(restApi, data=data, headers=self.jsonHeader, verify=self.verifySsl)
-            # 200 or 201
-            if silentMode == False:
-                self.logInfo('\tSTATUS CODE: %s' % response.status_code, timestamp=False)
+        with self.tracer.span('POST', category='http', url=restApi):
+            try:
+                response = self.retryPolicy.call('POST', lambda: self.sendRequest('POST', restApi, data=data, headers=self.jsonHeader),
+                                                 url=restApi, onRetry=self.logRetry)
+                # 200 or 201
+                if silentMode == False:
+                    self.logInfo('\tSTATUS CODE: %s' % response.status_code, timestamp=False)
 
-            if not str(response.status_code).startswith('2'):
-                if ignoreError == False:
-                    raise IxLoadRestApiException('http POST error: {0}\n'.format(response.text))
+                if not str(response.status_code).startswith('2'):
+                    if ignoreError == False:
+                        raise IxLoadRestApiException('http POST error: {0}\n'.format(response.text))
 
-            # Change it back to the original json header
-            if headers != None:
-                self.jsonHeader = originalJsonHeader
+                # Change it back to the original json header
+                if headers != None:
+                    self.jsonHeader = originalJsonHeader
 
-            return response
+                return response
 
-        except requests.exceptions.RequestException as errMsg:
-            raise IxLoadRestApiException('http POST error: {0}\n'.format(errMsg))
+            except requests.exceptions.RequestException as errMsg:
+                raise IxLoadRestApiException('http POST error: {0}\n'.format(errMsg))
 
     def patch(self, restApi, data={}, silentMode=False):
         """
@@ -276,17 +377,19 @@ class Main():
         if silentMode == False:
             self.logInfo('\n\tPATCH: {0}\n\tDATA: {1}\n\tHEADERS: {2}'.format(restApi, data, self.jsonHeader))
 
-        try:
-            response = requests.patch(restApi, data=json.dumps(data), headers=self.jsonHeader, verify=self.verifySsl)
-            if silentMode == False:
-                self.logInfo('\tSTATUS CODE: %s' % response.status_code, timestamp=False)
-
-            if not str(response.status_code).startswith('2'):
-                self.logError('Patch error:')
-                raise IxLoadRestApiException('http PATCH error: {0}\n'.format(response.text))
-            return response
-        except requests.exceptions.RequestException as errMsg:
-            raise IxLoadRestApiException('http PATCH error: {0}\n'.format(errMsg))
+        with self.tracer.span('PATCH', category='http', url=restApi):
+            try:
+                response = self.retryPolicy.call('PATCH', lambda: self.sendRequest('PATCH', restApi, data=json.dumps(data), headers=self.jsonHeader),
+                                                 url=restApi, onRetry=self.logRetry)
+                if silentMode == False:
+                    self.logInfo('\tSTATUS CODE: %s' % response.status_code, timestamp=False)
+
+                if not str(response.status_code).startswith('2'):
+                    self.logError('Patch error:')
+                    raise IxLoadRestApiException('http PATCH error: {0}\n'.format(response.text))
+                return response
+            except requests.exceptions.RequestException as errMsg:
+                raise IxLoadRestApiException('http PATCH error: {0}\n'.format(errMsg))
 
     def delete(self, restApi, data={}, headers=None, silentMode=False):
         """
@@ -306,59 +409,63 @@ class Main():
         if silentMode == False:
             self.logInfo('\n\tDELETE: {0}\n\tDATA: {1}\n\tHEADERS: {2}'.format(restApi, data, self.jsonHeader))
 
-        try:
-            response = requests.delete(restApi, data=json.dumps(data), headers=self.jsonHeader, verify=self.verifySsl)
-            self.logInfo('\tSTATUS CODE: %s' % response.status_code, timestamp=False)
+        with self.tracer.span('DELETE', category='http', url=restApi):
+            try:
+                response = self.retryPolicy.call('DELETE', lambda: self.sendRequest('DELETE', restApi, data=json.dumps(data), headers=self.jsonHeader),
+                                                 url=restApi, onRetry=self.logRetry)
+                self.logInfo('\tSTATUS CODE: %s' % response.status_code, timestamp=False)
 
-            if not str(response.status_code).startswith('2'):
-                raise IxLoadRestApiException('http DELETE error: {0}\n'.format(response.text))
-            return response
-        except requests.exceptions.RequestException as errMsg:
-            raise IxLoadRestApiException('http DELETE error: {0}\n'.format(errMsg))
+                if not str(response.status_code).startswith('2'):
+                    raise IxLoadRestApiException('http DELETE error: {0}\n'.format(response.text))
+                return response
+            except requests.exceptions.RequestException as errMsg:
+                raise IxLoadRestApiException('http DELETE error: {0}\n'.format(errMsg))
 
 
     # VERIFY OPERATION START
     def verifyStatus(self, url, timeout=120):
-        timeout = timeout
-        for counter in range(1,timeout+1):
-            response = self.get(url)
-
-            #print('\n\tverifyStatus:', response.json())
-            if 'status' in response.json():
-                currentStatus = response.json()['status']
-            elif 'state' in response.json():
-                currentStatus = response.json()['state']
-                if currentStatus == 'Error':
-                    errorMessage = 'Operation failed'
-                    if 'message' in response.json():
-                        errorMessage = response.json()['message']
-                        raise IxLoadRestApiException('verifyStatus failed: {}'.format(errorMessage))
-            else:
-                raise IxLoadRestApiException('verifyStatus failed: No status and no state in json response')
-
-            if currentStatus == 'Error' and 'error' in response.json():
-                errorMessage = response.json()['error']
-                raise IxLoadRestApiException('Operation failed: {0}'.format(errorMessage))
-
-            if counter < timeout and currentStatus not in ['Successful']:
-                self.logInfo('\tCurrent status: {0}. Wait {1}/{2} seconds...'.format(currentStatus, counter, timeout),
-                             timestamp=False)
-                time.sleep(1)
-                continue
+        with self.tracer.span('verifyStatus', url=url, timeout=timeout):
+            timeout = timeout
+            for counter in range(1,timeout+1):
+                response = self.get(url)
+
+                #print('\n\tverifyStatus:', response.json())
+                if 'status' in response.json():
+                    currentStatus = response.json()['status']
+                elif 'state' in response.json():
+                    currentStatus = response.json()['state']
+                    if currentStatus == 'Error':
+                        errorMessage = 'Operation failed'
+                        if 'message' in response.json():
+                            errorMessage = response.json()['message']
+                            raise IxLoadRestApiException('verifyStatus failed: {}'.format(errorMessage))
+                else:
+                    raise IxLoadRestApiException('verifyStatus failed: No status and no state in json response')
+
+                if currentStatus == 'Error' and 'error' in response.json():
+                    errorMessage = response.json()['error']
+                    raise IxLoadRestApiException('Operation failed: {0}'.format(errorMessage))
+
+                if counter < timeout and currentStatus not in ['Successful']:
+                    self.logInfo('\tCurrent status: {0}. Wait {1}/{2} seconds...'.format(currentStatus, counter, timeout),
+                                 timestamp=False)
+                    time.sleep(1)
+                    continue
  
-            if counter < timeout and currentStatus in ['Successful']:
-                return
+                if counter < timeout and currentStatus in ['Successful']:
+                    return
 
-            if counter == timeout and currentStatus not in ['Successful']:
-                raise IxLoadRestApiException('Operation failed: {0}'.format(url))
+                if counter == timeout and currentStatus not in ['Successful']:
+                    raise IxLoadRestApiException('Operation failed: {0}'.format(url))
 
     # LOAD CONFIG FILE
     def loadConfigFile(self, rxfFile):
-        loadTestUrl = self.sessionIdUrl + '/ixLoad/test/operations/loadTest/'
-        response = self.post(loadTestUrl, data={'fullPath': rxfFile})
-        # http://10.219.117.103:8080/api/v0/sessions/42/ixLoad/test/operations/loadTest/0
-        operationsId = response.headers['Location']
-        status = self.verifyStatus(self.httpHeader+operationsId)
+        with self.tracer.span('loadConfigFile', rxfFile=rxfFile):
+            loadTestUrl = self.sessionIdUrl + '/ixLoad/test/operations/loadTest/'
+            response = self.post(loadTestUrl, data={'fullPath': rxfFile})
+            # http://10.219.117.103:8080/api/v0/sessions/42/ixLoad/test/operations/loadTest/0
+            operationsId = response.headers['Location']
+            status = self.verifyStatus(self.httpHeader+operationsId)
 
     def importCrfFile(self, crfFile, localCrfFileToUpload=None):
         """
@@ -413,14 +520,10 @@ class Main():
         status = self.verifyStatus(self.httpHeader+operationsId)
 
     def deleteImportConfigFolder(self):
-        try:
-            sshClient = ConnectSSH(host, username, password)
-            sshClient.ssh()
-            stdout = sshClient.enterCommand('rm -rf /mnt/ixload-share/Results/17-12-20-089862')
-            print(stdout)
-            
-        except paramiko.ssh_exception.NoValidConnectionsError as errMsg:
-            print('\nSSH connection failed: {}'.format(errMsg))
+        """
+        Delete the timestamp folder that importConfig created on the gateway server for the .crf file.
+        """
+        self.deleteFolder(filePath=self.importConfigPath)
 
     def configLicensePreferences(self, licenseServerIp, licenseModel='Subscription Mode'):
         """
@@ -469,6 +572,7 @@ class Main():
     def waitForChassisIpToConnect(self, locationUrl):
         timeout = 60
         for counter in range(1,timeout+1):
+            # The retry policy of get() gives up on a locked resource sooner than this 60 second loop
             response = self.get(self.httpHeader+locationUrl, ignoreError=True)
             print('\nwaitForChassisIpToConnect response:', response.json())
             if 'status' in response.json() and 'Request made on a locked resource' in response.json()['status']:
@@ -551,54 +655,76 @@ class Main():
            }
         '''
 
-        # Assign Chassis
-        chassisIp = communityPortListDict['chassisIp']
-        newChassisId, locationUrl = self. addNewChassis(chassisIp)
-        self.logInfo('assignChassisAndPorts: To new chassis: %s' % locationUrl, timestamp=False)
+        with self.tracer.span('assignChassisAndPorts', chassisIp=communityPortListDict.get('chassisIp')):
+            # Assign Chassis
+            chassisIp = communityPortListDict['chassisIp']
+            newChassisId, locationUrl = self. addNewChassis(chassisIp)
+            self.logInfo('assignChassisAndPorts: To new chassis: %s' % locationUrl, timestamp=False)
+
+            # Assign Ports
+            communityListUrl = self.sessionIdUrl+'/ixLoad/test/activeTest/communityList/'
+            communityList = self.get(communityListUrl)
+
+            self.refreshConnection(locationUrl=locationUrl)
+            self.waitForChassisIpToConnect(locationUrl=locationUrl)
+
+            failedToAddList = []
+            communityNameNotFoundList = []
+            for eachCommunity in communityList.json():
+                currentCommunityObjectId = str(eachCommunity['objectID'])
+                currentCommunityName = eachCommunity['name']
+                if currentCommunityName not in communityPortListDict:
+                    self.logInfo('\nNo such community name found in your stated list: %s' % currentCommunityName)
+                    self.logInfo('\tYour stated list:', communityPortListDict)
+                    communityNameNotFoundList.append(currentCommunityName)
+                    self.logInfo('\nassignChassisAndPorts failed: communityNameNotFound: %s' % currentCommunityName)
+
+                if communityNameNotFoundList == []:
+                    for eachTuplePort in communityPortListDict[currentCommunityName]:
+                        # Going to ignore user input chassisId. When calling addNewChassis(),
+                        # it will verify for chassisIp exists. If exists, it will return the
+                        # right chassisID.
+                        cardId,portId = eachTuplePort
+                        params = {"chassisId":int(newChassisId), "cardId":cardId, "portId":portId}
+                        url = communityListUrl+str(currentCommunityObjectId)+'/network/portList'
+                        self.logInfo('assignChassisAndPorts URL: %s' % url, timestamp=False)
+                        self.logInfo('assignChassisAndPorts Params: %s' % json.dumps(params), timestamp=False)
+                        response = self.post(url, data=params, ignoreError=True)
+                        if response.status_code != 201:
+                            portAlreadyConnectedMatch = re.search('.*has already been assigned.*', response.json()['error'])
+                            if portAlreadyConnectedMatch:
+                                self.logInfo('%s/%s is already assigned' % (cardId,portId), timestamp=False)
+                            else:
+                                failedToAddList.append((newChassisId,cardId,portId))
+                                self.logInfo('\nassignChassisAndPorts failed: %s' % response.text)
+
+            if communityNameNotFoundList != []:
+                raise IxLoadRestApiException
+            if failedToAddList != []:
+                if self.deleteSession:
+                    self.abortActiveTest()
+                raise IxLoadRestApiException('Failed to add ports to chassisIp %s: %s:' % (chassisIp, failedToAddList))
+
+    def getAssignedPorts(self):
+        '''
+        Description
+           The chassis ports assigned to the communities of the loaded config,
+           either by assignChassisAndPorts or saved in the config file.
+
+        Return
+           {(chassisIp, cardId, portId), ...}
+        '''
+        chassisListUrl = self.sessionIdUrl+'/ixLoad/chassisChain/chassisList'
+        chassisIps = dict((chassis['id'], chassis['name']) for chassis in self.get(chassisListUrl, silentMode=True).json())
 
-        # Assign Ports
         communityListUrl = self.sessionIdUrl+'/ixLoad/test/activeTest/communityList/'
-        communityList = self.get(communityListUrl)
+        assignedPorts = set()
+        for eachCommunity in self.get(communityListUrl, silentMode=True).json():
+            url = communityListUrl+str(eachCommunity['objectID'])+'/network/portList'
+            for eachPort in self.get(url, silentMode=True).json():
+                assignedPorts.add((chassisIps.get(eachPort['chassisId'], eachPort['chassisId']), eachPort['cardId'], eachPort['portId']))
 
-        self.refreshConnection(locationUrl=locationUrl)
-        self.waitForChassisIpToConnect(locationUrl=locationUrl)
-
-        failedToAddList = []
-        communityNameNotFoundList = []
-        for eachCommunity in communityList.json():
-            currentCommunityObjectId = str(eachCommunity['objectID'])
-            currentCommunityName = eachCommunity['name']
-            if currentCommunityName not in communityPortListDict:
-                self.logInfo('\nNo such community name found in your stated list: %s' % currentCommunityName)
-                self.logInfo('\tYour stated list:', communityPortListDict)
-                communityNameNotFoundList.append(currentCommunityName)
-                self.logInfo('\nassignChassisAndPorts failed: communityNameNotFound: %s' % currentCommunityName)
-
-            if communityNameNotFoundList == []:
-                for eachTuplePort in communityPortListDict[currentCommunityName]:
-                    # Going to ignore user input chassisId. When calling addNewChassis(),
-                    # it will verify for chassisIp exists. If exists, it will return the
-                    # right chassisID.
-                    cardId,portId = eachTuplePort
-                    params = {"chassisId":int(newChassisId), "cardId":cardId, "portId":portId}
-                    url = communityListUrl+str(currentCommunityObjectId)+'/network/portList'
-                    self.logInfo('assignChassisAndPorts URL: %s' % url, timestamp=False)
-                    self.logInfo('assignChassisAndPorts Params: %s' % json.dumps(params), timestamp=False)
-                    response = self.post(url, data=params, ignoreError=True)
-                    if response.status_code != 201:
-                        portAlreadyConnectedMatch = re.search('.*has already been assigned.*', response.json()['error'])
-                        if portAlreadyConnectedMatch:
-                            self.logInfo('%s/%s is already assigned' % (cardId,portId), timestamp=False)
-                        else:
-                            failedToAddList.append((newChassisId,cardId,portId))
-                            self.logInfo('\nassignChassisAndPorts failed: %s' % response.text)
-
-        if communityNameNotFoundList != []:
-            raise IxLoadRestApiException
-        if failedToAddList != []:
-            if self.deleteSession:
-                self.abortActiveTest()
-            raise IxLoadRestApiException('Failed to add ports to chassisIp %s: %s:' % (chassisIp, failedToAddList))
+        return assignedPorts
 
     # ENABLE FORCE OWNERSHIP
     def enableForceOwnership(self):
@@ -627,32 +753,290 @@ class Main():
         .../configuredStats/15 will only enable the stat with object id = 15 
         .../configuredStats?filter="objectID le 10" will only enable stats with object id s lower or equal to 10 
         .../configuredStats?filter="caption eq FTP" will only enable stats that contain FTP in their caption name
+
+        The "caption eq" filters are evaluated locally on one GET of configuredStats, with the contain
+        match of the server, and the stats found are enabled in the fewest PATCH requests. A stat name
+        not found locally is sent to the server filter. configureStats() also disables the other stats.
         '''
+        import statConfig
+
+        if not configuredStats.startswith('http'):
+            configuredStats = self.sessionIdUrl + '/' + configuredStats.lstrip('/')
+
+        stats = self.get(configuredStats, silentMode=True).json()
+        enabledIds = set(stat['objectID'] for stat in stats if stat.get('enabled'))
+        notFound = []
         for eachStatName in statNameList:
-            configuredStats = configuredStats + '?filter="caption eq %s"' % eachStatName
-            self.logInfo('\nEnableConfiguredStats: %s' % configuredStats)
-            response = self.patch(configuredStats, data={"enabled": True})
-
-    def showTestLogs(self):
-        testLogUrl = self.sessionIdUrl+'/ixLoad/test/logs'
-        currentObjectId = 0
-        while True:
-            response = self.get(testLogUrl)
-            for eachLogEntry in response.json():
-                if currentObjectId != eachLogEntry['objectID']:
-                    currentObjectId = eachLogEntry['objectID']
-                    self.logInfo('\t{time}: Severity:{severity} ModuleName:{2} {3}'.format(eachLogEntry['timeStamp'],
-                                                                                    eachLogEntry['severity'],
-                                                                                    eachLogEntry['moduleName'],
-                                                                                           eachLogEntry['message']), 
-                                 timestamp=False)
+            # The server "caption eq" matches the captions that contain the stat name
+            found = [stat for stat in stats if eachStatName in str(stat.get('caption', ''))]
+            if found:
+                enabledIds.update(stat['objectID'] for stat in found)
+            else:
+                notFound.append(eachStatName)
+
+        patches = [(statConfig.patchUrl(configuredStats, objectId, filterQuery), enabled)
+                   for objectId, filterQuery, enabled in statConfig.planPatches(stats, enabledIds)]
+        # After the plan, which only knows the stats of the GET
+        patches.extend((configuredStats + '?filter="caption eq %s"' % eachStatName, True) for eachStatName in notFound)
+
+        for url, enabled in patches:
+            self.logInfo('\nEnableConfiguredStats: %s' % url)
+            response = self.patch(url, data={"enabled": enabled})
+
+    # GET THE STAT CATALOG
+    def getStatCatalog(self, statSources=None):
+        """
+        Description
+           The configuredStats of each stat source: the objectID, caption and enabled state of each stat.
+
+        Parameters
+           statSources: <list>: Only these stat sources. None = All the stat sources of getStatNames().
+                        The stat sources that do not exist are left out.
+
+        Return
+           {statSource: [{'objectID', 'caption', 'enabled'}, ...]}
+        """
+        statsUrl = self.sessionIdUrl+'/ixLoad/stats'
+        catalog = {}
+        for statSource in self.getStatSources():
+            if statSources is None or statSource in statSources:
+                catalog[statSource] = self.get('{0}/{1}/configuredStats'.format(statsUrl, statSource), silentMode=True).json()
+
+        return catalog
+
+    def getStatSources(self):
+        """
+        Description
+           The names of the stat sources of the loaded config. Ex: ['HTTPClient', 'HTTPServer']
+        """
+        response = self.get(self.sessionIdUrl+'/ixLoad/stats', silentMode=True)
+        return [eachStatName['href'].rstrip('/').split('/')[-1] for eachStatName in response.json()['links']]
+
+    def crawlTree(self, root='activeTest', maxWorkers=8, maxDepth=None, jsonFile=None):
+        """
+        Description
+           Fetch a whole object tree of the session breadth-first, with concurrent GETs, into a
+           local JSON mirror. See restCrawler.py to search and diff the mirrors.
+
+        Parameters
+           root: <str>: 'activeTest', 'chassisChain', or the URL of any object or list of the session.
+           maxWorkers: <int>: The amount of GETs in flight at the same time.
+           maxDepth: <int>: Do not crawl deeper than this many links below the root. None = No limit.
+           jsonFile: <str>: Write the mirror to this file.
+
+        Return
+           The mirror: {'root', 'nodes': {url: node}, 'errors': {url: error}, 'requests', 'seconds'}
+        """
+        import restCrawler
+
+        roots = {'activeTest': self.sessionIdUrl+'/ixLoad/test/activeTest', 'chassisChain': self.sessionIdUrl+'/ixLoad/chassisChain'}
+        crawler = restCrawler.TreeCrawler(lambda url: self.get(url, silentMode=True).json(), baseUrl=self.httpHeader,
+                                          maxWorkers=maxWorkers, maxDepth=maxDepth)
+        mirror = crawler.crawl(roots.get(root, root))
+        self.logInfo('crawlTree: {0} objects in {1} requests and {2} seconds. {3} errors'.format(
+            len(mirror['nodes']), mirror['requests'], mirror['seconds'], len(mirror['errors'])))
+
+        if jsonFile:
+            restCrawler.writeMirror(mirror, jsonFile)
+
+        return mirror
+
+    def getObjectModel(self, root='activeTest', maxWorkers=8):
+        """
+        Description
+           A local copy of an object tree of the session to edit as Python attributes.
+           Nothing is sent until commit(), which sends only the changed fields, concurrently.
+           See restModel.py.
+
+        Parameters
+           root: <str>: 'activeTest', 'chassisChain', or the URL of any object or list of the session.
+           maxWorkers: <int>: The amount of requests in flight at the same time, to crawl and to commit.
+
+        Usage
+           model = restObj.getObjectModel()
+           model.root.communityList[0].activityList[0].enable = False
+           model.commit()
+
+        Return
+           The restModel.ObjectModel
+        """
+        import restModel
+
+        def send(method, url, payload):
+            if method == 'POST':
+                return self.post(url, data=payload, silentMode=True)
+            if method == 'PATCH':
+                return self.patch(url, data=payload, silentMode=True)
+            return self.delete(url, data=payload, silentMode=True)
+
+        return restModel.ObjectModel(self.crawlTree(root, maxWorkers=maxWorkers), send, maxWorkers=maxWorkers)
+
+    def getIxLoadVersion(self):
+        """
+        Description
+           The IxLoad version of the session. From connect(), else from the session.
+        """
+        if not getattr(self, 'ixLoadVersion', None):
+            self.ixLoadVersion = self.get(self.sessionIdUrl, silentMode=True).json().get('ixLoadVersion')
+            if not self.ixLoadVersion:
+                raise IxLoadRestApiException('getIxLoadVersion: The session has no ixLoadVersion')
+
+        return self.ixLoadVersion
+
+    def enableStatCatalog(self, cacheDir=None):
+        """
+        Description
+           Keep the stat sources and captions of this IxLoad version in an on-disk catalog.
+           Only the stat sources of the loaded config that are not in the catalog yet are
+           requested from the gateway. Call it after loading the config.
+
+           pollStats and configureStats then suggest the closest captions for misspelled ones.
+           See statCatalog.py to validate a statsDict before creating a session.
+
+        Parameters
+           cacheDir: <str>: The folder of the catalog files. None = ~/.ixLoadStatCatalog
+
+        Return
+           The statCatalog.StatCatalog
+        """
+        import statCatalog
+
+        self.statCatalog = statCatalog.StatCatalog(self.getIxLoadVersion(), cacheDir=cacheDir)
+        missingSources = self.statCatalog.missingSources(self.getStatSources())
+        if missingSources:
+            self.statCatalog.update(self.getStatCatalog(missingSources))
+            self.logInfo('enableStatCatalog: Added the stat sources {0} to {1}'.format(missingSources, self.statCatalog.catalogFile))
+
+        return self.statCatalog
+
+    def validateStatsDict(self, statsDict):
+        """
+        Description
+           Log the unknown stat sources and captions of a statsDict with the closest matches.
+           Requires enableStatCatalog().
+
+        Return
+           [(statSource, caption, suggestions), ...]. See statCatalog.StatCatalog.validate.
+        """
+        import statCatalog
+
+        problems = self.statCatalog.validate(statsDict)
+        for problem in problems:
+            self.logError(statCatalog.problemText(*problem))
+
+        return problems
+
+    # CONFIGURE STATS
+    def configureStats(self, statsDict, disableOthers=True, raiseOnUnknown=True, dryRun=False):
+        """
+        Description
+           Enable the stats of statsDict in the fewest PATCH requests, and disable the other stats
+           of their stat sources. Less stats enabled = less load on the gateway during the run.
+
+           The captions are verified against the configuredStats of each stat source first, so a
+           misspelled caption is reported before the test runs. Call it before runTraffic().
+
+           The captions match exactly, as in pollStats. With disableOthers, the stats that only contain
+           a caption of statsDict are disabled: enableConfiguredStats() enables those too.
+
+        Parameters
+           statsDict: <dict>: {statSource: [caption, ...]}. The format of pollStats.
+                      Ex: {'HTTPClient': ['HTTP Transactions', 'HTTP Simulated Users']}
+           disableOthers: <bool>: True = Disable the other stats of these stat sources.
+                          False = Only enable the stats of statsDict.
+           raiseOnUnknown: <bool>: True = Raise before any PATCH if a stat source or a caption is unknown.
+                           False = Log the unknown ones and configure the others.
+           dryRun: <bool>: True = Return the plan without sending it.
+
+        Return
+           {'patches': [(url, {'enabled': True|False}), ...], 'unknown': {statSource: [caption, ...]}}
+        """
+        import statCatalog
+        import statConfig
+
+        with self.tracer.span('configureStats'):
+            catalog = self.getStatCatalog(list(statsDict))
+            resolved, unknown = statConfig.resolveStats(catalog, statsDict)
+            if unknown:
+                unknownStats = []
+                for statSource, captions in unknown.items():
+                    if statSource not in catalog:
+                        unknownStats.append(statCatalog.problemText(statSource, None, statCatalog.closeMatches(statSource, list(catalog))))
+                        continue
+
+                    allCaptions = [row['caption'] for row in catalog[statSource]]
+                    unknownStats.extend(statCatalog.problemText(statSource, caption, statCatalog.closeMatches(caption, allCaptions))
+                                        for caption in captions)
+
+                if raiseOnUnknown:
+                    raise IxLoadRestApiException('configureStats: Unknown stats:\n\t{0}'.format('\n\t'.join(unknownStats)))
+                self.logError('configureStats: Ignoring the unknown stats:\n\t{0}'.format('\n\t'.join(unknownStats)))
+
+            patches = []
+            for statSource, captions in resolved.items():
+                if statSource not in catalog:
+                    continue
+
+                enabledIds = set(captions.values())
+                if not disableOthers:
+                    enabledIds.update(row['objectID'] for row in catalog[statSource] if row.get('enabled'))
+
+                configuredStatsUrl = '{0}/ixLoad/stats/{1}/configuredStats'.format(self.sessionIdUrl, statSource)
+                for objectId, filterQuery, enabled in statConfig.planPatches(catalog[statSource], enabledIds):
+                    patches.append((statConfig.patchUrl(configuredStatsUrl, objectId, filterQuery), {'enabled': enabled}))
+
+            self.logInfo('configureStats: {0} PATCH requests for {1} stats'.format(
+                len(patches), sum(len(captions) for captions in resolved.values())))
+
+            if not dryRun:
+                for url, data in patches:
+                    self.patch(url, data=data)
+
+            return {'patches': patches, 'unknown': unknown}
+
+    def showTestLogs(self, severities=None, modules=None, callback=None, bufferSize=1000):
+        """
+        Description
+           Show the test log entries in the background as they are logged.
+           Only the new entries are requested from the gateway, and less often while the log is quiet.
+           Call stopTestLogs() to stop. deleteSessionId() stops it too.
+
+        Parameters
+           severities: <list>: Only show these severities. Ex: ['Error', 'Warning']. None = All.
+           modules: <str>: Only show the entries whose moduleName matches this regex. None = All.
+           callback: Called with each entry instead of showing it.
+           bufferSize: The amount of latest entries kept in memory.
+
+        Return
+           The logFollower.LogFollower. Iterate it for the entries or call entries().
+        """
+        import logFollower
+
+        def showEntry(entry):
+            self.logInfo('\t{0}: Severity:{1} ModuleName:{2} {3}'.format(entry['timeStamp'], entry['severity'],
+                                                                        entry['moduleName'], entry['message']),
+                         timestamp=False)
+
+        self.logFollower = logFollower.LogFollower(self, severities=severities, modules=modules,
+                                                   callback=callback or showEntry, bufferSize=bufferSize)
+        self.logFollower.start()
+        return self.logFollower
+
+    def stopTestLogs(self):
+        """
+        Stop showTestLogs() after showing the entries logged since its last poll.
+        """
+        if self.logFollower:
+            self.logFollower.stop()
+            self.logFollower = None
 
     # RUN TRAFFIC
     def runTraffic(self):
-        runTestUrl = self.sessionIdUrl+'/ixLoad/test/operations/runTest'
-        response = self.post(runTestUrl)
-        operationsId = response.headers['Location']
-        self.verifyStatus(self.httpHeader+operationsId, timeout=300)
+        with self.tracer.span('runTraffic'):
+            runTestUrl = self.sessionIdUrl+'/ixLoad/test/operations/runTest'
+            response = self.post(runTestUrl)
+            operationsId = response.headers['Location']
+            self.verifyStatus(self.httpHeader+operationsId, timeout=300)
         #return operationsId.split('/')[-1] ;# Return the number only
 
     # GET TEST STATUS
@@ -667,18 +1051,54 @@ class Main():
 
     def getActiveTestCurrentState(self, silentMode=False):
         # currentState: Configuring, Starting Run, Running, Stopping Run, Cleaning, Unconfigured 
+        # The state monitored by startActiveTestMonitor() costs no request
+        if self.activeTestMonitor and self.activeTestMonitor.is_alive():
+            if self.activeTestMonitor.currentState is None:
+                self.activeTestMonitor.waitForChange(timeout=self.activeTestMonitor.maxInterval)
+            if self.activeTestMonitor.currentState is not None:
+                return self.activeTestMonitor.currentState
+
         url = self.sessionIdUrl+'/ixLoad/test/activeTest'
         response = self.get(url, silentMode=silentMode)
         if response.status_code == 200:
             return response.json()['currentState']
 
+    def startActiveTestMonitor(self, minInterval=0.5, maxInterval=5):
+        """
+        Description
+           Start one background thread that polls the activeTest state of the session for
+           pollStats, waitForActiveTestToUnconfigure, getActiveTestCurrentState and your own
+           subscribers. Started by pollStats and waitForActiveTestToUnconfigure if not yet running.
+           deleteSessionId() stops it.
+
+        Parameters
+           minInterval: <float>: Seconds between two polls while the state is changing.
+           maxInterval: <float>: The longest time between two polls while the state stays the same.
+
+        Return
+           The activeTestMonitor.ActiveTestMonitor. Ex: monitor.subscribe(callback), monitor.stateFuture('Unconfigured')
+        """
+        import activeTestMonitor
+
+        if self.activeTestMonitor is None or not self.activeTestMonitor.is_alive():
+            self.activeTestMonitor = activeTestMonitor.ActiveTestMonitor(self, minInterval=minInterval,
+                                                                         maxInterval=maxInterval)
+            self.activeTestMonitor.start()
+
+        return self.activeTestMonitor
+
+    def stopActiveTestMonitor(self):
+        if self.activeTestMonitor:
+            self.activeTestMonitor.stop()
+            self.activeTestMonitor = None
+
     # GET STATS
     def getStats(self, statUrl):
         response = self.get(statUrl, silentMode=True)
         return response
 
     def pollStats(self, statsDict=None, pollStatInterval=2, csvFile=False,
-                  csvEnableFileTimestamp=False, csvFilePrependName=None):
+                  csvEnableFileTimestamp=False, csvFilePrependName=None, statsSinks=None):
         '''
         sessionIdUrl = http://192.168.70.127:8080/api/v0/sessions/20
 
@@ -710,7 +1130,17 @@ class Main():
 
         csvFilePrependName: To prepend a name of your choice to the csv file for visual identification and if you need 
                             to restart the test, a new csv file will be created. Prepending a name will group the csv files.
+
+        statsSinks: A list of objects with an addStats(statSource, timestamp, statValues) method. Each new timestamp
+                    of each stat source is passed to them once, with all the values the stat source returned.
+                    The sinks in self.statsSinks (Ex: from enableRunHistory) are always included.
         '''
+        statsSinks = self.statsSinks + (statsSinks or [])
+        lastTimestamps = {}
+
+        # Report the misspelled stats now, not at each stat polling tick
+        if statsDict and self.statCatalog and not self.statCatalog.isEmpty():
+            self.validateStatsDict(statsDict)
 
         if csvFile:
             import csv
@@ -738,67 +1168,92 @@ class Main():
                     csvFilesDict[key]['columnNameList'].append(columnNames)
                 csvFilesDict[key]['csvObj'].writerow(csvFilesDict[key]['columnNameList'])
 
-        waitForRunningStatusCounter = 0
-        waitForRunningStatusCounterExit = 30
-        while True:
-            currentState = self.getActiveTestCurrentState(silentMode=True)
-            self.logInfo('ActiveTest current status: %s' % currentState)
-            if currentState == 'Running':
-                if statsDict == None:
-                    time.sleep(1)
-                    continue
-                    
-                # statType:  HTTPClient or HTTPServer (Just a example using HTTP.)
-                # statNameList: transaction success, transaction failures, ...
-                for statType,statNameList in statsDict.items():
-                    self.logInfo('\n%s:' % statType, timestamp=False)
-                    statUrl = self.sessionIdUrl+'/ixLoad/stats/'+statType+'/values'
-                    response = self.getStats(statUrl)
-                    highestTimestamp = 0
-                    # Each timestamp & statnames: values                
-                    for eachTimestamp,valueList in response.json().items():
-                        if eachTimestamp == 'error':
-                            raise IxLoadRestApiException('pollStats error: Probable cause: Misconfigured stat names to retrieve.')
-
-                        if int(eachTimestamp) > highestTimestamp:
-                            highestTimestamp = int(eachTimestamp)
-                    if highestTimestamp == 0:
-                        time.sleep(3)
+        def closeOutputs():
+            # Before each return: the csv files and the sinks keep what was polled
+            if csvFile:
+                for key in statsDict.keys():
+                    csvFilesDict[key]['fileObj'].close()
+
+            for sink in statsSinks:
+                if hasattr(sink, 'flush'):
+                    sink.flush()
+
+        monitor = self.startActiveTestMonitor()
+        with self.tracer.span('pollStats'):
+            waitForRunningStatusCounter = 0
+            waitForRunningStatusCounterExit = 30
+            while True:
+                # The monitor polls slower while the state stays Running. Poll now so that no stats are
+                # read after the run stopped.
+                monitor.refresh(timeout=monitor.maxInterval)
+                currentState = self.getActiveTestCurrentState(silentMode=True)
+                self.logInfo('ActiveTest current status: %s' % currentState)
+                if currentState == 'Running':
+                    if statsDict == None:
+                        monitor.waitForState('Unconfigured', timeout=1, raiseOnTestError=False)
                         continue
+                    
+                    # statType:  HTTPClient or HTTPServer (Just a example using HTTP.)
+                    # statNameList: transaction success, transaction failures, ...
+                    with self.tracer.span('pollStats tick', statSources=list(statsDict.keys())):
+                        for statType,statNameList in statsDict.items():
+                            self.logInfo('\n%s:' % statType, timestamp=False)
+                            statUrl = self.sessionIdUrl+'/ixLoad/stats/'+statType+'/values'
+                            response = self.getStats(statUrl)
+                            highestTimestamp = 0
+                            # Each timestamp & statnames: values                
+                            for eachTimestamp,valueList in response.json().items():
+                                if eachTimestamp == 'error':
+                                    raise IxLoadRestApiException('pollStats error: Probable cause: Misconfigured stat names to retrieve.')
+
+                                if int(eachTimestamp) > highestTimestamp:
+                                    highestTimestamp = int(eachTimestamp)
+
+                            if statsSinks:
+                                statValuesByTimestamp = response.json()
+                                newTimestamps = sorted(int(eachTimestamp) for eachTimestamp in statValuesByTimestamp
+                                                       if int(eachTimestamp) > lastTimestamps.get(statType, -1))
+                                for eachTimestamp in newTimestamps:
+                                    for sink in statsSinks:
+                                        sink.addStats(statType, eachTimestamp, statValuesByTimestamp[str(eachTimestamp)])
+                                if newTimestamps:
+                                    lastTimestamps[statType] = newTimestamps[-1]
+                            if highestTimestamp == 0:
+                                time.sleep(3)
+                                continue
 
-                    if csvFile:
-                        csvFilesDict[statType]['rowValueList'] = []
-
-                    # Get the interested stat names only
-                    for statName in statNameList:
-                        if statName in response.json()[str(highestTimestamp)]:
-                            statValue = response.json()[str(highestTimestamp)][statName]
-                            self.logInfo('\t%s: %s' % (statName, statValue), timestamp=False)
                             if csvFile:
-                                csvFilesDict[statType]['rowValueList'].append(statValue)
-                        else:
-                            self.logError('\tStat name not found. Check spelling and case sensitivity: %s' % statName)
+                                csvFilesDict[statType]['rowValueList'] = []
+
+                            # Get the interested stat names only
+                            for statName in statNameList:
+                                if statName in response.json()[str(highestTimestamp)]:
+                                    statValue = response.json()[str(highestTimestamp)][statName]
+                                    self.logInfo('\t%s: %s' % (statName, statValue), timestamp=False)
+                                    if csvFile:
+                                        csvFilesDict[statType]['rowValueList'].append(statValue)
+                                else:
+                                    self.logError('\tStat name not found. Check spelling and case sensitivity: %s' % statName)
 
-                    if csvFile:
-                        if csvFilesDict[statType]['rowValueList'] != []:
-                            csvFilesDict[statType]['csvObj'].writerow(csvFilesDict[statType]['rowValueList']) 
+                            if csvFile:
+                                if csvFilesDict[statType]['rowValueList'] != []:
+                                    csvFilesDict[statType]['csvObj'].writerow(csvFilesDict[statType]['rowValueList']) 
 
-                time.sleep(pollStatInterval)
-            elif currentState == "Unconfigured":
-                break
-            else:
-                # If currentState is "Stopping Run" or Cleaning
-                if waitForRunningStatusCounter < waitForRunningStatusCounterExit:
-                    waitForRunningStatusCounter += 1
-                    self.logInfo('\tWaiting {0}/{1} seconds'.format(waitForRunningStatusCounter, waitForRunningStatusCounterExit), timestamp=False)
-                    time.sleep(1)
-                    continue
-                if waitForRunningStatusCounter == waitForRunningStatusCounterExit:
-                    return 1
+                    time.sleep(pollStatInterval)
+                elif currentState == "Unconfigured":
+                    break
+                else:
+                    # If currentState is "Stopping Run" or Cleaning
+                    if waitForRunningStatusCounter < waitForRunningStatusCounterExit:
+                        waitForRunningStatusCounter += 1
+                        self.logInfo('\tWaiting {0}/{1} seconds'.format(waitForRunningStatusCounter, waitForRunningStatusCounterExit), timestamp=False)
+                        monitor.waitForState(['Running', 'Unconfigured'], timeout=1, raiseOnTestError=False)
+                        continue
+                    if waitForRunningStatusCounter == waitForRunningStatusCounterExit:
+                        closeOutputs()
+                        return 1
 
-        if csvFile:
-            for key in statsDict.keys():
-                csvFilesDict[key]['fileObj'].close()
+        closeOutputs()
 
     def waitForTestStatusToRunSuccessfully(self, runTestOperationsId):
         timer = 180
@@ -817,37 +1272,38 @@ class Main():
             if currentStatus != 'Successful' and counter == timer:
                 raise IxLoadRestApiException('Test status failed to run')
 
-    def waitForActiveTestToUnconfigure(self):
+    def waitForActiveTestToUnconfigure(self, timeout=30):
         ''' Wait for the active test state to be Unconfigured '''
-        self.logInfo('\n')
-        for counter in range(1,31):
-            currentState = self.getActiveTestCurrentState()
-            self.logInfo('waitForActiveTestToUnconfigure current state:', currentState)
-            if counter < 30 and currentState != 'Unconfigured':
-                self.logInfo('ActiveTest current state = %s\nWaiting for state = Unconfigured: Wait %s/30' % (currentState, counter), timestamp=False)
-                time.sleep(1)
-            if counter < 30 and currentState == 'Unconfigured':
-                self.logInfo('\nActiveTest is Unconfigured')
-                return 0
-            if counter == 30 and currentState != 'Unconfigured':
-                raise IxLoadRestApiException('ActiveTest is stuck at: {0}'.format(currentState))
+        with self.tracer.span('waitForActiveTestToUnconfigure'):
+            self.logInfo('\n')
+            monitor = self.startActiveTestMonitor()
+            self.logInfo('waitForActiveTestToUnconfigure current state: {0}'.format(self.getActiveTestCurrentState()))
+            # A test that ended with a testRunError still goes to Unconfigured
+            currentState = monitor.waitForState('Unconfigured', timeout=timeout, raiseOnTestError=False)
+
+            if currentState != 'Unconfigured':
+                raise IxLoadRestApiException('ActiveTest is stuck at: {0}'.format(monitor.currentState))
+
+            self.logInfo('\nActiveTest is Unconfigured')
+            return 0
 
     def applyConfiguration(self):
         # Apply the configuration.
         # If applying configuration failed, you have the option to keep the 
         # sessionId alive for debugging or delete it.
 
-        url = self.sessionIdUrl+'/ixLoad/test/operations/applyconfiguration'
-        response = self.post(url, ignoreError=True)
-        if response.status_code != 202:
-            if self.deleteSession:
-                self.deleteSessionId()
-                raise IxLoadRestApiException('applyConfiguration failed')
+        with self.tracer.span('applyConfiguration'):
+            url = self.sessionIdUrl+'/ixLoad/test/operations/applyconfiguration'
+            response = self.post(url, ignoreError=True)
+            if response.status_code != 202:
+                if self.deleteSession:
+                    self.deleteSessionId()
+                    raise IxLoadRestApiException('applyConfiguration failed')
 
-        operationsId = response.headers['Location']
-        operationsId = operationsId.split('/')[-1] ;# Return the number only
-        url = url+'/'+str(operationsId)
-        self.verifyStatus(response.headers['Location'])
+            operationsId = response.headers['Location']
+            operationsId = operationsId.split('/')[-1] ;# Return the number only
+            url = url+'/'+str(operationsId)
+            self.verifyStatus(response.headers['Location'])
 
     def saveConfiguration(self):
         url = self.sessionIdUrl+'/ixLoad/test/operations/save'
@@ -855,6 +1311,7 @@ class Main():
         response = self.post(url)
 
     def abortActiveTest(self):
+        self.runAborted = True
         url = self.sessionIdUrl+'/ixLoad/test/operations/abortAndReleaseConfigWaitFinish'
         response = self.post(url, ignoreError=True)
         if response.status_code != 202:
@@ -863,8 +1320,124 @@ class Main():
 
         self.verifyStatus(self.httpHeader+response.headers['Location'])
 
-    def deleteSessionId(self):
+    def deleteSessionId(self, runStatus=None):
+        '''
+        runStatus: The status of the run in the run history. Ex: completed, failed, aborted
+                   None = aborted if abortActiveTest was called, else completed.
+        '''
+        if self.logFollower:
+            self.stopTestLogs()
+
+        self.stopActiveTestMonitor()
+
         response = self.delete(self.sessionIdUrl)
+        self.tracer.close()
+        if self.runRecorder:
+            self.finishRunHistory(status=runStatus or ('aborted' if self.runAborted else 'completed'))
+
+    def enableRunHistory(self, dbFile='ixLoadRunHistory.db', runName=None, tag=None, configFile=None):
+        """
+        Description
+           Record this run in a local SQLite run history database: the stats polled by pollStats,
+           the phase timings (loadConfigFile, assignChassisAndPorts, runTraffic, verifyStatus, ...)
+           and the result files downloaded by scpFiles.
+           See runHistory.py to query across runs.
+
+        Parameters
+           dbFile: <str>: The SQLite database file. Shared by all runs.
+           runName: <str>: A name of your choice for the run.
+           tag: <str>: Groups runs for queries. Ex: nightly
+           configFile: <str>: The .rxf/.crf config file of the run.
+
+        Return
+           The runId
+        """
+        import runHistory
+
+        if self.runRecorder:
+            # A run that was not finished. Its phase listener would record into the new run too.
+            self.finishRunHistory(status='abandoned')
+
+        self.runHistory = runHistory.RunHistoryStore(dbFile)
+        self.runAborted = False
+        self.runRecorder = self.runHistory.startRun(name=runName, tag=tag, configFile=configFile,
+                                                    ixLoadVersion=getattr(self, 'ixLoadVersion', None),
+                                                    gateway=self.apiServerIp)
+        self.statsSinks.append(self.runRecorder)
+
+        def recordPhase(name, category, startTime, duration, parentName, args):
+            # Every REST call and every stat polling tick would flood the phases table
+            if category == 'ixload' and name != 'pollStats tick' and self.runRecorder:
+                self.runRecorder.addPhase(name, startTime, duration, parent=parentName)
+
+        self.runPhaseListener = recordPhase
+        self.tracer.addListener(recordPhase)
+        self.logInfo('enableRunHistory: {0}: runId {1}'.format(dbFile, self.runRecorder.runId))
+        return self.runRecorder.runId
+
+    def enableStatCompaction(self, recentSeconds=600, tiers=None, sources=None):
+        """
+        Description
+           Keep the stats polled by pollStats in memory for the whole run, in bounded memory:
+           the latest recentSeconds at full resolution, the older samples in min/max/mean/last buckets.
+           For multi-day soak runs. See statCompaction.py.
+
+        Parameters
+           recentSeconds: <int>: The samples of the latest recentSeconds are kept at full resolution.
+           tiers: The bucket tiers. None = 60 second buckets for 6 hours, then 600 second buckets.
+           sources: <list>: Only these stat sources. None = All.
+
+        Return
+           The statCompaction.CompactingStatStore
+        """
+        import statCompaction
+
+        self.statCompaction = statCompaction.CompactingStatStore(recentSeconds=recentSeconds,
+                                                                 tiers=tiers or statCompaction.defaultTiers,
+                                                                 sources=sources)
+        self.statsSinks.append(self.statCompaction)
+        return self.statCompaction
+
+    def startStatsBroker(self, statsDict=None, address=None, pollStatInterval=2, queueSize=1000,
+                         overflow='dropOldest'):
+        """
+        Description
+           Poll the stats once in the background and serve them to the local processes that
+           subscribe to them (a dashboard, a CSV recorder, a Robot suite) instead of each of them
+           polling the gateway. See statsBroker.py. Call it after runTraffic.
+
+        Parameters
+           statsDict: The stats to poll. See pollStats. None = All the stat sources of the config.
+           address: A Unix socket path, or a (host, port) tuple. None = A socket in the temp folder
+                    named after the gateway and the session.
+           pollStatInterval: Seconds between two stat polls.
+           queueSize: The amount of samples queued for a slow subscriber.
+           overflow: dropOldest or disconnect. What to do when the queue of a subscriber is full.
+
+        Return
+           The started statsBroker.StatsBroker. Its address is broker.address.
+        """
+        import statsBroker
+
+        broker = statsBroker.StatsBroker(self, statsDict=statsDict, address=address, pollStatInterval=pollStatInterval,
+                                         queueSize=queueSize, overflow=overflow)
+        broker.start()
+        self.logInfo('startStatsBroker: Serving the stats on {0}'.format(broker.address))
+        return broker
+
+    def finishRunHistory(self, status='completed'):
+        """
+        Description
+           Mark the run as finished in the run history database. Called by deleteSessionId.
+
+        Parameters
+           status: <str>: Ex: completed, failed, aborted
+        """
+        self.tracer.removeListener(self.runPhaseListener)
+        self.runRecorder.finish(status=status)
+        self.statsSinks.remove(self.runRecorder)
+        self.runRecorder = None
+        self.runHistory.close()
         
     def getMaximumInstances(self):
         response = self.get(self.sessionIdUrl+'/ixLoad/preferences')
@@ -1038,22 +1611,120 @@ class Main():
             with open (sshPasswordFile, 'r') as pwdFile:
                 self.sshPassword = pwdFile.read().strip()
         
-    def scpFiles(self, sourceFilePath=None, destFilePath='.', typeOfScp='download'):
+    def sshConnect(self, compress=True):
+        """
+        Description
+           Returns the SSH/SFTP connection to the IxLoad gateway server, with the credentials
+           from sshSetCredentials.
+
+           The connection is created on first use, kept alive and shared by scpFiles, deleteFolder,
+           listFolder, sshCommand and the result sync. If it was dropped, a new one is created.
+           It is safe to use from worker threads.
+
+        Parameters
+           compress: <bool>: Offer zlib compression to the SSH server.
+        """
+        import sshAssistant
+
+        try:
+            return sshAssistant.getConnection(self.apiServerIp, self.sshUsername, self.sshPassword,
+                                              pkeyFile=self.sshPkeyFile, port=self.sshPort, compress=compress)
+        except Exception as errMsg:
+            raise IxLoadRestApiException('SSH connection to {0} failed: {1}'.format(self.apiServerIp, errMsg))
+
+    def sshClose(self):
         """
-        This method is for running scripts from a Linux machine only and retreiving files off an
-        IxLoad Linux Gateway server. Does not get from Windows unless you installed SSH server.
+        Close the shared SSH connection to the IxLoad gateway server.
+        """
+        import sshAssistant
+
+        sshAssistant.closeConnection(self.apiServerIp, self.sshUsername, port=self.sshPort)
+
+    def sshRetry(self, operation):
+        """
+        Description
+           Run operation(sshClient) on the shared SSH connection. If the connection was
+           dropped in the middle of it, reconnect and run it once more.
+
+        Parameters
+           operation: A function that takes a sshAssistant.Connect object.
+        """
+        import sshAssistant
+
+        sshClient = self.sshConnect()
+        try:
+            return operation(sshClient)
+        except sshAssistant.transientErrors + (OSError,):
+            # paramiko raises OSError when the socket was closed
+            if sshClient.isActive():
+                raise
+
+            self.logInfo('sshRetry: The SSH connection to {0} was dropped. Reconnecting.'.format(self.apiServerIp))
+            return operation(self.sshConnect())
+
+    def sshCommand(self, command, timeout=None):
+        """
+        Description
+           Enter a command on the IxLoad gateway server over the shared SSH connection.
+
+        Parameters
+           command: <str>: Ex: ls /mnt/ixload-share or dir c:\\Results
+           timeout: <int>: Seconds to wait for the command. None = No limit.
+
+        Return
+           stdout, stderr: Lists of lines.
+        """
+        import sshAssistant
+
+        self.logInfo('sshCommand: {0}'.format(command))
+        try:
+            return self.sshRetry(lambda sshClient: sshClient.enterCommand(command, timeout=timeout))
+        except sshAssistant.CommandTimeout as errMsg:
+            raise IxLoadRestApiException('sshCommand: {0}'.format(errMsg))
+
+    def listFolder(self, folderPath):
+        """
+        Description
+           List a folder on the IxLoad gateway server.
+
+        Parameters
+           folderPath: <str>: Ex: /mnt/ixload-share/Results or c:\\Results
+
+        Return
+           A sorted list of the file and folder names.
+        """
+        import sshAssistant
+
+        try:
+            return sorted(self.sshRetry(lambda sshClient: sshClient.sftp.listdir(sshAssistant.remotePath(folderPath))))
+        except (IOError, OSError) as errMsg:
+            raise IxLoadRestApiException('listFolder {0} failed: {1}'.format(folderPath, errMsg))
+
+    def scpFiles(self, sourceFilePath=None, destFilePath='.', typeOfScp='download', channels=4, retries=2,
+                 compress=True, progressCallback=None, archive=False):
+        """
+        Retrieve files or result folders off the IxLoad Gateway server, or upload them, over SFTP.
 
         As of 8.50, there is no Rest API to retrieve result folders off the IxLoad Gateway server
         when the test is done.  This method will get your specified result folder out of
-        the IxLoad Gateway Server by using SCP.
+        the IxLoad Gateway Server by using SFTP on one authenticated SSH connection.
+        Folders are transferred in parallel over several SFTP channels of that connection.
 
         If your IxLoad Gateway is Windows, you need to download and install OpenSSH.  Below link shows the steps:
             https://openixia.amzn.keysight.com//tutorials?subject=Windows&page=sshOnWindows.html
 
         Parameters
-           sourceFilePath: From where.
+           sourceFilePath: From where. A file or a folder.
            destFilePath:   To where. Defaults to the location where the script was executed.
            typeOfScp:      download|upload
+           channels:       The amount of parallel SFTP channels for folders.
+           retries:        The amount of retries for a file that failed with a transient error.
+                           The partial file is resumed.
+           compress:       Compress files on the go if the SSH server supports it.
+           progressCallback: Called as progressCallback(remotePath, transferredBytes, totalBytes).
+           archive:        True = Download a folder as one compressed tar stream that the gateway packs
+                           on the go. Best for result folders with thousands of small files.
+                           Falls back to the per-file transfer if the gateway has no tar.
 
         Usage
             # Download Windows folder to local Linux
@@ -1065,43 +1736,116 @@ class Main():
             # Upload Linux to Windows
             restObj.scpFiles('/home/hgee/file.txt', 'C:\\Results', typeOfScp='upload')
 
-        -v = Show debugs.
-        -rp = recursive and persistent files.
-        -p  = An estimate time.
-        -P  = Specify a port
-        -C  = Compress files on the go. Decompress on the destination to regular size.
+            # Download a result folder with thousands of small files as one archive
+            restObj.scpFiles('/mnt/ixload-share/Results/17-12-20-089862', '/home/hgee', archive=True)
+
+        Return
+           The transfer report: {'files', 'failed', 'bytes', 'seconds', 'MBps', 'manifest'}
+           The manifest has one entry per file: remotePath, localPath, size, bytes, status, attempts, error.
+
+        The transfers share the SSH connection of sshConnect(). This method could be run from a thread pool.
         """
-        if typeOfScp == 'download':
-            cmd = 'sshpass -p {} scp -P {} -rp -C {}@{}:{} {}'.format(self.sshPassword, self.sshPort, self.sshUsername,
-                                                                      self.apiServerIp, sourceFilePath, destFilePath)
-        
-        if typeOfScp == 'upload':
-            cmd = 'sshpass -p {} scp -P {} -rp -C {} {}@{}:{}'.format(self.sshPassword, self.sshPort, sourceFilePath,
-                                                                      self.sshUsername, self.apiServerIp, destFilePath)
-
-        self.logInfo('SCP Files: {} -> {}'.format(sourceFilePath, destFilePath))
-        output = subprocess.Popen(cmd, stdout=subprocess.PIPE, shell=True)
-        while True:
-            output.poll()
-            line = output.stdout.readline()
-            if line:
-                print(line)
-            else:
-                break
+        if typeOfScp not in ['download', 'upload']:
+            raise IxLoadRestApiException('scpFiles: typeOfScp must be download or upload: {0}'.format(typeOfScp))
 
-    def deleteFolder(self, filePath=None):
+        with self.tracer.span('scpFiles', sourceFilePath=sourceFilePath, destFilePath=destFilePath, typeOfScp=typeOfScp):
+            self.logInfo('SCP Files: {} -> {}'.format(sourceFilePath, destFilePath))
+            sshClient = self.sshConnect(compress=compress)
+            try:
+                if typeOfScp == 'download':
+                    directory = sshClient.isRemoteDirectory(sourceFilePath)
+                    if not directory and os.path.isdir(destFilePath):
+                        destFilePath = os.path.join(destFilePath, re.split(r'[\\/]', sourceFilePath.rstrip('\\/'))[-1])
+
+                    report = sshClient.downloadFile(sourceFilePath, destFilePath, directory=directory, channels=channels,
+                                                    retries=retries, progressCallback=progressCallback, archive=archive)
+                else:
+                    directory = os.path.isdir(sourceFilePath)
+                    if not directory and sshClient.isRemoteDirectory(destFilePath):
+                        destFilePath = destFilePath.rstrip('\\/') + '/' + os.path.basename(sourceFilePath)
+
+                    report = sshClient.uploadFile(sourceFilePath, destFilePath, directory=directory, channels=channels,
+                                                  retries=retries, progressCallback=progressCallback)
+            except (IOError, OSError) as errMsg:
+                raise IxLoadRestApiException('scpFiles {0} -> {1} failed: {2}'.format(sourceFilePath, destFilePath, errMsg))
+
+            self.logInfo('scpFiles: {0} files, {1} bytes in {2} seconds: {3} MB/s'.format(
+                report['files'], report['bytes'], report['seconds'], report['MBps']), timestamp=False)
+
+            if self.runRecorder:
+                self.runRecorder.addFiles(report['manifest'])
+
+            if report['failed']:
+                failedFiles = [entry['remotePath'] for entry in report['manifest'] if entry['status'] == 'failed']
+                raise IxLoadRestApiException('scpFiles failed to transfer {0} files: {1}'.format(len(failedFiles), failedFiles))
+
+            return report
+
+    def startResultSync(self, destFilePath='.', interval=30, channels=4):
         """
-        Deletes a folder on the IxLoad gateway server.
+        Description
+           Start downloading the result folder in the background while the test runs.
+           Every interval seconds, only the new files and the bytes appended to the growing
+           result CSVs are transferred. Call stopResultSync() after the test is done:
+           the final sync only has to get what changed since the last interval.
+
+        Parameters
+           destFilePath: The local folder to create the result folder in.
+           interval: Seconds between two syncs.
+           channels: The amount of parallel SFTP channels.
+
+        Requirements
+           Call sshSetCredentials() and setResultDir() first.
         """
         import sshAssistant
 
-        sshClient = sshAssistant.Connect(self.apiServerIp, self.sshUsername, self.sshPassword,
-                                           pkeyFile=self.sshPkeyFile, port=self.sshPort)
-        if self.osPlatform == 'linux':
-            stdout,stderr = sshClient.enterCommand(f'rm -rf {filePath}')
+        resultPath = self.getResultPath()
+        self.logInfo('startResultSync: {0} -> {1} every {2} seconds'.format(resultPath, destFilePath, interval))
+        sshClient = self.sshConnect()
+        self.resultSyncer = sshAssistant.DirectorySyncer(sshClient, resultPath, destFilePath, interval=interval,
+                                                         channels=channels, reconnect=self.sshConnect)
+        self.resultSyncer.start()
 
-        if self.osPlatform == 'windows':
-            sshClient.enterCommand(f'rmdir {filePath} /s /q')
+    def stopResultSync(self, finalSync=True):
+        """
+        Description
+           Stop the background result sync started by startResultSync().
 
+        Parameters
+           finalSync: True = Transfer what changed since the last sync.
 
+        Return
+           The transfer report of the final sync.
+        """
+        with self.tracer.span('stopResultSync', finalSync=finalSync):
+            try:
+                report = self.resultSyncer.stop(finalSync=finalSync)
+            except Exception as errMsg:
+                raise IxLoadRestApiException('stopResultSync: final sync failed: {0}'.format(errMsg))
+
+        self.logInfo('stopResultSync: {0} syncs. {1} bytes transferred in total'.format(
+            self.resultSyncer.syncCount, self.resultSyncer.transferredBytes))
+
+        if self.runRecorder:
+            self.runRecorder.addFiles([{'remotePath': remoteFilePath, 'localPath': None, 'size': size, 'status': 'synced'}
+                                       for remoteFilePath, (size, mtime) in self.resultSyncer.manifest.items()])
+
+        if report and report['failed']:
+            failedFiles = [entry['remotePath'] for entry in report['manifest'] if entry['status'] == 'failed']
+            raise IxLoadRestApiException('stopResultSync failed to transfer {0} files: {1}'.format(len(failedFiles), failedFiles))
+
+        return report
+
+    def deleteFolder(self, filePath=None):
+        """
+        Deletes a folder on the IxLoad gateway server over the shared SSH connection.
+        """
+        if self.osPlatform == 'linux':
+            stdout,stderr = self.sshCommand(f'rm -rf "{filePath}"')
+        elif self.osPlatform == 'windows':
+            stdout,stderr = self.sshCommand('rmdir "{0}" /s /q'.format(filePath.replace('/', '\\')))
+        else:
+            raise IxLoadRestApiException('deleteFolder: osPlatform must be linux or windows: {0}'.format(self.osPlatform))
 
+        if stderr:
+            self.logError('deleteFolder {0}: {1}'.format(filePath, ''.join(stderr).strip()))
@@ -2,18 +2,63 @@ import json
 import requests
 import time
 
+import restRetry
+import traceEvents
+
 
 kActionStateFinished = 'finished'
 kActionStatusSuccessful = 'Successful'
 kActionStatusError = 'Error'
 kTestStateUnconfigured = 'Unconfigured'
 
+# Span timeline of the test. Disabled until enableTracing() is called.
+tracer = traceEvents.TraceRecorder()
+
+# Retries the requests rejected on a locked resource, 503 and connection resets. See restRetry.
+retryPolicy = restRetry.defaultPolicy
+
+# The activeTest snapshot of each session url. See getActiveTestSnapshot.
+activeTestSnapshots = {}
+
+# The test operations that replace the whole activeTest tree
+kReloadTestOperations = ['loadtest', 'importconfig', 'newconfig']
+
 
 def log(message):
     currentTime = time.strftime("%H:%M:%S")
     print "%s -> %s" % (currentTime, message)
 
 
+def enableTracing(traceFile):
+    '''
+        This method starts recording a span timeline of the test (session creation, action waits, port assignment,
+        every stats polling tick) in Chrome trace-event JSON format. Open the file in chrome://tracing or https://ui.perfetto.dev
+
+        Args:
+        - traceFile is the trace file to create
+    '''
+    global tracer
+    tracer.close()
+    tracer = traceEvents.TraceRecorder(traceFile)
+    return tracer
+
+
+def logRetry(method, url, reason, attempt, delay):
+    log("%s %s: %s. Retry %s/%s in %.1f secs" % (method, url, reason, attempt, retryPolicy.maxRetries, delay))
+    tracer.instant('http retry', category='http', method=method, url=url, reason=reason, attempt=attempt)
+
+
+def setRetryPolicy(policy):
+    '''
+        This method replaces the retry policy of the generic operations (performGenericOperation/Post/Delete/Patch)
+
+        Args:
+        - policy is a restRetry.RetryPolicy. Ex: restRetry.RetryPolicy(maxRetries=10, maxBackoff=30)
+    '''
+    global retryPolicy
+    retryPolicy = policy
+
+
 def stripApiAndVersionFromURL(url):
     #remove the slash (if any) at the beginning of the url
     if url[0] == '/':
@@ -39,27 +84,28 @@ def waitForActionToFinish(connection, replyObj, actionUrl):
         - replyObj the reply object holding the location
         - actionUrl - the url pointing to the operation
     '''
-    actionResultURL = replyObj.headers.get('location')
-    if actionResultURL:
-        actionResultURL = stripApiAndVersionFromURL(actionResultURL)
-        actionFinished = False
+    with tracer.span('waitForActionToFinish', url=actionUrl):
+        actionResultURL = replyObj.headers.get('location')
+        if actionResultURL:
+            actionResultURL = stripApiAndVersionFromURL(actionResultURL)
+            actionFinished = False
 
-        while not actionFinished:
-            actionStatusObj = connection.httpGet(actionResultURL)
+            while not actionFinished:
+                actionStatusObj = connection.httpGet(actionResultURL)
 
-            if actionStatusObj.state == kActionStateFinished:
-                if actionStatusObj.status == kActionStatusSuccessful:
-                    actionFinished = True
-                else:
-                    errorMsg = "Error while executing action '%s'." % actionUrl
+                if actionStatusObj.state == kActionStateFinished:
+                    if actionStatusObj.status == kActionStatusSuccessful:
+                        actionFinished = True
+                    else:
+                        errorMsg = "Error while executing action '%s'." % actionUrl
 
-                    if actionStatusObj.status == kActionStatusError:
-                        errorMsg += actionStatusObj.error
+                        if actionStatusObj.status == kActionStatusError:
+                            errorMsg += actionStatusObj.error
 
-                    print errorMsg
-                    raise Exception(errorMsg)
-            else:
-                time.sleep(0.1)
+                        print errorMsg
+                        raise Exception(errorMsg)
+                else:
+                    time.sleep(0.1)
 
 
 def performGenericOperation(connection, url, payloadDict):
@@ -72,12 +118,13 @@ def performGenericOperation(connection, url, payloadDict):
         - payloadDict is the python dict with the parameters for the operation
     '''
     data = json.dumps(payloadDict)
-    reply = connection.httpPost(url=url, data=data)
+    reply = retryPolicy.call('POST', lambda: connection.httpPost(url=url, data=data), url=url, onRetry=logRetry)
 
     if not reply.ok:
         raise Exception(reply.text)
 
     waitForActionToFinish(connection, reply, url)
+    invalidateActiveTestSnapshots(url)
 
     return reply
 
@@ -93,11 +140,13 @@ def performGenericPost(connection, listUrl, payloadDict):
     '''
     data = json.dumps(payloadDict)
 
-    reply = connection.httpPost(url=listUrl, data=data)
+    reply = retryPolicy.call('POST', lambda: connection.httpPost(url=listUrl, data=data), url=listUrl, onRetry=logRetry)
 
     if not reply.ok:
         raise Exception(reply.text)
 
+    invalidateActiveTestSnapshots(listUrl)
+
     try:
         newObjPath = reply.headers['location']
     except:
@@ -118,10 +167,12 @@ def performGenericDelete(connection, listUrl, payloadDict):
     '''
     data = json.dumps(payloadDict)
 
-    reply = connection.httpDelete(url=listUrl, data=data)
+    reply = retryPolicy.call('DELETE', lambda: connection.httpDelete(url=listUrl, data=data), url=listUrl, onRetry=logRetry)
 
     if not reply.ok:
         raise Exception(reply.text)
+
+    invalidateActiveTestSnapshots(listUrl)
     return reply
 
 
@@ -136,9 +187,12 @@ def performGenericPatch(connection, url, payloadDict):
     '''
     data = json.dumps(payloadDict)
 
-    reply = connection.httpPatch(url=url, data=data)
+    reply = retryPolicy.call('PATCH', lambda: connection.httpPatch(url=url, data=data), url=url, onRetry=logRetry)
     if not reply.ok:
         raise Exception(reply.text)
+
+    if 'name' in payloadDict:
+        renameInActiveTestSnapshots(url, payloadDict['name'])
     return reply
 
 
@@ -154,15 +208,16 @@ def createSession(connection, ixLoadVersion):
     sessionsUrl = "sessions"
     data = {"ixLoadVersion": ixLoadVersion}
 
-    sessionId = performGenericPost(connection, sessionsUrl, data)
+    with tracer.span('createSession', ixLoadVersion=ixLoadVersion):
+        sessionId = performGenericPost(connection, sessionsUrl, data)
 
-    newSessionUrl = "%s/%s" % (sessionsUrl, sessionId)
-    startSessionUrl = "%s/operations/start" % (newSessionUrl)
+        newSessionUrl = "%s/%s" % (sessionsUrl, sessionId)
+        startSessionUrl = "%s/operations/start" % (newSessionUrl)
 
-    #start the session
-    performGenericOperation(connection, startSessionUrl, {})
+        #start the session
+        performGenericOperation(connection, startSessionUrl, {})
 
-    log("Created session no %s" % sessionId)
+        log("Created session no %s" % sessionId)
 
     return newSessionUrl
 
@@ -183,23 +238,24 @@ def uploadFile(connection, url, fileName, uploadPath, overwrite=True):
     headers = {'Content-Type': 'multipart/form-data'}
     params = {'overwrite': overwrite, 'uploadPath': uploadPath}
 
-    log('Uploading to %s...' % uploadPath)
-    try:
-        with open(fileName, 'rb') as f:
-            resp = requests.post(url, data=f, params=params, headers=headers)
-    except requests.exceptions.ConnectionError as e:
-        raise Exception(
-            'Upload file failed. Received connection error. One common cause for this error is the size of the file to be uploaded.'
-            ' The web server sets a limit of 1GB for the uploaded file size. Received the following error: %s' % str(e)
-        )
-    except IOError as e:
-        raise Exception('Upload file failed. Received IO error: %s' % str(e))
-    except Exception:
-        raise Exception('Upload file failed. Received the following error: %s' % str(e))
-    else:
-        log('Upload file finished.')
-        log('Response status code %s' % resp.status_code)
-        log('Response text %s' % resp.text)
+    with tracer.span('uploadFile', uploadPath=uploadPath):
+        log('Uploading to %s...' % uploadPath)
+        try:
+            with open(fileName, 'rb') as f:
+                resp = requests.post(url, data=f, params=params, headers=headers)
+        except requests.exceptions.ConnectionError as e:
+            raise Exception(
+                'Upload file failed. Received connection error. One common cause for this error is the size of the file to be uploaded.'
+                ' The web server sets a limit of 1GB for the uploaded file size. Received the following error: %s' % str(e)
+            )
+        except IOError as e:
+            raise Exception('Upload file failed. Received IO error: %s' % str(e))
+        except Exception:
+            raise Exception('Upload file failed. Received the following error: %s' % str(e))
+        else:
+            log('Upload file finished.')
+            log('Response status code %s' % resp.status_code)
+            log('Response text %s' % resp.text)
 
 
 def loadRepository(connection, sessionUrl, rxfFilePath):
@@ -281,8 +337,9 @@ def waitForTestToReachUnconfiguredState(connection, sessionUrl):
         - connection is the connection object that manages the HTTP data transfers between the client and the REST API
         - sessionUrl is the address of the session that should run the test.
     '''
-    while getTestCurrentState(connection, sessionUrl) != kTestStateUnconfigured:
-        time.sleep(0.1)
+    with tracer.span('waitForTestToReachUnconfiguredState'):
+        while getTestCurrentState(connection, sessionUrl) != kTestStateUnconfigured:
+            time.sleep(0.1)
 
 
 def pollStats(connection, sessionUrl, watchedStatsDict, pollingInterval=4):
@@ -329,28 +386,29 @@ def pollStats(connection, sessionUrl, watchedStatsDict, pollingInterval=4):
         # the polling interval is configurable. by default, it's set to 4 seconds
         time.sleep(pollingInterval)
 
-        for statSource in statSourceList:
-            valuesUrl = "%s/ixload/stats/%s/values" % (sessionUrl, statSource)
+        with tracer.span('pollStats tick', statSources=list(statSourceList)):
+            for statSource in statSourceList:
+                valuesUrl = "%s/ixload/stats/%s/values" % (sessionUrl, statSource)
 
-            valuesObj = connection.httpGet(valuesUrl)
-            valuesDict = valuesObj.getOptions()
+                valuesObj = connection.httpGet(valuesUrl)
+                valuesDict = valuesObj.getOptions()
 
-            # get just the new timestamps - that were not previously retrieved in another stats polling iteration
-            newTimestamps = [int(timestamp) for timestamp in valuesDict.keys() if timestamp not in collectedTimestamps.get(statSource, [])]
-            newTimestamps.sort()
+                # get just the new timestamps - that were not previously retrieved in another stats polling iteration
+                newTimestamps = [int(timestamp) for timestamp in valuesDict.keys() if timestamp not in collectedTimestamps.get(statSource, [])]
+                newTimestamps.sort()
 
-            for timestamp in newTimestamps:
-                timeStampStr = str(timestamp)
+                for timestamp in newTimestamps:
+                    timeStampStr = str(timestamp)
 
-                collectedTimestamps.setdefault(statSource, []).append(timeStampStr)
+                    collectedTimestamps.setdefault(statSource, []).append(timeStampStr)
 
-                timestampDict = statsDict.setdefault(statSource, {}).setdefault(timestamp, {})
+                    timestampDict = statsDict.setdefault(statSource, {}).setdefault(timestamp, {})
 
-                # save the values for the current timestamp, and later print them
-                for caption, value in valuesDict[timeStampStr].getOptions().items():
-                    if caption in watchedStatsDict[statSource]:
-                        log("Timestamp %s - %s -> %s" % (timeStampStr, caption, value))
-                        timestampDict[caption] = value
+                    # save the values for the current timestamp, and later print them
+                    for caption, value in valuesDict[timeStampStr].getOptions().items():
+                        if caption in watchedStatsDict[statSource]:
+                            log("Timestamp %s - %s -> %s" % (timeStampStr, caption, value))
+                            timestampDict[caption] = value
 
         testIsRunning = getTestCurrentState(connection, sessionUrl) == "Running"
 
@@ -380,13 +438,14 @@ def addChassisList(connection, sessionUrl, chassisList):
     '''
     chassisListUrl = "%s/ixload/chassisChain/chassisList" % (sessionUrl)
 
-    for chassisName in chassisList:
-        data = {"name": chassisName}
-        chassisId = performGenericPost(connection, chassisListUrl, data)
+    with tracer.span('addChassisList', chassisList=chassisList):
+        for chassisName in chassisList:
+            data = {"name": chassisName}
+            chassisId = performGenericPost(connection, chassisListUrl, data)
 
-        #refresh the chassis
-        refreshConnectionUrl = "%s/%s/operations/refreshConnection" % (chassisListUrl, chassisId)
-        performGenericOperation(connection, refreshConnectionUrl, {})
+            #refresh the chassis
+            refreshConnectionUrl = "%s/%s/operations/refreshConnection" % (chassisListUrl, chassisId)
+            performGenericOperation(connection, refreshConnectionUrl, {})
 
 
 def assignPorts(connection, sessionUrl, portListPerCommunity):
@@ -400,19 +459,20 @@ def assignPorts(connection, sessionUrl, portListPerCommunity):
     '''
     communtiyListUrl = "%s/ixload/test/activeTest/communityList" % sessionUrl
 
-    communityList = connection.httpGet(url=communtiyListUrl)
+    with tracer.span('assignPorts'):
+        communityList = connection.httpGet(url=communtiyListUrl)
 
-    for community in communityList:
-        portListForCommunity = portListPerCommunity.get(community.name)
+        for community in communityList:
+            portListForCommunity = portListPerCommunity.get(community.name)
 
-        portListUrl = "%s/%s/network/portList" % (communtiyListUrl, community.objectID)
+            portListUrl = "%s/%s/network/portList" % (communtiyListUrl, community.objectID)
 
-        if portListForCommunity:
-            for portTuple in portListForCommunity:
-                chassisId, cardId, portId = portTuple
-                paramDict = {"chassisId": chassisId, "cardId": cardId, "portId": portId}
+            if portListForCommunity:
+                for portTuple in portListForCommunity:
+                    chassisId, cardId, portId = portTuple
+                    paramDict = {"chassisId": chassisId, "cardId": cardId, "portId": portId}
 
-                performGenericPost(connection, portListUrl, paramDict)
+                    performGenericPost(connection, portListUrl, paramDict)
 
 def changeCardsInterfaceMode(connection, chassisChainUrl, chassisIp, cardIdList, mode):
     '''
@@ -452,6 +512,187 @@ def setCardsAggregationMode(connection, chassisChainUrl, chassisIp, cardIdList,
 
     
 
+class ActiveTestSnapshot(object):
+    '''
+        The communityList -> activityList -> agent tree of the activeTest of a session, with name -> url indexes
+        for the communities, activities, agents, command lists and IP ranges.
+        Each index is fetched the first time it is used and kept until a POST, DELETE or rename changes the part
+        of the tree it was fetched from. Loading another config drops the whole snapshot.
+    '''
+    def __init__(self, connection, sessionUrl):
+        self.connection = connection
+        self.sessionUrl = sessionUrl
+        self.communityListUrl = "%s/ixload/test/activeTest/communityList" % sessionUrl
+        self.sessionPath = stripApiAndVersionFromURL(sessionUrl).lower()
+        self.communityListPath = stripApiAndVersionFromURL(self.communityListUrl).lower()
+        self.invalidate()
+
+    def invalidate(self, indexes=None):
+        '''
+            This method drops the indexes, so that they are fetched again the next time they are used.
+
+            Args:
+            - indexes is the list of indexes to drop (communities, activities, commandLists, ranges). None drops all of them.
+        '''
+        if indexes is None or 'communities' in indexes:
+            self.communities = None
+        if indexes is None or 'activities' in indexes:
+            self.activities = None
+        if indexes is None or 'commandLists' in indexes:
+            self.commandLists = {}
+        if indexes is None or 'ranges' in indexes:
+            self.ranges = None
+
+    def invalidateForUrl(self, url):
+        '''
+            This method drops the indexes fetched from the part of the tree a POST, DELETE or operation on url changes.
+        '''
+        path = stripApiAndVersionFromURL(url).lower().rstrip('/')
+        if path == self.sessionPath:
+            self.invalidate()
+            return
+
+        if path.startswith(self.sessionPath + '/ixload/test/operations/'):
+            if path.split('/')[-1] in kReloadTestOperations or path.split('/')[-2] in kReloadTestOperations:
+                self.invalidate()
+            return
+
+        if not path.startswith(self.communityListPath):
+            return
+
+        # [communityId, 'activityList', activityId, 'agent', ...] or [communityId, 'network', 'stack', ...]
+        elements = path[len(self.communityListPath):].strip('/').split('/')
+        if len(elements) <= 1:
+            self.invalidate()
+        elif elements[1] == 'activitylist' and len(elements) <= 3:
+            self.invalidate(['activities', 'commandLists'])
+        elif elements[1] == 'network' and 'stack' in elements:
+            self.invalidate(['ranges'])
+
+    def renameUrl(self, url, newName):
+        '''
+            This method moves the url of a renamed community, activity or IP range to its new name in the indexes.
+        '''
+        path = stripApiAndVersionFromURL(url).lower().rstrip('/')
+        for index in [self.communities, self.activities, self.ranges]:
+            if not index:
+                continue
+
+            for name, urls in list(index.items()):
+                renamedUrls = [objUrl for objUrl in urls if stripApiAndVersionFromURL(objUrl).lower().rstrip('/') == path]
+                for objUrl in renamedUrls:
+                    urls.remove(objUrl)
+                    index.setdefault(newName, []).append(objUrl)
+                    if index is self.activities and name in self.commandLists:
+                        self.commandLists[newName] = self.commandLists.pop(name)
+
+                if not urls:
+                    del index[name]
+
+    def communityUrls(self):
+        '''
+            This method returns the index of the communities: { community name : [ community url ] }
+        '''
+        if self.communities is None:
+            communities = {}
+            for community in self.connection.httpGet(url=self.communityListUrl):
+                communities.setdefault(community.name, []).append("%s/%s" % (self.communityListUrl, community.objectID))
+            self.communities = communities
+
+        return self.communities
+
+    def activityUrls(self, activityName):
+        '''
+            This method returns the urls of the activities with this name, from one activityList GET per community.
+        '''
+        if self.activities is None:
+            activities = {}
+            for communityUrls in self.communityUrls().values():
+                for communityUrl in communityUrls:
+                    activityListUrl = "%s/activityList" % communityUrl
+                    for activity in self.connection.httpGet(url=activityListUrl):
+                        activities.setdefault(activity.name, []).append("%s/%s" % (activityListUrl, activity.objectID))
+            self.activities = activities
+
+        return list(self.activities.get(activityName, []))
+
+    def agentUrl(self, agentName):
+        '''
+            This method returns the url of the agent of the first activity with this name.
+        '''
+        activityUrls = self.activityUrls(agentName)
+        if activityUrls:
+            return "%s/agent" % activityUrls[0]
+
+    def commandListUrl(self, agentName):
+        '''
+            This method returns the commandList (or actionList) url of an agent. The agent is fetched once.
+        '''
+        if agentName not in self.commandLists:
+            commandListUrl = None
+            agentUrl = self.agentUrl(agentName)
+            if agentUrl:
+                agent = self.connection.httpGet(agentUrl)
+                for link in agent.links:
+                    if link.rel in ['actionList', 'commandList']:
+                        commandListUrl = link.href.replace("/api/v0/", "")
+                        break
+            self.commandLists[agentName] = commandListUrl
+
+        return self.commandLists[agentName]
+
+    def rangeUrls(self, rangeName):
+        '''
+            This method returns the urls of the IP ranges with this name, from one walk of the network stack of each community.
+        '''
+        if self.ranges is None:
+            ranges = {}
+            for communityUrls in self.communityUrls().values():
+                for communityUrl in communityUrls:
+                    rangeListUrl = getIPRangeListUrlForNetworkObj(self.connection, "%s/network/stack" % communityUrl)
+                    for rangeObj in self.connection.httpGet(rangeListUrl):
+                        ranges.setdefault(rangeObj.name, []).append("%s/%s" % (rangeListUrl, rangeObj.objectID))
+            self.ranges = ranges
+
+        return list(self.ranges.get(rangeName, []))
+
+
+def getActiveTestSnapshot(connection, sessionUrl, refresh=False):
+    '''
+        This method returns the activeTest snapshot of a session, and creates it the first time.
+
+        Args:
+        - connection is the connection object that manages the HTTP data transfers between the client and the REST API
+        - sessionUrl is the address of the session
+        - refresh drops the indexes already fetched
+    '''
+    snapshot = activeTestSnapshots.get(sessionUrl)
+    if snapshot is None or snapshot.connection is not connection:
+        snapshot = activeTestSnapshots[sessionUrl] = ActiveTestSnapshot(connection, sessionUrl)
+    elif refresh:
+        snapshot.invalidate()
+
+    return snapshot
+
+
+def invalidateActiveTestSnapshots(url):
+    '''
+        This method drops the snapshot indexes that a POST, DELETE or operation on url changes.
+        The generic operations call it. Call it after changing the activeTest tree in another way.
+    '''
+    for sessionUrl, snapshot in list(activeTestSnapshots.items()):
+        if stripApiAndVersionFromURL(url).lower().rstrip('/') == snapshot.sessionPath:
+            # The session is deleted
+            del activeTestSnapshots[sessionUrl]
+        else:
+            snapshot.invalidateForUrl(url)
+
+
+def renameInActiveTestSnapshots(url, newName):
+    for snapshot in activeTestSnapshots.values():
+        snapshot.renameUrl(url, newName)
+
+
 def getIPRangeListUrlForNetworkObj(connection, networkUrl):
     '''
         This method will return the IP Ranges associated with an IxLoad Network component.
@@ -494,22 +735,11 @@ def changeIpRangesParams(connection, sessionUrl, ipOptionsToChangeDict):
         - ipOptionsToChangeDict is the Python dict holding the items in the IP range that will be changed.
             (ipOptionsToChangeDict format -> { IP Range name : { optionName : optionValue } })
     '''
-    communtiyListUrl = "%s/ixload/test/activeTest/communityList" % sessionUrl
-
-    communityList = connection.httpGet(url=communtiyListUrl)
-
-    for community in communityList:
-        stackUrl = "%s/%s/network/stack" % (communtiyListUrl, community.objectID)
+    snapshot = getActiveTestSnapshot(connection, sessionUrl)
 
-        rangeListUrl = getIPRangeListUrlForNetworkObj(connection, stackUrl)
-        rangeList = connection.httpGet(rangeListUrl)
-
-        for rangeObj in rangeList:
-            if rangeObj.name in ipOptionsToChangeDict.keys():
-                rangeObjUrl = "%s/%s" % (rangeListUrl, rangeObj.objectID)
-                paramDict = ipOptionsToChangeDict[rangeObj.name]
-
-                performGenericPatch(connection, rangeObjUrl, paramDict)
+    for rangeName, paramDict in ipOptionsToChangeDict.items():
+        for rangeObjUrl in snapshot.rangeUrls(rangeName):
+            performGenericPatch(connection, rangeObjUrl, paramDict)
 
 
 def getCommandListUrlForAgentName(connection, sessionUrl, agentName):
@@ -521,23 +751,7 @@ def getCommandListUrlForAgentName(connection, sessionUrl, agentName):
         - sessionUrl is the address of the session that should run the test
         - agentName is the agent name for which the commandList address is provided
     '''
-    communtiyListUrl = "%s/ixload/test/activeTest/communityList" % sessionUrl
-    communityList = connection.httpGet(url=communtiyListUrl)
-
-    for community in communityList:
-        activityListUrl = "%s/%s/activityList" % (communtiyListUrl, community.objectID)
-        activityList = connection.httpGet(url=activityListUrl)
-
-        for activity in activityList:
-            if activity.name == agentName:
-                #agentActionListUrl = "%s/%s/agent/actionList" % (activityListUrl, activity.objectID)
-                agentUrl = "%s/%s/agent" % (activityListUrl, activity.objectID)
-                agent = connection.httpGet(agentUrl)
-
-                for link in agent.links:
-                    if link.rel in ['actionList', 'commandList']:
-                        commandListUrl = link.href.replace("/api/v0/", "")
-                        return commandListUrl
+    return getActiveTestSnapshot(connection, sessionUrl).commandListUrl(agentName)
 
 
 def clearAgentsCommandList(connection, sessionUrl, agentNameList):
@@ -583,17 +797,11 @@ def changeActivityOptions(connection, sessionUrl, activityOptionsToChange):
         - sessionUrl is the address of the session that should run the test
         - activityOptionsToChange is the Python dict that holds the mapping between agent name and specific properties (activityOptionsToChange format: { activityName : { option : value } })
     '''
-    communtiyListUrl = "%s/ixload/test/activeTest/communityList" % sessionUrl
-    communityList = connection.httpGet(url=communtiyListUrl)
-
-    for community in communityList:
-        activityListUrl = "%s/%s/activityList" % (communtiyListUrl, community.objectID)
-        activityList = connection.httpGet(url=activityListUrl)
+    snapshot = getActiveTestSnapshot(connection, sessionUrl)
 
-        for activity in activityList:
-            if activity.name in activityOptionsToChange.keys():
-                activityUrl = "%s/%s" % (activityListUrl, activity.objectID)
-                performGenericPatch(connection, activityUrl, activityOptionsToChange[activity.name])
+    for activityName, optionsDict in activityOptionsToChange.items():
+        for activityUrl in snapshot.activityUrls(activityName):
+            performGenericPatch(connection, activityUrl, optionsDict)
 
 
 # To use the upload Method
@@ -0,0 +1,202 @@
+"""
+Description
+   One background thread per session that polls /ixLoad/test/activeTest and publishes
+   the currentState transitions and the testRunError to everything that waits on them.
+   pollStats, waitForActiveTestToUnconfigure and getActiveTestCurrentState read the
+   monitored state instead of sending their own GET requests.
+
+   The polling interval is short while the state is changing (Configuring, Starting Run,
+   Stopping Run, Cleaning) and grows while it stays the same.
+
+Usage:
+   import activeTestMonitor
+
+   monitor = activeTestMonitor.ActiveTestMonitor(restObj)
+   monitor.start()
+
+   monitor.subscribe(lambda oldState, newState, activeTest: print(oldState, '->', newState))
+   monitor.waitForState('Running', timeout=300)
+   future = monitor.stateFuture('Unconfigured')
+   ...
+   future.result(timeout=600)
+   monitor.stop()
+"""
+
+import threading
+import time
+from concurrent.futures import Future
+
+# The states a test only goes through. The state is polled at the shortest interval while in them.
+transientStates = ('Configuring', 'Starting Run', 'Stopping Run', 'Cleaning', 'Aborting')
+
+
+class ActiveTestMonitorException(Exception):
+    pass
+
+
+class ActiveTestMonitor(threading.Thread):
+    def __init__(self, restObj, minInterval=0.5, maxInterval=5):
+        """
+        Description
+           Poll the activeTest of a session in the background.
+
+        Parameters
+           restObj: An IxL_RestApi.Main object connected to a session.
+           minInterval: Seconds between two polls while the state is changing.
+           maxInterval: The longest time between two polls while the state stays the same.
+        """
+        threading.Thread.__init__(self, name='ActiveTestMonitor', daemon=True)
+        self.restObj = restObj
+        self.activeTestUrl = restObj.sessionIdUrl + '/ixLoad/test/activeTest'
+        self.minInterval = minInterval
+        self.maxInterval = maxInterval
+        self.interval = minInterval
+        self.condition = threading.Condition()
+        self.stopEvent = threading.Event()
+        self.wakeEvent = threading.Event()
+        self.subscribers = []
+        self.futures = []
+        self.activeTest = None
+        self.currentState = None
+        self.testRunError = None
+        self.transitions = []
+        self.polls = 0
+        self.lastError = None
+
+    def run(self):
+        while not self.stopEvent.is_set():
+            try:
+                changed = self.poll()
+            except Exception as errMsg:
+                # The gateway could be busy. Try again later.
+                self.lastError = errMsg
+                changed = False
+
+            if changed or self.currentState in transientStates:
+                self.interval = self.minInterval
+            else:
+                self.interval = min(self.interval * 1.5, self.maxInterval)
+
+            self.wakeEvent.wait(self.interval)
+            self.wakeEvent.clear()
+
+    def poll(self):
+        """
+        Get the activeTest once and publish a state change. Returns True if the state changed.
+        """
+        activeTest = self.restObj.get(self.activeTestUrl, silentMode=True).json()
+        newState = activeTest.get('currentState')
+        with self.condition:
+            self.polls += 1
+            self.activeTest = activeTest
+            self.testRunError = activeTest.get('testRunError') or None
+            oldState = self.currentState
+            changed = newState != oldState
+            if changed:
+                self.currentState = newState
+                self.transitions.append((time.time(), oldState, newState))
+
+            # Resolve the futures of the states reached, and all of them on a test error
+            for future, states in list(self.futures):
+                if newState in states:
+                    future.set_result(newState)
+                    self.futures.remove((future, states))
+                elif self.testRunError:
+                    future.set_exception(ActiveTestMonitorException('Test run error: {0}'.format(self.testRunError)))
+                    self.futures.remove((future, states))
+
+            self.condition.notify_all()
+
+        if changed:
+            self.restObj.tracer.instant('activeTest state', oldState=oldState, newState=newState)
+            for subscriber in list(self.subscribers):
+                subscriber(oldState, newState, activeTest)
+
+        return changed
+
+    def refresh(self, timeout=0):
+        """
+        Poll now instead of waiting for the end of the current interval.
+        timeout: Seconds to wait for that poll to complete. 0 = Do not wait. Returns the current state.
+        """
+        with self.condition:
+            polls = self.polls
+        self.interval = self.minInterval
+        self.wakeEvent.set()
+        if timeout:
+            with self.condition:
+                self.condition.wait_for(lambda: self.polls != polls, timeout)
+        return self.currentState
+
+    def subscribe(self, callback):
+        """
+        Call callback(oldState, newState, activeTest) on each state change, from the monitor thread.
+        """
+        self.subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        if callback in self.subscribers:
+            self.subscribers.remove(callback)
+
+    def stateFuture(self, states):
+        """
+        Returns a concurrent.futures.Future resolved with the state once the test reaches one of the states.
+        The future fails with ActiveTestMonitorException if the test reports a testRunError first.
+        """
+        states = (states,) if isinstance(states, str) else tuple(states)
+        future = Future()
+        with self.condition:
+            if self.currentState in states:
+                future.set_result(self.currentState)
+            else:
+                self.futures.append((future, states))
+
+        return future
+
+    def waitForState(self, states, timeout=None, raiseOnTestError=True):
+        """
+        Description
+           Block until the test reaches one of the states.
+
+        Parameters
+           states: A state or a list of states. Ex: 'Unconfigured' or ['Running', 'Unconfigured']
+           timeout: Seconds to wait. None = No limit.
+           raiseOnTestError: True = Raise ActiveTestMonitorException if the test reports a testRunError.
+
+        Return
+           The state reached, or None on timeout.
+        """
+        states = (states,) if isinstance(states, str) else tuple(states)
+        deadline = None if timeout is None else time.time() + timeout
+        self.refresh()
+        with self.condition:
+            while self.currentState not in states:
+                if raiseOnTestError and self.testRunError:
+                    raise ActiveTestMonitorException('Test run error: {0}'.format(self.testRunError))
+
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return None
+
+                self.condition.wait(remaining)
+
+            return self.currentState
+
+    def waitForChange(self, timeout=None):
+        """
+        Block until the next poll or the timeout. Returns the current state.
+        """
+        with self.condition:
+            polls = self.polls
+            self.condition.wait_for(lambda: self.polls != polls, timeout)
+            return self.currentState
+
+    def stop(self):
+        self.stopEvent.set()
+        self.wakeEvent.set()
+        self.join()
+        with self.condition:
+            for future, states in self.futures:
+                future.cancel()
+            self.futures = []
+            self.condition.notify_all()
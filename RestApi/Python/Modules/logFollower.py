@@ -0,0 +1,157 @@
+"""
+Description
+   Follow the test log of an IxLoad session in the background.
+
+   Only the entries newer than the last objectID seen are requested, with the
+   filter query objectID gt <last objectID>. The polling interval is short while
+   entries are coming in and grows while the log is quiet.
+
+Usage:
+   import logFollower
+
+   follower = logFollower.LogFollower(restObj, severities=['Error', 'Warning'])
+   follower.start()
+
+   # Iterate the entries as they arrive. Ends once the follower is stopped.
+   for entry in follower:
+       print(entry['severity'], entry['message'])
+
+   # Or get a callback for each entry
+   follower = logFollower.LogFollower(restObj, callback=lambda entry: print(entry['message']))
+   follower.start()
+   ...
+   follower.stop()
+
+   follower.entries() returns the latest entries kept in memory.
+"""
+
+import collections
+import re
+import threading
+
+
+class LogFollower(threading.Thread):
+    def __init__(self, restObj, severities=None, modules=None, callback=None, bufferSize=1000,
+                 minInterval=0.5, maxInterval=10):
+        """
+        Description
+           A background thread that polls /ixLoad/test/logs for new entries.
+
+        Parameters
+           restObj: An IxL_RestApi.Main object connected to a session.
+           severities: <list>: Only keep the entries with these severities. Ex: ['Error', 'Warning']
+                       None = All.
+           modules: <str>: Only keep the entries whose moduleName matches this regex. None = All.
+           callback: Called with each kept entry, from the follower thread.
+           bufferSize: The amount of latest entries kept in memory.
+           minInterval: Seconds between two polls while new entries are coming in.
+           maxInterval: The longest time between two polls while the log is quiet.
+        """
+        threading.Thread.__init__(self, name='LogFollower', daemon=True)
+        self.restObj = restObj
+        self.testLogUrl = restObj.sessionIdUrl + '/ixLoad/test/logs'
+        self.severities = set(severities) if severities else None
+        self.modules = re.compile(modules) if modules else None
+        self.callback = callback
+        self.minInterval = minInterval
+        self.maxInterval = maxInterval
+        self.interval = minInterval
+        self.lastObjectId = -1
+        self.buffer = collections.deque(maxlen=bufferSize)
+        self.received = 0
+        self.condition = threading.Condition()
+        self.stopEvent = threading.Event()
+        self.finished = False
+        self.lastError = None
+
+    def run(self):
+        while not self.stopEvent.is_set():
+            try:
+                newEntries = self.poll()
+            except Exception as errMsg:
+                # The gateway could be busy. Try again later.
+                self.lastError = errMsg
+                newEntries = 0
+
+            if newEntries:
+                self.interval = self.minInterval
+            else:
+                self.interval = min(self.interval * 2, self.maxInterval)
+
+            self.stopEvent.wait(self.interval)
+
+    def poll(self):
+        """
+        Get the entries newer than the last objectID seen. Returns the amount of new entries.
+        """
+        url = self.testLogUrl
+        if self.lastObjectId >= 0:
+            url += '?filter="objectID gt {0}"'.format(self.lastObjectId)
+
+        response = self.restObj.get(url, silentMode=True)
+
+        # Some gateways ignore the filter and return the whole log
+        logEntries = sorted((entry for entry in response.json() if entry['objectID'] > self.lastObjectId),
+                            key=lambda entry: entry['objectID'])
+        for entry in logEntries:
+            self.lastObjectId = entry['objectID']
+            if self.severities and entry.get('severity') not in self.severities:
+                continue
+
+            if self.modules and not self.modules.search(entry.get('moduleName', '')):
+                continue
+
+            with self.condition:
+                self.received += 1
+                self.buffer.append((self.received, entry))
+                self.condition.notify_all()
+
+            if self.callback:
+                self.callback(entry)
+
+        return len(logEntries)
+
+    def entries(self):
+        """
+        Returns the latest entries kept in memory, oldest first.
+        """
+        with self.condition:
+            return [entry for sequence, entry in self.buffer]
+
+    def __iter__(self):
+        """
+        Yields the entries as they arrive until the follower is stopped.
+        Entries that dropped out of the buffer before they were read are skipped.
+        """
+        lastSequence = 0
+        while True:
+            with self.condition:
+                newEntries = [(sequence, entry) for sequence, entry in self.buffer if sequence > lastSequence]
+                if not newEntries:
+                    if self.finished:
+                        return
+                    self.condition.wait(self.maxInterval)
+                    continue
+
+            for sequence, entry in newEntries:
+                lastSequence = sequence
+                yield entry
+
+    def stop(self, finalPoll=True):
+        """
+        Stop following the log.
+
+        Parameters
+           finalPoll: True = Get the entries logged since the last poll.
+        """
+        self.stopEvent.set()
+        self.join()
+        if finalPoll:
+            try:
+                self.poll()
+            except Exception as errMsg:
+                self.lastError = errMsg
+
+        with self.condition:
+            self.finished = True
+            self.condition.notify_all()
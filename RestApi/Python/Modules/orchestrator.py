@@ -0,0 +1,450 @@
+"""
+Description
+   Run several IxLoad tests at the same time, each in its own session on the gateway.
+   Replaces copying LoadConfigFile.py N times and running the copies in separate shells.
+
+   A bounded pool of worker threads runs the specs. Each run has its own Main object and its
+   own log file, and a failed run doesn't stop the others. A run that fails is aborted and
+   its session is deleted. On CTRL-C or with failFast, the running tests are aborted and
+   their sessions deleted too.
+
+   Runs that share chassis ports never run at the same time: a run leases its ports from the
+   start of its test until the test is unconfigured, and the runs get the ports in the order
+   of the specs. Their sessions are still created and configured in parallel. The ports of a
+   run are those of its communityPortList and those saved in its config, read once the config
+   is loaded. Until they are known, a run conflicts with every other run.
+
+   runPipeline() runs back-to-back test lists on the same ports: the next config is loaded,
+   its ports assigned and its stats checked in a second session while the current test runs.
+   It starts as soon as the current test releases the ports. The results of a run are
+   downloaded while the next one runs.
+
+Usage:
+   import orchestrator
+
+   runSpecs = [
+       {'name': 'http', 'rxfFile': '/mnt/ixload-share/IxL_Http_Ipv4Ftp_vm_8.20.rxf',
+        'communityPortList': {'chassisIp': '192.168.70.128', 'Traffic1@Network1': [(1,1)], 'Traffic2@Network2': [(2,1)]},
+        'timelines': [{'name': 'Timeline1', 'sustainTime': 12}],
+        'statsDict': {'HTTPClient': ['HTTP Transactions', 'HTTP Simulated Users']}},
+
+       {'name': 'voip', 'crfFile': '/mnt/ixload-share/VoIP/voip.crf', 'localCrfFileToUpload': 'voip.crf',
+        'communityPortList': {'chassisIp': '192.168.70.128', 'Traffic1@Network1': [(1,2)], 'Traffic2@Network2': [(2,2)]}},
+   ]
+
+   results = orchestrator.runSessions(runSpecs, apiServerIp='192.168.70.169', apiServerIpPort=8080,
+                                      ixLoadVersion='9.00.0.347', osPlatform='linux', maxWorkers=4,
+                                      sshCredentials={'username': 'ixload', 'password': 'ixia123'})
+   for result in results:
+       print(result['name'], result['status'], result['error'])
+
+   # One test at a time on the same ports, the next one prepared while the current one runs
+   results = orchestrator.runPipeline(runSpecs, apiServerIp='192.168.70.169', ixLoadVersion='9.00.0.347')
+
+Run spec keys
+   name:                 The run name. Used for its log file and CSV files.
+   rxfFile:              The .rxf config file on the gateway server.
+   localRxfFileToUpload: Upload this local .rxf file to rxfFile first.
+   crfFile:              Or a .crf config file to import. See Main.importCrfFile.
+   localCrfFileToUpload: The local .crf file to upload.
+   communityPortList:    The chassis and the ports of each community. See Main.assignChassisAndPorts.
+   timelines:            A list of timeline overrides. Ex: [{'name': 'Timeline1', 'sustainTime': 12}]
+   statsDict:            The stats to poll while the test runs. See Main.pollStats.
+                         Unknown stat names fail the run before it waits for its ports.
+   trimStats:            True = Disable the stats that are not in statsDict. See Main.configureStats.
+   pollStatInterval:     Seconds between two stat polls. Default = 2
+   csvFile:              True = Record the polled stats to <name>_<statSource>.csv
+   resultsDir:           The result folder on the gateway. A timestamp folder is created in it.
+   downloadResults:      A local folder to download the result folder to. Requires sshCredentials.
+   deleteResults:        True = Delete the result folder on the gateway after the download.
+   licenseServerIp, licenseModel: See Main.configLicensePreferences.
+
+Requirements
+   IxL_RestApi.py
+   Optional: sshAssistant.py for downloadResults
+"""
+
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from IxL_RestApi import Main, IxLoadRestApiException
+
+
+# The run history status of each run result status
+runStatuses = {'passed': 'completed', 'failed': 'failed', 'cancelled': 'aborted'}
+
+
+class RunCancelled(Exception):
+    pass
+
+
+def runPorts(runSpec):
+    """
+    The chassis ports of a run spec: {(chassisIp, cardId, portId), ...}
+    None if the spec has no communityPortList: its ports are in its config.
+    """
+    communityPortList = runSpec.get('communityPortList')
+    if not communityPortList:
+        return None
+
+    chassisIp = communityPortList.get('chassisIp')
+    return set((chassisIp, port[-2], port[-1]) for community, ports in communityPortList.items()
+               if community != 'chassisIp' for port in ports)
+
+
+class PortLeases:
+    """
+    The chassis ports leased to the runs. A port is leased to one run at a time, and the runs
+    that share ports get them in the order of their tickets, whatever order they ask in.
+    """
+    def __init__(self):
+        self.condition = threading.Condition()
+        # {name: ports} of the runs holding their ports
+        self.holders = {}
+        # {name: (ticket, ports)} of the runs registered and not holding their ports yet
+        self.waiting = {}
+
+    @staticmethod
+    def conflict(ports, otherPorts):
+        """
+        True if two runs cannot run at the same time. Ports of None are not known: they conflict with all.
+        """
+        return ports is None or otherPorts is None or bool(ports & otherPorts)
+
+    def register(self, name, ports, ticket):
+        """
+        Take a place in the queue of the ports. Before preparing the run, so that a run prepared faster
+        does not pass the runs before it. ports = None until update() sets them.
+        """
+        with self.condition:
+            self.waiting[name] = (ticket, None if ports is None else set(ports))
+
+    def update(self, name, ports):
+        """
+        Set the ports of a registered run once they are known. Ex: read from its loaded config.
+        """
+        with self.condition:
+            ticket = self.waiting[name][0]
+            self.waiting[name] = (ticket, set(ports))
+            self.condition.notify_all()
+
+    def acquire(self, name, cancelEvent=None):
+        """
+        Block until the run holds all of its registered ports.
+        Raises RunCancelled if cancelEvent is set while waiting.
+        """
+        with self.condition:
+            ticket, ports = self.waiting[name]
+            while True:
+                busy = any(self.conflict(ports, heldPorts) for heldPorts in self.holders.values())
+                ahead = any(otherTicket < ticket and self.conflict(ports, otherPorts)
+                            for otherTicket, otherPorts in self.waiting.values())
+                if not busy and not ahead:
+                    break
+
+                if cancelEvent is not None and cancelEvent.is_set():
+                    raise RunCancelled('Cancelled while waiting for the ports')
+
+                self.condition.wait(1)
+
+            del self.waiting[name]
+            self.holders[name] = ports
+
+    def release(self, name):
+        """
+        Release the ports of a run and its place in the queue.
+        """
+        with self.condition:
+            self.waiting.pop(name, None)
+            self.holders.pop(name, None)
+            self.condition.notify_all()
+
+
+class Orchestrator:
+    def __init__(self, apiServerIp, apiServerIpPort=8080, ixLoadVersion=None, osPlatform='windows', apiKey=None,
+                 maxWorkers=4, logDir='.', sshCredentials=None, failFast=False, deleteSession=True, logStdout=False):
+        """
+        Description
+           Run several tests in parallel sessions of one gateway.
+
+        Parameters
+           apiServerIp, apiServerIpPort, apiKey, osPlatform: See IxL_RestApi.Main.
+           ixLoadVersion: <str>: The IxLoad version of the new sessions.
+           maxWorkers: <int>: The amount of tests running at the same time.
+           logDir: <str>: The folder of the log file of each run: <name>.log
+           sshCredentials: <dict>: The keyword arguments of Main.sshSetCredentials, for downloadResults.
+           failFast: <bool>: True = When a run fails, abort the running tests and skip the pending ones.
+           deleteSession: <bool>: True = Delete each session when its run is done.
+           logStdout: <bool>: True = Also print the logs of every session on stdout. They are interleaved.
+        """
+        self.apiServerIp = apiServerIp
+        self.apiServerIpPort = apiServerIpPort
+        self.ixLoadVersion = ixLoadVersion
+        self.osPlatform = osPlatform
+        self.apiKey = apiKey
+        self.maxWorkers = maxWorkers
+        self.logDir = logDir
+        self.sshCredentials = sshCredentials
+        self.failFast = failFast
+        self.deleteSession = deleteSession
+        self.logStdout = logStdout
+        self.lock = threading.Lock()
+        self.activeSessions = {}
+        self.abortedSessions = set()
+        self.cancelEvent = threading.Event()
+        self.portLeases = PortLeases()
+
+    def runSessions(self, runSpecs, maxWorkers=None):
+        """
+        Description
+           Run the specs in parallel. Blocks until all of them are done.
+
+        Parameters
+           runSpecs: <list>: See the run spec keys above.
+           maxWorkers: <int>: The amount of runs prepared or running at the same time. None = self.maxWorkers.
+
+        Return
+           One result per spec, in the order of runSpecs:
+           {'name', 'status': passed|failed|cancelled, 'sessionId', 'error', 'traceback',
+            'startTime', 'endTime', 'seconds', 'portWaitSeconds', 'resultPath', 'logFile', 'transferReport'}
+        """
+        os.makedirs(self.logDir, exist_ok=True)
+        for index, runSpec in enumerate(runSpecs):
+            runSpec.setdefault('name', 'run{0}'.format(index+1))
+
+        names = [runSpec['name'] for runSpec in runSpecs]
+        if len(set(names)) != len(names):
+            raise IxLoadRestApiException('runSessions: The run names must be unique: {0}'.format(names))
+
+        pool = ThreadPoolExecutor(max_workers=maxWorkers or self.maxWorkers)
+        try:
+            futures = [pool.submit(self.runOne, runSpec, ticket) for ticket, runSpec in enumerate(runSpecs)]
+            results = [future.result() for future in futures]
+        except KeyboardInterrupt:
+            print('\nCTRL-C detected. Aborting the running tests.')
+            self.cancel()
+            raise
+        finally:
+            pool.shutdown(wait=True)
+
+        passed = len([result for result in results if result['status'] == 'passed'])
+        print('\nrunSessions: {0}/{1} runs passed'.format(passed, len(results)))
+        return results
+
+    def runPipeline(self, runSpecs, prepareAhead=1):
+        """
+        Description
+           Run the specs one after the other, like a loop over a test list, without leaving the
+           chassis idle between two tests. While a test runs, the next prepareAhead specs are
+           loaded, their ports assigned and their stats checked in their own sessions. The next
+           test starts as soon as the current one releases its ports.
+
+           Specs that share no ports with the running test do not wait for it.
+
+        Return
+           See runSessions.
+        """
+        return self.runSessions(runSpecs, maxWorkers=prepareAhead + 1)
+
+    def runOne(self, runSpec, ticket=0):
+        """
+        Run one spec in its own session. Never raises: errors go to the result.
+        ticket: The place of the run in the queue of its ports.
+        """
+        name = runSpec['name']
+        result = {'name': name, 'status': 'failed', 'sessionId': None, 'error': None, 'traceback': None,
+                  'startTime': time.time(), 'endTime': None, 'seconds': None, 'portWaitSeconds': None,
+                  'resultPath': None, 'logFile': os.path.join(self.logDir, name + '.log'), 'transferReport': None}
+        self.portLeases.register(name, runPorts(runSpec), ticket)
+
+        restObj = None
+        try:
+            if self.cancelEvent.is_set():
+                raise RunCancelled('Cancelled before it started')
+
+            print('\nrunSessions: {0}: Starting'.format(name))
+            restObj = Main(apiServerIp=self.apiServerIp, apiServerIpPort=self.apiServerIpPort, apiKey=self.apiKey,
+                           osPlatform=self.osPlatform, deleteSession=self.deleteSession,
+                           generateRestLogFile=result['logFile'], logStdout=self.logStdout)
+            restObj.connect(self.ixLoadVersion)
+            result['sessionId'] = restObj.sessionId
+            with self.lock:
+                self.activeSessions[name] = restObj
+
+            self.configure(restObj, runSpec)
+            self.updatePorts(restObj, runSpec)
+            self.checkCancelled()
+
+            portWaitStart = time.time()
+            self.portLeases.acquire(name, self.cancelEvent)
+            result['portWaitSeconds'] = round(time.time() - portWaitStart, 3)
+            if result['portWaitSeconds'] >= 1:
+                restObj.logInfo('runSessions: {0}: Waited {1} seconds for the ports'.format(name, result['portWaitSeconds']))
+
+            # Only once the run holds its ports: it must not take them from a test that is running
+            restObj.enableForceOwnership()
+            self.run(restObj, runSpec)
+            # The test is unconfigured: the ports are free for the next run
+            self.portLeases.release(name)
+            result['resultPath'] = restObj.getResultPath()
+            if runSpec.get('downloadResults'):
+                result['transferReport'] = self.downloadResults(restObj, runSpec, result['resultPath'])
+
+            result['status'] = 'passed'
+
+        except Exception as errMsg:
+            result['status'] = 'cancelled' if isinstance(errMsg, RunCancelled) or self.cancelEvent.is_set() else 'failed'
+            result['error'] = str(errMsg)
+            result['traceback'] = traceback.format_exc()
+            if restObj:
+                restObj.logError('runSessions: {0}: {1}'.format(name, result['traceback']))
+
+            if self.failFast and result['status'] == 'failed':
+                self.cancel()
+
+        finally:
+            with self.lock:
+                self.activeSessions.pop(name, None)
+
+            if restObj and result['sessionId']:
+                self.teardown(restObj, abort=result['status'] != 'passed' and name not in self.abortedSessions,
+                              runStatus=runStatuses[result['status']])
+
+            # After the abort of a failed run, which releases its ports
+            self.portLeases.release(name)
+
+        result['endTime'] = time.time()
+        result['seconds'] = round(result['endTime'] - result['startTime'], 3)
+        print('\nrunSessions: {0}: {1} in {2} seconds{3}'.format(
+            name, result['status'], result['seconds'], ': ' + result['error'] if result['error'] else ''))
+        return result
+
+    def configure(self, restObj, runSpec):
+        """
+        Load the config of a run spec into its session.
+        """
+        if runSpec.get('licenseServerIp'):
+            restObj.configLicensePreferences(licenseServerIp=runSpec['licenseServerIp'],
+                                             licenseModel=runSpec.get('licenseModel', 'Subscription Mode'))
+
+        if runSpec.get('resultsDir'):
+            restObj.setResultDir(runSpec['resultsDir'], createTimestampFolder=True)
+
+        if runSpec.get('crfFile'):
+            restObj.importCrfFile(runSpec['crfFile'], runSpec.get('localCrfFileToUpload'))
+        else:
+            if runSpec.get('localRxfFileToUpload'):
+                restObj.uploadFile(runSpec['localRxfFileToUpload'], runSpec['rxfFile'])
+            restObj.loadConfigFile(runSpec['rxfFile'])
+
+        if runSpec.get('communityPortList'):
+            restObj.assignChassisAndPorts(runSpec['communityPortList'])
+
+        for timeline in runSpec.get('timelines', []):
+            restObj.configTimeline(**timeline)
+
+        # Pre-flight: a misspelled stat name fails now, not after waiting for the ports
+        if runSpec.get('statsDict'):
+            trimStats = runSpec.get('trimStats', False)
+            restObj.configureStats(runSpec['statsDict'], disableOthers=trimStats, dryRun=not trimStats)
+
+    def updatePorts(self, restObj, runSpec):
+        """
+        Lease the ports of the loaded config, with those of the communityPortList. If they cannot be
+        read, a spec without communityPortList keeps conflicting with every other run.
+        """
+        try:
+            assignedPorts = restObj.getAssignedPorts()
+        except Exception as errMsg:
+            restObj.logError('runSessions: {0}: Cannot read the ports of the config: {1}'.format(runSpec['name'], errMsg))
+            return
+
+        specPorts = runPorts(runSpec)
+        if specPorts is None and not assignedPorts:
+            return
+
+        self.portLeases.update(runSpec['name'], (specPorts or set()) | assignedPorts)
+
+    def run(self, restObj, runSpec):
+        """
+        Run the traffic of a configured session and wait for the test to finish.
+        """
+        restObj.runTraffic()
+        if restObj.pollStats(runSpec.get('statsDict'), pollStatInterval=runSpec.get('pollStatInterval', 2),
+                             csvFile=runSpec.get('csvFile', False), csvFilePrependName=runSpec['name']) == 1:
+            raise IxLoadRestApiException('pollStats: The test never reached the Running state')
+
+        self.checkCancelled()
+        restObj.waitForActiveTestToUnconfigure()
+
+    def downloadResults(self, restObj, runSpec, resultPath):
+        restObj.sshSetCredentials(**(self.sshCredentials or {}))
+        report = restObj.scpFiles(sourceFilePath=resultPath, destFilePath=runSpec['downloadResults'],
+                                  typeOfScp='download')
+        if runSpec.get('deleteResults'):
+            restObj.deleteFolder(filePath=resultPath)
+
+        return report
+
+    def checkCancelled(self):
+        if self.cancelEvent.is_set():
+            raise RunCancelled('Cancelled because another run failed or CTRL-C')
+
+    def teardown(self, restObj, abort=False, runStatus=None):
+        """
+        Abort the test of a failed run, then delete its session. Errors are logged, never raised:
+        one broken session must not keep the others from being cleaned up.
+        runStatus: The status of the run in the run history. See Main.deleteSessionId.
+        """
+        if abort:
+            try:
+                restObj.abortActiveTest()
+            except Exception as errMsg:
+                restObj.logError('teardown: abortActiveTest failed: {0}'.format(errMsg))
+
+        if self.deleteSession:
+            try:
+                restObj.deleteSessionId(runStatus=runStatus)
+            except Exception as errMsg:
+                restObj.logError('teardown: deleteSessionId failed: {0}'.format(errMsg))
+
+    def cancel(self):
+        """
+        Skip the runs that did not start yet and abort the tests that are running.
+        The worker of each aborted run then deletes its session.
+        """
+        self.cancelEvent.set()
+        with self.lock:
+            activeSessions = list(self.activeSessions.items())
+            self.abortedSessions.update(self.activeSessions)
+
+        for name, restObj in activeSessions:
+            try:
+                restObj.abortActiveTest()
+            except Exception as errMsg:
+                print('\nrunSessions: {0}: abort failed: {1}'.format(name, errMsg))
+
+
+def runPipeline(runSpecs, apiServerIp, apiServerIpPort=8080, ixLoadVersion=None, osPlatform='windows', apiKey=None,
+                prepareAhead=1, logDir='.', sshCredentials=None, failFast=False, deleteSession=True, logStdout=False):
+    """
+    Run the specs one after the other, preparing the next ones while one runs. See Orchestrator.runPipeline.
+    """
+    return Orchestrator(apiServerIp, apiServerIpPort=apiServerIpPort, ixLoadVersion=ixLoadVersion,
+                        osPlatform=osPlatform, apiKey=apiKey, logDir=logDir, sshCredentials=sshCredentials,
+                        failFast=failFast, deleteSession=deleteSession,
+                        logStdout=logStdout).runPipeline(runSpecs, prepareAhead=prepareAhead)
+
+
+def runSessions(runSpecs, apiServerIp, apiServerIpPort=8080, ixLoadVersion=None, osPlatform='windows', apiKey=None,
+                maxWorkers=4, logDir='.', sshCredentials=None, failFast=False, deleteSession=True, logStdout=False):
+    """
+    Run the specs in parallel sessions. See Orchestrator.
+    """
+    return Orchestrator(apiServerIp, apiServerIpPort=apiServerIpPort, ixLoadVersion=ixLoadVersion,
+                        osPlatform=osPlatform, apiKey=apiKey, maxWorkers=maxWorkers, logDir=logDir,
+                        sshCredentials=sshCredentials, failFast=failFast, deleteSession=deleteSession,
+                        logStdout=logStdout).runSessions(runSpecs)
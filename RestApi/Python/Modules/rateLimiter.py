@@ -0,0 +1,162 @@
+"""
+Description
+   A token bucket rate limiter per gateway, shared by all the scripts of a host.
+
+   The buckets are in a small state file per gateway address in the temp folder. Each
+   request locks the file, refills the buckets for the time elapsed, and takes a token.
+   All the processes of the host that talk to the same gateway share the same budget.
+
+   There are two budgets: status polls (GET) and mutating calls (POST, PATCH, DELETE, PUT).
+   A request without a token reserves the next one and sleeps until it is due, so the
+   waiting processes are served in order without polling the lock.
+
+   The time spent waiting for a token is counted per budget. limiter.metrics() returns it.
+
+Usage:
+   import rateLimiter
+
+   limiter = rateLimiter.RateLimiter('192.168.70.3:8080', pollRate=10, pollBurst=20, mutateRate=2, mutateBurst=5)
+   limiter.acquire('GET')
+   print(limiter.metrics())
+
+   With IxL_RestApi, Main.enableRateLimiter() throttles every request of Main.
+"""
+
+import os
+import re
+import struct
+import tempfile
+import threading
+import time
+
+# The two buckets: poll tokens, poll refill time, mutate tokens, mutate refill time
+stateFormat = '4d'
+stateSize = struct.calcsize(stateFormat)
+
+pollMethods = ('GET', 'HEAD', 'OPTIONS')
+
+# Seconds to wait for the lock of a state file on Windows before giving up
+lockTimeout = 60
+
+
+class RateLimiterException(Exception):
+    pass
+
+
+try:
+    import fcntl
+
+    def _lockFile(fd):
+        fcntl.flock(fd, fcntl.LOCK_EX)
+
+    def _unlockFile(fd):
+        fcntl.flock(fd, fcntl.LOCK_UN)
+
+except ImportError:
+    import msvcrt
+
+    def _lockFile(fd):
+        os.lseek(fd, 0, os.SEEK_SET)
+        deadline = time.time() + lockTimeout
+        while True:
+            try:
+                # LK_LOCK raises after trying for 10 seconds
+                msvcrt.locking(fd, msvcrt.LK_LOCK, stateSize)
+                return
+            except OSError:
+                if time.time() >= deadline:
+                    raise RateLimiterException('Could not lock the rate limiter state file in {0} seconds'.format(lockTimeout))
+
+    def _unlockFile(fd):
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, stateSize)
+
+
+class RateLimiter:
+    def __init__(self, gateway, pollRate=10, pollBurst=20, mutateRate=2, mutateBurst=5, stateDir=None):
+        """
+        Description
+           The rate limiter of a gateway.
+
+        Parameters
+           gateway: <str>: The gateway address. Ex: 192.168.70.3:8080. Processes with the same address share the budgets.
+           pollRate: <float>: GET requests per second to the gateway, for all the processes of the host. None = No limit.
+           pollBurst: <int>: The amount of GET requests that can be sent at once after an idle time.
+           mutateRate: <float>: POST, PATCH and DELETE requests per second. None = No limit.
+           mutateBurst: <int>: The amount of mutating requests that can be sent at once.
+           stateDir: <str>: The folder of the state files. None = The temp folder.
+                     All the processes must use the same folder.
+        """
+        for rate in (pollRate, mutateRate):
+            if rate is not None and rate <= 0:
+                raise RateLimiterException('RateLimiter: A rate must be above 0, or None for no limit: {0}'.format(rate))
+
+        self.gateway = gateway
+        self.budgets = {'poll': (pollRate, float(pollBurst)), 'mutate': (mutateRate, float(mutateBurst))}
+        self.stateFile = os.path.join(stateDir or tempfile.gettempdir(),
+                                      'ixLoadRateLimit_{0}.state'.format(re.sub(r'[^\w.-]', '_', gateway)))
+        self.fd = os.open(self.stateFile, os.O_RDWR | os.O_CREAT | getattr(os, 'O_BINARY', 0), 0o666)
+        self.lock = threading.Lock()
+        self.counters = {budget: {'requests': 0, 'throttled': 0, 'throttledSeconds': 0.0} for budget in self.budgets}
+
+    def _reserve(self, budget):
+        """
+        Take a token of the budget. Returns the seconds to wait until it is due.
+        """
+        rate, burst = self.budgets[budget]
+        index = 0 if budget == 'poll' else 2
+        with self.lock:
+            _lockFile(self.fd)
+            try:
+                os.lseek(self.fd, 0, os.SEEK_SET)
+                data = os.read(self.fd, stateSize)
+                now = time.time()
+                state = list(struct.unpack(stateFormat, data)) if len(data) == stateSize else [burst, now, burst, now]
+
+                tokens, refillTime = state[index], state[index + 1]
+                tokens = min(burst, tokens + max(0.0, now - refillTime) * rate)
+                # Negative tokens are reserved by the requests waiting for them
+                tokens -= 1
+                state[index], state[index + 1] = tokens, now
+
+                os.lseek(self.fd, 0, os.SEEK_SET)
+                os.write(self.fd, struct.pack(stateFormat, *state))
+            finally:
+                _unlockFile(self.fd)
+
+        return -tokens / rate if tokens < 0 else 0.0
+
+    def acquire(self, method):
+        """
+        Description
+           Wait for a token of the budget of an HTTP verb.
+
+        Return
+           The seconds spent waiting.
+        """
+        budget = 'poll' if method.upper() in pollMethods else 'mutate'
+        if self.budgets[budget][0] is None:
+            return 0.0
+
+        wait = self._reserve(budget)
+        if wait > 0:
+            time.sleep(wait)
+
+        with self.lock:
+            counters = self.counters[budget]
+            counters['requests'] += 1
+            if wait > 0:
+                counters['throttled'] += 1
+                counters['throttledSeconds'] += wait
+
+        return wait
+
+    def metrics(self):
+        """
+        Returns {'poll': {'requests', 'throttled', 'throttledSeconds'}, 'mutate': {...}} for this process.
+        """
+        with self.lock:
+            return {budget: dict(counters) for budget, counters in self.counters.items()}
+
+    def close(self):
+        os.close(self.fd)
@@ -0,0 +1,259 @@
+"""
+Description
+   Crawl a whole REST object tree (/ixLoad/test/activeTest, /ixLoad/chassisChain, ...) into
+   a local JSON mirror, for export, search and diff.
+
+   The tree is walked breadth-first by a bounded pool of worker threads, each URL once.
+   An object links to its child objects and lists in its "links". A list reply has the
+   fields and links of all its items, so the items are not fetched one by one.
+
+   The mirror is {'root', 'nodes': {url: node}, 'errors': {url: error}, 'requests', 'seconds'}
+   where a node is:
+      {'parent': url, 'depth': 0.., 'kind': 'object'|'list'|'item', 'data': {fields},
+       'links': [{'rel', 'href', 'method'}], 'children': [url, ...]}
+
+Usage:
+   import restCrawler
+
+   crawler = restCrawler.TreeCrawler(lambda url: requests.get(url).json(), baseUrl='http://192.168.70.3:8080')
+   mirror = crawler.crawl('/api/v0/sessions/2/ixLoad/test/activeTest')
+   restCrawler.writeMirror(mirror, 'activeTest.json')
+
+   print(restCrawler.searchMirror(mirror, 'HTTPClient1'))
+   print(restCrawler.diffMirrors(restCrawler.readMirror('before.json'), mirror))
+
+   With IxL_RestApi, Main.crawlTree('activeTest', jsonFile='activeTest.json')
+
+Requirements
+   Python2.7 and Python3
+"""
+
+from __future__ import absolute_import, print_function
+import json
+import threading
+import time
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+# Links that do not lead to a child object
+defaultSkipRels = ('meta', 'self', 'parent', 'docs')
+
+
+class RestCrawlerException(Exception):
+    pass
+
+
+def _urlKey(url):
+    """
+    The dedupe key of a URL. The gateway URLs are case insensitive: /ixLoad and /ixload.
+    """
+    return url.split('?')[0].rstrip('/').lower()
+
+
+class TreeCrawler:
+    def __init__(self, getJson, baseUrl='', maxWorkers=8, maxDepth=None, skipRels=defaultSkipRels, skipHrefs=('/docs', '/operations')):
+        """
+        Description
+           A breadth-first crawler of a REST object tree.
+
+        Parameters
+           getJson: A function that GETs a URL and returns its JSON reply. It is called from the worker threads.
+           baseUrl: Prepended to the hrefs of the links, which start at /api/v0. Ex: http://192.168.70.3:8080
+           maxWorkers: The amount of GETs in flight at the same time.
+           maxDepth: Do not crawl deeper than this many links below the root. None = No limit.
+           skipRels: Do not follow the links with these rels.
+           skipHrefs: Do not follow the links whose href contains one of these.
+        """
+        self.getJson = getJson
+        self.baseUrl = baseUrl.rstrip('/')
+        self.maxWorkers = maxWorkers
+        self.maxDepth = maxDepth
+        self.skipRels = set(skipRels)
+        self.skipHrefs = tuple(skipHrefs)
+
+    def fullUrl(self, href):
+        if '://' in href:
+            return href
+        return self.baseUrl + '/' + href.lstrip('/')
+
+    def crawl(self, rootUrl):
+        """
+        Description
+           Crawl the tree under rootUrl. A URL that fails is in the errors of the mirror, and its subtree is not crawled.
+
+        Parameters
+           rootUrl: A full URL or an href. Links outside of the root are not followed.
+
+        Return
+           The mirror. See the module description.
+        """
+        rootUrl = self.fullUrl(rootUrl).rstrip('/')
+        rootKey = _urlKey(rootUrl)
+        nodes = {}
+        errors = {}
+        seen = set([rootKey])
+        lock = threading.Lock()
+        pending = queue.Queue()
+        counters = {'requests': 0}
+        startTime = time.time()
+
+        def addNode(url, parent, depth, kind, data, links):
+            children = []
+            node = {'parent': parent, 'depth': depth, 'kind': kind, 'data': data, 'links': links, 'children': children}
+            with lock:
+                nodes[url] = node
+            return node
+
+        def follow(node, url, depth, links):
+            """
+            Queue the links of a node that lead to objects not seen yet under the root.
+            """
+            if self.maxDepth is not None and depth >= self.maxDepth:
+                return
+
+            for link in links:
+                href = link.get('href')
+                if not href or link.get('rel') in self.skipRels or any(skip in href for skip in self.skipHrefs):
+                    continue
+
+                childUrl = self.fullUrl(href).rstrip('/')
+                childKey = _urlKey(childUrl)
+                if not childKey.startswith(rootKey + '/'):
+                    continue
+
+                with lock:
+                    if childKey in seen:
+                        continue
+                    seen.add(childKey)
+                node['children'].append(childUrl)
+                pending.put((childUrl, url, depth + 1))
+
+        def visit(url, parent, depth):
+            try:
+                reply = self.getJson(url)
+            except Exception as errMsg:
+                with lock:
+                    errors[url] = str(errMsg)
+                return
+            finally:
+                with lock:
+                    counters['requests'] += 1
+
+            if isinstance(reply, list):
+                node = addNode(url, parent, depth, 'list', None, [])
+                for item in reply:
+                    if not isinstance(item, dict) or 'objectID' not in item:
+                        continue
+
+                    itemUrl = '{0}/{1}'.format(url, item['objectID'])
+                    with lock:
+                        if _urlKey(itemUrl) in seen:
+                            continue
+                        seen.add(_urlKey(itemUrl))
+                    node['children'].append(itemUrl)
+
+                    links = item.get('links', [])
+                    itemNode = addNode(itemUrl, url, depth + 1, 'item',
+                                       dict((key, value) for key, value in item.items() if key != 'links'), links)
+                    follow(itemNode, itemUrl, depth + 1, links)
+            else:
+                links = reply.get('links', []) if isinstance(reply, dict) else []
+                data = dict((key, value) for key, value in reply.items() if key != 'links') if isinstance(reply, dict) else reply
+                node = addNode(url, parent, depth, 'object', data, links)
+                follow(node, url, depth, links)
+
+        def worker():
+            while True:
+                task = pending.get()
+                try:
+                    if task is None:
+                        return
+                    visit(*task)
+                finally:
+                    pending.task_done()
+
+        pending.put((rootUrl, None, 0))
+        workers = [threading.Thread(target=worker, name='TreeCrawler') for index in range(self.maxWorkers)]
+        for thread in workers:
+            thread.daemon = True
+            thread.start()
+
+        pending.join()
+        for thread in workers:
+            pending.put(None)
+        for thread in workers:
+            thread.join()
+
+        for node in nodes.values():
+            node['children'].sort()
+
+        return {'root': rootUrl, 'nodes': nodes, 'errors': errors, 'requests': counters['requests'],
+                'seconds': round(time.time() - startTime, 3)}
+
+
+def writeMirror(mirror, jsonFile):
+    with open(jsonFile, 'w') as jsonFileObj:
+        json.dump(mirror, jsonFileObj, indent=2, sort_keys=True)
+
+
+def readMirror(jsonFile):
+    with open(jsonFile) as jsonFileObj:
+        return json.load(jsonFileObj)
+
+
+def searchMirror(mirror, text, fields=None):
+    """
+    Description
+       Find the nodes with a field value that contains text, case insensitive.
+
+    Parameters
+       fields: Only search these fields. Ex: ['name']. None = All the fields.
+
+    Return
+       [(url, field, value), ...] sorted by url
+    """
+    text = str(text).lower()
+    found = []
+    for url, node in mirror['nodes'].items():
+        if not isinstance(node['data'], dict):
+            continue
+
+        for field, value in node['data'].items():
+            if fields is not None and field not in fields:
+                continue
+            if not isinstance(value, (dict, list)) and text in str(value).lower():
+                found.append((url, field, value))
+
+    return sorted(found, key=lambda match: (match[0], match[1]))
+
+
+def diffMirrors(before, after):
+    """
+    Description
+       Compare two mirrors of the same tree, by the URLs relative to their roots.
+       The mirrors can be of two sessions: the session ID is in the root.
+
+    Return
+       {'added': [path, ...], 'removed': [path, ...], 'changed': {path: {field: (before, after)}}}
+    """
+    def relative(mirror):
+        root = _urlKey(mirror['root'])
+        return dict((_urlKey(url)[len(root):] or '/', node) for url, node in mirror['nodes'].items())
+
+    beforeNodes, afterNodes = relative(before), relative(after)
+    changed = {}
+    for path in set(beforeNodes) & set(afterNodes):
+        beforeData, afterData = beforeNodes[path]['data'] or {}, afterNodes[path]['data'] or {}
+        if not isinstance(beforeData, dict) or not isinstance(afterData, dict):
+            continue
+
+        fields = dict((field, (beforeData.get(field), afterData.get(field)))
+                      for field in set(beforeData) | set(afterData) if beforeData.get(field) != afterData.get(field))
+        if fields:
+            changed[path] = fields
+
+    return {'added': sorted(set(afterNodes) - set(beforeNodes)), 'removed': sorted(set(beforeNodes) - set(afterNodes)),
+            'changed': changed}
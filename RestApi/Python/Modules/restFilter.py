@@ -0,0 +1,226 @@
+"""
+Description
+   Evaluate the filter queries of the REST API locally, against lists already fetched.
+
+   The gateway filters a list with ?filter="<field> <operator> <value>":
+      eq  equal to             ne  not equal to
+      lt  lower than           gt  greater than
+      le  lower or equal to    ge  greater or equal to
+   Ex: name eq Traffic1@Network1, objectID le 10, caption eq HTTP Transactions
+
+   The same queries run here on a list of dicts or REST objects, without a round-trip.
+   A query is parsed once and kept compiled. An IndexedList indexes the fields that are
+   filtered most (name, objectID, caption) on first use: eq is a dict lookup and the
+   other operators are a bisect of the sorted values, so a query in a loop costs
+   microseconds instead of a GET.
+
+   Numbers compare as numbers, even when one side is a string: objectID le 10 matches "9".
+   Other values compare as strings. A value of another type than the query value only
+   matches ne.
+
+Usage:
+   import restFilter
+
+   communities = restFilter.IndexedList(communityList)
+   traffic1 = communities.query('name eq Traffic1@Network1')
+   lowStats = restFilter.query(configuredStats, 'objectID le 10')
+
+Requirements
+   Python2.7 and Python3
+"""
+
+from __future__ import absolute_import, print_function
+import bisect
+
+operators = ('eq', 'ne', 'lt', 'gt', 'le', 'ge')
+defaultIndexFields = ('name', 'objectID', 'caption')
+
+# The compiled queries: {expression: Filter}
+compiledFilters = {}
+maxCompiledFilters = 1000
+
+
+class RestFilterException(Exception):
+    pass
+
+
+def _key(value):
+    """
+    The comparison key of a value: (0, number) or (1, string). None for no value.
+    """
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return (0, float(value))
+    if isinstance(value, (int, float)):
+        return (0, float(value))
+
+    value = str(value)
+    try:
+        return (0, float(value))
+    except ValueError:
+        return (1, value)
+
+
+def fieldValue(item, field):
+    """
+    The value of a field of a list item: a dict, a REST object with jsonOptions, or any object with attributes.
+    """
+    if isinstance(item, dict):
+        return item.get(field)
+
+    jsonOptions = getattr(item, 'jsonOptions', None)
+    if isinstance(jsonOptions, dict) and field in jsonOptions:
+        return jsonOptions[field]
+
+    return getattr(item, field, None)
+
+
+class Filter:
+    def __init__(self, expression):
+        """
+        Description
+           A parsed filter query. Use compile() to reuse the parsed queries.
+
+        Parameters
+           expression: <field> <operator> <value>. The expression and the value can be quoted.
+        """
+        self.expression = expression
+        text = expression.strip()
+        if len(text) > 1 and text[0] == text[-1] and text[0] in '"\'':
+            text = text[1:-1].strip()
+
+        elements = text.split(None, 2)
+        if len(elements) != 3 or elements[1].lower() not in operators:
+            raise RestFilterException('Filter: Expected "<field> <{0}> <value>": {1}'.format('|'.join(operators), expression))
+
+        self.field, operator, value = elements[0], elements[1].lower(), elements[2].strip()
+        if len(value) > 1 and value[0] == value[-1] and value[0] in '"\'':
+            value = value[1:-1]
+
+        self.operator = operator
+        self.value = value
+        self.key = _key(value)
+
+    def __repr__(self):
+        return 'Filter({0} {1} {2})'.format(self.field, self.operator, self.value)
+
+    def compare(self, key):
+        if key is None or key[0] != self.key[0]:
+            return self.operator == 'ne'
+
+        if self.operator == 'eq':
+            return key == self.key
+        if self.operator == 'ne':
+            return key != self.key
+        if self.operator == 'lt':
+            return key < self.key
+        if self.operator == 'gt':
+            return key > self.key
+        if self.operator == 'le':
+            return key <= self.key
+        return key >= self.key
+
+    def matches(self, item):
+        return self.compare(_key(fieldValue(item, self.field)))
+
+    def apply(self, items):
+        """
+        The items that match, in their order. A scan of the list. See IndexedList for lookups in a loop.
+        """
+        return [item for item in items if self.matches(item)]
+
+
+def compile(expression):
+    """
+    The Filter of an expression, parsed once.
+    """
+    compiled = compiledFilters.get(expression)
+    if compiled is None:
+        if len(compiledFilters) >= maxCompiledFilters:
+            compiledFilters.clear()
+        compiled = compiledFilters[expression] = Filter(expression)
+
+    return compiled
+
+
+def query(items, expression):
+    """
+    The items of a list that match a filter query, in their order.
+    """
+    return compile(expression).apply(items)
+
+
+class IndexedList:
+    def __init__(self, items, indexFields=defaultIndexFields):
+        """
+        Description
+           A list with indexes on the fields that are filtered most. Each index is built on its first query.
+           The list is not watched: build a new IndexedList when it changes.
+
+        Parameters
+           items: A list of dicts or REST objects.
+           indexFields: The fields to index. The queries on other fields scan the list.
+        """
+        self.items = list(items)
+        self.indexFields = set(indexFields)
+        # {field: ({key: [position, ...]}, [(key, position), ...] sorted)}
+        self.indexes = {}
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def _index(self, field):
+        if field not in self.indexes:
+            byKey = {}
+            for position, item in enumerate(self.items):
+                key = _key(fieldValue(item, field))
+                if key is not None:
+                    byKey.setdefault(key, []).append(position)
+            self.indexes[field] = (byKey, sorted((key, position) for key, positions in byKey.items() for position in positions))
+
+        return self.indexes[field]
+
+    def positions(self, expression):
+        """
+        The positions of the items that match, in ascending order.
+        """
+        compiled = compile(expression)
+        if compiled.field not in self.indexFields or compiled.operator == 'ne':
+            return [position for position, item in enumerate(self.items) if compiled.matches(item)]
+
+        byKey, ordered = self._index(compiled.field)
+        if compiled.operator == 'eq':
+            return list(byKey.get(compiled.key, []))
+
+        # The keys of the same type as the value are contiguous in the sorted index: numbers, then strings
+        first = bisect.bisect_left(ordered, ((compiled.key[0],),))
+        last = bisect.bisect_left(ordered, ((compiled.key[0] + 1,),))
+        low = bisect.bisect_left(ordered, (compiled.key,), first, last)
+        high = bisect.bisect_right(ordered, (compiled.key, float('inf')), first, last)
+        if compiled.operator == 'lt':
+            selected = ordered[first:low]
+        elif compiled.operator == 'le':
+            selected = ordered[first:high]
+        elif compiled.operator == 'gt':
+            selected = ordered[high:last]
+        else:
+            selected = ordered[low:last]
+
+        return sorted(position for key, position in selected)
+
+    def query(self, expression):
+        """
+        The items that match a filter query, in their order.
+        """
+        return [self.items[position] for position in self.positions(expression)]
+
+    def first(self, expression):
+        """
+        The first item that matches, or None.
+        """
+        positions = self.positions(expression)
+        return self.items[positions[0]] if positions else None
@@ -0,0 +1,362 @@
+"""
+Description
+   Edit a local copy of a REST object tree (activities, agents, ranges, timelines, ...) as
+   plain Python attributes, then send all the changes at once with commit().
+
+   The model is built from a restCrawler mirror, so loading it costs one crawl. Setting an
+   attribute only records the change. commit() sends:
+      - one DELETE per removed object. The objects under a removed object are not sent.
+      - one PATCH per changed object, with only the fields that differ from the server.
+        Parents are patched before their children.
+      - one POST per added object. The objects added to the same list are posted in order.
+   The requests of each step go out concurrently on a bounded pool of threads.
+
+Usage:
+   import restCrawler, restModel
+
+   mirror = restCrawler.TreeCrawler(getJson, baseUrl=baseUrl).crawl(activeTestUrl)
+   model = restModel.ObjectModel(mirror, send)
+
+   for community in model.root.communityList:
+       for activity in community.activityList:
+           activity.enable = False
+   commandList = model.root.communityList.byName('Traffic1@Network1').activityList[0].agent.commandList
+   commandList.add(commandType='GET', pageObject='/32k.html')
+
+   print(model.changes())
+   model.commit()
+
+   With IxL_RestApi, Main.getObjectModel('activeTest')
+
+Requirements
+   Python2.7 and Python3
+"""
+
+from __future__ import absolute_import, print_function
+import copy
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+
+class RestModelException(Exception):
+    pass
+
+
+def _urlKey(url):
+    """
+    The path of a URL, without the host and case insensitive. The links of the tree are hrefs: /api/v0/...
+    """
+    if '://' in url:
+        url = '/' + url.split('://', 1)[1].partition('/')[2]
+    return url.rstrip('/').lower()
+
+
+def _runConcurrently(tasks, maxWorkers):
+    """
+    Run the tasks (functions without arguments) on maxWorkers threads.
+    Returns [(task, exception), ...] of the tasks that raised.
+    """
+    pending = queue.Queue()
+    for task in tasks:
+        pending.put(task)
+
+    failures = []
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            try:
+                task = pending.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                task()
+            except Exception as errMsg:
+                with lock:
+                    failures.append((task, errMsg))
+
+    threads = [threading.Thread(target=worker, name='RestModelCommit') for index in range(min(maxWorkers, len(tasks)))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return failures
+
+
+class RestObject(object):
+    """
+    One object of the tree. Its fields are attributes. Its child objects and lists are
+    attributes named after the rel of their link. Ex: activity.agent.commandList
+    """
+    def __init__(self, model, url, data, links=None):
+        object.__setattr__(self, '_model', model)
+        object.__setattr__(self, '_url', url)
+        object.__setattr__(self, '_server', copy.deepcopy(data or {}))
+        object.__setattr__(self, '_fields', copy.deepcopy(data or {}))
+        object.__setattr__(self, '_links', dict((link['rel'], link['href']) for link in links or [] if 'rel' in link and 'href' in link))
+        object.__setattr__(self, '_children', {})
+        object.__setattr__(self, '_parentList', None)
+        object.__setattr__(self, '_isRemoved', False)
+
+    def __getattr__(self, name):
+        fields = self.__dict__['_fields']
+        if name in fields:
+            return fields[name]
+
+        child = self._child(name)
+        if child is not None:
+            return child
+
+        raise AttributeError('{0} has no field or child {1}'.format(self._url or 'The new object', name))
+
+    def __setattr__(self, name, value):
+        if name.startswith('_'):
+            object.__setattr__(self, name, value)
+        else:
+            self._fields[name] = value
+
+    def __repr__(self):
+        return '<RestObject {0}>'.format(self._url or 'new')
+
+    def _child(self, rel):
+        if rel not in self._children:
+            href = self._links.get(rel)
+            self._children[rel] = self._model._nodeFor(href) if href else None
+        return self._children[rel]
+
+    def fields(self):
+        return dict(self._fields)
+
+    def url(self):
+        return self._url
+
+    def dirtyFields(self):
+        """
+        The fields set to a value that differs from the server: {field: value}
+        """
+        return dict((field, value) for field, value in self._fields.items()
+                    if field not in self._server or self._server[field] != value)
+
+    def remove(self):
+        """
+        Remove the object from its list at the next commit.
+        """
+        if self._parentList is None:
+            raise RestModelException('Only the objects of a list can be removed: {0}'.format(self._url))
+        self._parentList.remove(self)
+
+
+class RestList(object):
+    """
+    A list of the tree. add() and remove() are sent at the next commit.
+    """
+    def __init__(self, model, url):
+        self._model = model
+        self._url = url
+        self._items = []
+        self._added = []
+        self._removed = []
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __getitem__(self, index):
+        return self._items[index]
+
+    def __repr__(self):
+        return '<RestList {0}: {1} objects>'.format(self._url, len(self._items))
+
+    def url(self):
+        return self._url
+
+    def byName(self, name):
+        """
+        The first object with this name, or None.
+        """
+        for item in self._items:
+            if item._fields.get('name') == name:
+                return item
+
+    def add(self, **fields):
+        """
+        Add an object with these fields at the end of the list. It is POSTed at the next commit.
+        """
+        item = RestObject(self._model, None, {})
+        item._fields.update(fields)
+        item._parentList = self
+        self._items.append(item)
+        self._added.append(item)
+        return item
+
+    def remove(self, item):
+        self._items.remove(item)
+        item._isRemoved = True
+        if item in self._added:
+            self._added.remove(item)
+        else:
+            self._removed.append(item)
+
+
+class ObjectModel(object):
+    def __init__(self, mirror, send, maxWorkers=8):
+        """
+        Description
+           A local object model of a crawled tree.
+
+        Parameters
+           mirror: A restCrawler mirror of the tree.
+           send: A function send(method, url, payload) that sends a PATCH, POST or DELETE and returns the response.
+                 The URL of a POSTed object is taken from the Location header of the response.
+           maxWorkers: The amount of requests in flight at the same time during commit().
+        """
+        self.mirror = mirror
+        self.send = send
+        self.maxWorkers = maxWorkers
+        self.nodes = dict((_urlKey(url), (url, node)) for url, node in mirror['nodes'].items())
+        self.objects = {}
+        # The objects deleted by a commit. Their children are gone with them.
+        self.deletedUrls = set()
+        self.root = self._nodeFor(mirror['root'])
+
+    def _nodeFor(self, url):
+        """
+        The RestObject or RestList of a URL of the mirror. None if it was not crawled.
+        """
+        key = _urlKey(url)
+        if key in self.objects:
+            return self.objects[key]
+
+        if key not in self.nodes:
+            return None
+
+        nodeUrl, node = self.nodes[key]
+        if node['kind'] == 'list':
+            restList = RestList(self, nodeUrl)
+            self.objects[key] = restList
+            for childUrl in node['children']:
+                item = self._nodeFor(childUrl)
+                if item is not None:
+                    item._parentList = restList
+                    restList._items.append(item)
+            return restList
+
+        self.objects[key] = RestObject(self, nodeUrl, node['data'], node['links'])
+        return self.objects[key]
+
+    def _lists(self):
+        return [restObj for restObj in self.objects.values() if isinstance(restObj, RestList)]
+
+    def _isUnderRemoved(self, restObj):
+        """
+        True if the object is under a removed object. Its changes are not sent.
+        """
+        key = _urlKey(restObj._url or '')
+        if any(key.startswith(deletedUrl + '/') for deletedUrl in self.deletedUrls):
+            return True
+
+        for restList in self._lists():
+            for removed in restList._removed:
+                if removed is not restObj and key.startswith(_urlKey(removed._url) + '/'):
+                    return True
+        return getattr(restObj, '_isRemoved', False)
+
+    def changes(self):
+        """
+        Description
+           The requests the next commit() sends, in the order of the steps.
+
+        Return
+           [(method, url, payload), ...]
+        """
+        deletes, patchLevels, posts = self._plan()
+        plan = [('DELETE', item._url, {}) for item in deletes]
+        for depth in sorted(patchLevels):
+            plan.extend(('PATCH', restObj._url, restObj.dirtyFields()) for restObj in patchLevels[depth])
+        for restList, items in posts:
+            plan.extend(('POST', restList._url, item.fields()) for item in items)
+        return plan
+
+    def _plan(self):
+        deletes = [item for restList in self._lists() for item in restList._removed if not self._isUnderRemoved(restList)]
+        # The objects under a removed object go away with it
+        deletes = [item for item in deletes
+                   if not any(other is not item and _urlKey(item._url).startswith(_urlKey(other._url) + '/') for other in deletes)]
+
+        patchLevels = {}
+        for restObj in self.objects.values():
+            if isinstance(restObj, RestObject) and restObj._url and restObj.dirtyFields() and not self._isUnderRemoved(restObj):
+                patchLevels.setdefault(restObj._url.count('/'), []).append(restObj)
+
+        posts = [(restList, list(restList._added)) for restList in self._lists()
+                 if restList._added and not self._isUnderRemoved(restList)]
+        return deletes, patchLevels, posts
+
+    def commit(self):
+        """
+        Description
+           Send the changes: the DELETEs, then the PATCHes level by level from the root, then the POSTs.
+           The requests of a step are sent concurrently. A step starts once the step before succeeded.
+
+           The requests that succeed are applied to the model, so commit() can be called again after a failure.
+
+        Return
+           The amount of requests sent.
+        """
+        deletes, patchLevels, posts = self._plan()
+        sent = [0]
+        lock = threading.Lock()
+
+        def count():
+            with lock:
+                sent[0] += 1
+
+        def deleteTask(item):
+            def task():
+                self.send('DELETE', item._url, {})
+                count()
+                with lock:
+                    self.deletedUrls.add(_urlKey(item._url))
+                    item._parentList._removed.remove(item)
+            return task
+
+        def patchTask(restObj):
+            def task():
+                dirtyFields = restObj.dirtyFields()
+                self.send('PATCH', restObj._url, dirtyFields)
+                count()
+                restObj._server.update(copy.deepcopy(dirtyFields))
+            return task
+
+        def postTask(restList, items):
+            # One list at a time: the objects of a list are created in the order they were added
+            def task():
+                for item in items:
+                    response = self.send('POST', restList._url, item.fields())
+                    count()
+                    location = getattr(response, 'headers', {}).get('Location')
+                    item._url = '{0}/{1}'.format(restList._url, location.rstrip('/').split('/')[-1]) if location else None
+                    item._server = copy.deepcopy(item._fields)
+                    restList._added.remove(item)
+                    if item._url:
+                        self.objects[_urlKey(item._url)] = item
+            return task
+
+        steps = [[deleteTask(item) for item in deletes]]
+        steps.extend([patchTask(restObj) for restObj in patchLevels[depth]] for depth in sorted(patchLevels))
+        steps.append([postTask(restList, items) for restList, items in posts])
+
+        for tasks in steps:
+            failures = _runConcurrently(tasks, self.maxWorkers)
+            if failures:
+                raise RestModelException('commit: {0} requests failed after {1} were sent. The first error: {2}'.format(
+                    len(failures), sent[0], failures[0][1]))
+
+        return sent[0]
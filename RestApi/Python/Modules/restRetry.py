@@ -0,0 +1,198 @@
+"""
+Description
+   One retry policy for the REST requests of IxL_RestApi.Main and IxLoadUtils.
+
+   Under concurrent load the gateway rejects a request on a resource held by another
+   request with "Request made on a locked resource", and answers 503 while it is busy.
+   These replies and the connections that are reset or refused are retried with an
+   exponential backoff with jitter, bounded by maxRetries and maxElapsed seconds.
+
+   GET, PUT, PATCH and DELETE are idempotent and retried on all of them. A POST creates
+   an object or starts an operation, so it is only retried when the gateway surely did
+   not act on it: a locked resource or 503 reply, or a connection that was never
+   established. A POST whose connection was lost after it was sent is not retried.
+
+   The retries are counted per verb and per reason. policy.metrics() returns the counters.
+
+Usage:
+   import restRetry
+
+   response = restRetry.defaultPolicy.call('GET', lambda: requests.get(url), url=url)
+   print(restRetry.defaultPolicy.metrics())
+
+   # A policy of your own for a Main object
+   restObj = Main(..., retryPolicy=restRetry.RetryPolicy(maxRetries=10, maxBackoff=30))
+
+Requirements
+   Python2.7 and Python3
+"""
+
+from __future__ import absolute_import, print_function
+import errno
+import random
+import socket
+import threading
+import time
+
+import requests
+
+idempotentMethods = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'PATCH', 'DELETE')
+lockedResourceMessage = 'Request made on a locked resource'
+
+# The reasons of a retry
+locked = 'locked resource'
+unavailable = 'service unavailable'
+connectionReset = 'connection reset'
+connectFailed = 'connect failed'
+
+try:
+    from requests.packages.urllib3.exceptions import NewConnectionError, ConnectTimeoutError
+    _connectErrors = (NewConnectionError, ConnectTimeoutError)
+except ImportError:
+    _connectErrors = ()
+
+
+def _connectNeverEstablished(errMsg):
+    """
+    True if the request could not have reached the gateway: the connection was refused or timed out.
+    """
+    if isinstance(errMsg, requests.exceptions.ConnectTimeout):
+        return True
+
+    if isinstance(errMsg, requests.exceptions.RequestException):
+        # requests wraps the urllib3 error: ConnectionError(MaxRetryError(reason=NewConnectionError))
+        reason = errMsg.args[0] if errMsg.args else None
+        reason = getattr(reason, 'reason', reason)
+        return isinstance(reason, _connectErrors)
+
+    return isinstance(errMsg, socket.error) and getattr(errMsg, 'errno', None) == errno.ECONNREFUSED
+
+
+class RetryPolicy(object):
+    def __init__(self, maxRetries=5, baseBackoff=0.5, maxBackoff=8, maxElapsed=60, retryStatusCodes=(503,)):
+        """
+        Description
+           Which failed requests to retry and how long to wait between the attempts.
+
+        Parameters
+           maxRetries: <int>: The amount of retries of one request. 0 = No retry.
+           baseBackoff: <float>: Seconds to wait before the first retry. Doubled on each retry.
+           maxBackoff: <float>: The longest wait between two attempts.
+           maxElapsed: <float>: Do not retry once this many seconds went by since the first attempt.
+           retryStatusCodes: The HTTP status codes to retry. Locked resource replies are retried whatever their code.
+        """
+        self.maxRetries = maxRetries
+        self.baseBackoff = baseBackoff
+        self.maxBackoff = maxBackoff
+        self.maxElapsed = maxElapsed
+        self.retryStatusCodes = tuple(retryStatusCodes)
+        self.lock = threading.Lock()
+        self.resetMetrics()
+
+    def retryReason(self, method, response=None, errMsg=None):
+        """
+        Returns why the request should be retried, or None if it must not be.
+        """
+        if errMsg is not None:
+            if _connectNeverEstablished(errMsg):
+                return connectFailed
+
+            if isinstance(errMsg, (requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError, socket.error)):
+                # The request may have been done. Only idempotent requests can be sent again.
+                if method in idempotentMethods:
+                    return connectionReset
+
+            return None
+
+        # The gateway rejected the request without acting on it. Safe for a POST too.
+        if lockedResourceMessage in (getattr(response, 'text', None) or ''):
+            return locked
+
+        if getattr(response, 'status_code', None) in self.retryStatusCodes:
+            return unavailable
+
+        return None
+
+    def backoff(self, attempt):
+        """
+        Seconds to wait before the retry number attempt+1. Between half and all of the exponential backoff.
+        """
+        delay = min(self.maxBackoff, self.baseBackoff * (2 ** attempt))
+        return delay * random.uniform(0.5, 1)
+
+    def call(self, method, request, url=None, onRetry=None):
+        """
+        Description
+           Send a request and retry it while it fails for a retryable reason.
+
+        Parameters
+           method: <str>: The HTTP verb. Ex: GET
+           request: A function without arguments that sends the request and returns the response.
+           url: <str>: The URL, for onRetry.
+           onRetry: Called with (method, url, reason, attempt, delay) before each retry.
+
+        Return
+           The response of the last attempt. The exception of the last attempt is raised.
+        """
+        method = method.upper()
+        startTime = time.time()
+        attempt = 0
+        self._count('requests')
+        while True:
+            try:
+                response = request()
+            except Exception as errMsg:
+                reason = self.retryReason(method, errMsg=errMsg)
+                if not self._retryAllowed(reason, attempt, startTime):
+                    raise
+            else:
+                reason = self.retryReason(method, response=response)
+                if not self._retryAllowed(reason, attempt, startTime):
+                    return response
+
+            attempt += 1
+            delay = self.backoff(attempt - 1)
+            with self.lock:
+                self.counters['retries'] += 1
+                self.counters['backoffSeconds'] += delay
+                self.counters['retriesByMethod'][method] = self.counters['retriesByMethod'].get(method, 0) + 1
+                self.counters['retriesByReason'][reason] = self.counters['retriesByReason'].get(reason, 0) + 1
+
+            if onRetry:
+                onRetry(method, url, reason, attempt, delay)
+
+            time.sleep(delay)
+
+    def _retryAllowed(self, reason, attempt, startTime):
+        if reason is None:
+            return False
+
+        if attempt >= self.maxRetries or time.time() - startTime >= self.maxElapsed:
+            self._count('gaveUp')
+            return False
+
+        return True
+
+    def _count(self, counter):
+        with self.lock:
+            self.counters[counter] += 1
+
+    def metrics(self):
+        """
+        Returns a copy of the counters:
+           {'requests', 'retries', 'gaveUp', 'backoffSeconds', 'retriesByMethod': {verb: n}, 'retriesByReason': {reason: n}}
+        """
+        with self.lock:
+            metrics = dict(self.counters)
+            metrics['retriesByMethod'] = dict(self.counters['retriesByMethod'])
+            metrics['retriesByReason'] = dict(self.counters['retriesByReason'])
+            return metrics
+
+    def resetMetrics(self):
+        with self.lock:
+            self.counters = {'requests': 0, 'retries': 0, 'gaveUp': 0, 'backoffSeconds': 0.0,
+                             'retriesByMethod': {}, 'retriesByReason': {}}
+
+
+# Shared by all the Main objects and IxLoadUtils unless they are given a policy of their own
+defaultPolicy = RetryPolicy()
@@ -0,0 +1,354 @@
+"""
+Description
+   Streaming ingestion of the IxLoad result CSV files (HTTP_Client.csv, HTTP Client - Per URL.csv,
+   HTTP_Server.csv, ...) into a typed columnar format on disk.
+
+   The CSV is parsed chunk by chunk so memory stays flat no matter the size of the file.
+   Each column is typed (int, float or str) and written to its own binary file.
+   Later analyses open the columns with mmap instantly, without parsing text again.
+
+   Layout of an ingested CSV folder:
+      schema.json     The column names, types and the amount of rows.
+      <n>.bin         int64 or float64 values of column n in native byte order.
+      <n>.off, <n>.str  For str columns: int64 end offsets and the utf-8 text.
+
+Usage:
+   import resultCsv
+
+   resultCsv.ingestCsv('results/HTTP_Client.csv', 'columns/HTTP_Client')
+
+   with resultCsv.ColumnStore('columns/HTTP_Client') as store:
+       transactions = store.column('HTTP Transactions')
+       print(store.rows, max(transactions))
+
+   # Ingest every CSV of a downloaded result folder
+   resultCsv.ingestResultFolder('results/17-12-20-089862', 'columns')
+"""
+
+import array
+import csv
+import glob
+import json
+import math
+import mmap
+import os
+from collections import Counter
+
+# Values treated as a missing sample. Missing values turn an int column into a float column with NaN.
+nullValues = ('', 'N/A', 'NA', 'n/a', '-', 'nan', 'NaN')
+
+typeCodes = {'int': 'q', 'float': 'd'}
+
+
+class ResultCsvException(Exception):
+    pass
+
+
+def _inferType(values, currentType):
+    """
+    Returns the narrowest type that holds the values and the current column type.
+    int < float < str
+    """
+    if currentType == 'str':
+        return 'str'
+
+    hasNull = False
+    for value in values:
+        if value in nullValues:
+            hasNull = True
+            continue
+
+        if currentType == 'int':
+            try:
+                int(value)
+                continue
+            except ValueError:
+                currentType = 'float'
+
+        try:
+            float(value)
+        except ValueError:
+            return 'str'
+
+    if hasNull and currentType == 'int':
+        return 'float'
+
+    return currentType
+
+
+def _toFloat(value):
+    if value in nullValues:
+        return math.nan
+
+    return float(value)
+
+
+class _ColumnWriter:
+    def __init__(self, outDir, index, name):
+        self.outDir = outDir
+        self.index = index
+        self.name = name
+        self.columnType = 'int'
+        self.rows = 0
+        self.binFile = os.path.join(outDir, '{0}.bin'.format(index))
+        self.offFile = os.path.join(outDir, '{0}.off'.format(index))
+        self.strFile = os.path.join(outDir, '{0}.str'.format(index))
+        open(self.binFile, 'wb').close()
+        self.strOffset = 0
+
+    def append(self, values):
+        newType = _inferType(values, self.columnType)
+        if newType != self.columnType:
+            self._promote(newType)
+
+        if self.columnType == 'int':
+            self._appendBin(array.array('q', [int(value) for value in values]))
+        elif self.columnType == 'float':
+            self._appendBin(array.array('d', [_toFloat(value) for value in values]))
+        else:
+            self._appendStr(values)
+
+        self.rows += len(values)
+
+    def _appendBin(self, values):
+        with open(self.binFile, 'ab') as binFile:
+            values.tofile(binFile)
+
+    def _appendStr(self, values):
+        offsets = array.array('q')
+        with open(self.strFile, 'ab') as strFile:
+            for value in values:
+                data = value.encode('utf-8')
+                strFile.write(data)
+                self.strOffset += len(data)
+                offsets.append(self.strOffset)
+
+        with open(self.offFile, 'ab') as offFile:
+            offsets.tofile(offFile)
+
+    def _promote(self, newType):
+        """
+        Rewrite the values written so far with the wider type of a later chunk.
+        """
+        existing = array.array(typeCodes[self.columnType])
+        with open(self.binFile, 'rb') as binFile:
+            existing.frombytes(binFile.read())
+
+        open(self.binFile, 'wb').close()
+        if newType == 'float':
+            self._appendBin(array.array('d', existing))
+        else:
+            os.remove(self.binFile)
+            open(self.strFile, 'wb').close()
+            open(self.offFile, 'wb').close()
+            self._appendStr(['' if value != value else repr(value) for value in existing])
+
+        self.columnType = newType
+
+    def schema(self):
+        column = {'name': self.name, 'type': self.columnType}
+        if self.columnType == 'str':
+            column.update({'offsets': os.path.basename(self.offFile), 'data': os.path.basename(self.strFile)})
+        else:
+            column.update({'data': os.path.basename(self.binFile)})
+
+        return column
+
+
+def _findHeader(firstRows):
+    """
+    IxLoad CSVs may start with a few lines of test information before the column names.
+    The header is the first row that has as many fields as most of the rows.
+    """
+    lengths = Counter(len(row) for row in firstRows if len(row) > 1)
+    if not lengths:
+        return 0
+
+    mostCommonLength = lengths.most_common(1)[0][0]
+    for index, row in enumerate(firstRows):
+        if len(row) == mostCommonLength:
+            return index
+
+
+def ingestCsv(csvFile, outDir, chunkRows=50000, headerRow=None):
+    """
+    Description
+       Parse a result CSV chunk by chunk and write its typed columns to outDir.
+
+    Parameters
+       csvFile: The CSV file to ingest.
+       outDir: The folder to create for the columns.
+       chunkRows: The amount of rows parsed and written at a time.
+       headerRow: The line number of the column names, starting at 0. None = detect.
+
+    Return
+       The schema: {'source', 'rows', 'columns': [{'name', 'type', 'data', ...}]}
+    """
+    os.makedirs(outDir, exist_ok=True)
+    schemaFile = os.path.join(outDir, 'schema.json')
+    if os.path.exists(schemaFile):
+        os.remove(schemaFile)
+
+    with open(csvFile, 'r', newline='', encoding='utf-8-sig', errors='replace') as csvFileObj:
+        reader = csv.reader(csvFileObj)
+        firstRows = []
+        for row in reader:
+            firstRows.append(row)
+            if len(firstRows) == 50:
+                break
+
+        if not firstRows:
+            raise ResultCsvException('ingestCsv: {0} is empty'.format(csvFile))
+
+        if headerRow is None:
+            headerRow = _findHeader(firstRows)
+
+        header = firstRows[headerRow]
+        writers = [_ColumnWriter(outDir, index, name.strip()) for index, name in enumerate(header)]
+
+        def writeChunk(rows):
+            # Pad short rows and cut long ones so the columns stay aligned
+            rows = [row + [''] * (len(header) - len(row)) if len(row) < len(header) else row[:len(header)] for row in rows]
+            for writer, values in zip(writers, zip(*rows)):
+                writer.append(values)
+
+        chunk = [row for row in firstRows[headerRow+1:] if row]
+        for row in reader:
+            if not row:
+                continue
+
+            chunk.append(row)
+            if len(chunk) == chunkRows:
+                writeChunk(chunk)
+                chunk = []
+
+        if chunk:
+            writeChunk(chunk)
+
+    schema = {'source': os.path.abspath(csvFile), 'rows': writers[0].rows if writers else 0,
+              'columns': [writer.schema() for writer in writers]}
+
+    # The schema is written last. A folder without it is an incomplete ingestion.
+    with open(schemaFile + '.tmp', 'w') as schemaFileObj:
+        json.dump(schema, schemaFileObj, indent=2)
+    os.replace(schemaFile + '.tmp', schemaFile)
+    return schema
+
+
+def ingestResultFolder(resultDir, outDir, pattern='*.csv', chunkRows=50000):
+    """
+    Description
+       Ingest every result CSV of a downloaded result folder.
+       Each CSV goes to outDir/<CSV name without extension>.
+
+    Return
+       {csvFile: schema}
+    """
+    schemas = {}
+    for csvFile in sorted(glob.glob(os.path.join(resultDir, '**', pattern), recursive=True)):
+        name = os.path.splitext(os.path.relpath(csvFile, resultDir))[0]
+        schemas[csvFile] = ingestCsv(csvFile, os.path.join(outDir, name), chunkRows=chunkRows)
+
+    return schemas
+
+
+class StringColumn:
+    """
+    A read-only sequence over a memory-mapped str column.
+    """
+    def __init__(self, offsets, data):
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        if index < 0:
+            index += len(self)
+
+        if not 0 <= index < len(self):
+            raise IndexError('StringColumn index out of range')
+
+        start = self.offsets[index-1] if index > 0 else 0
+        return bytes(self.data[start:self.offsets[index]]).decode('utf-8')
+
+
+class ColumnStore:
+    def __init__(self, storeDir):
+        """
+        Description
+           Open an ingested CSV folder. The columns are memory-mapped on first use.
+
+        Parameters
+           storeDir: A folder created by ingestCsv().
+        """
+        schemaFile = os.path.join(storeDir, 'schema.json')
+        if not os.path.exists(schemaFile):
+            raise ResultCsvException('ColumnStore: No schema.json in {0}. Ingestion incomplete?'.format(storeDir))
+
+        with open(schemaFile) as schemaFileObj:
+            self.schema = json.load(schemaFileObj)
+
+        self.storeDir = storeDir
+        self.rows = self.schema['rows']
+        self.columnSchemas = {column['name']: column for column in self.schema['columns']}
+        self.mappedFiles = []
+        self.cache = {}
+
+    def columns(self):
+        return [column['name'] for column in self.schema['columns']]
+
+    def columnType(self, name):
+        return self.columnSchemas[name]['type']
+
+    def _map(self, fileName, typeCode):
+        path = os.path.join(self.storeDir, fileName)
+        if os.path.getsize(path) == 0:
+            return memoryview(array.array(typeCode))
+
+        with open(path, 'rb') as fileObj:
+            mapped = mmap.mmap(fileObj.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self.mappedFiles.append(mapped)
+        return memoryview(mapped).cast('B').cast(typeCode)
+
+    def column(self, name):
+        """
+        Returns a memoryview of int64/float64 values, or a StringColumn.
+        No data is copied.
+        """
+        if name not in self.columnSchemas:
+            raise ResultCsvException('ColumnStore: No such column: {0}. Columns: {1}'.format(name, self.columns()))
+
+        if name not in self.cache:
+            column = self.columnSchemas[name]
+            if column['type'] == 'str':
+                self.cache[name] = StringColumn(self._map(column['offsets'], 'q'), self._map(column['data'], 'B'))
+            else:
+                self.cache[name] = self._map(column['data'], typeCodes[column['type']])
+
+        return self.cache[name]
+
+    def close(self):
+        for view in self.cache.values():
+            if isinstance(view, StringColumn):
+                view.offsets.release()
+                view.data.release()
+            else:
+                view.release()
+
+        self.cache = {}
+        for mapped in self.mappedFiles:
+            mapped.close()
+        self.mappedFiles = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, tb):
+        self.close()
+        return False
@@ -0,0 +1,511 @@
+"""
+Description
+   Compare the stats of two test runs and flag the regressions of the candidate run.
+   Made for a nightly job that gates a release of the device under test.
+
+   Both runs are aligned on the elapsed test time and only the sustain phase is compared,
+   where the ramp-up and ramp-down of either run do not skew the numbers.
+   For each stat caption:
+      - Gauges (Ex: HTTP Concurrent Connections) compare the mean, p50 and p95 of the samples.
+      - Cumulative counters (Ex: HTTP Transactions) are turned into per-second rates first,
+        so the throughput is compared.
+      - Failure counters are also compared as a ratio of their attempts.
+        Ex: HTTP Requests Failed / HTTP Requests Sent
+   A change is a regression when it goes the wrong way by at least minChange and a Welch test
+   says it is significant. The test uses an effective sample size that accounts for the
+   autocorrelation of the samples of a stat.
+
+   All the captions of a stat source share one time axis, so the alignment is computed once per
+   time axis and each caption is a plain gather of its values. Per-URL sources with thousands
+   of captions take seconds.
+
+Usage:
+   import runCompare, runHistory
+
+   store = runHistory.RunHistoryStore('ixLoadRunHistory.db')
+   baseline = runCompare.loadRunFromStore(store, baselineRunId)
+   candidate = runCompare.loadRunFromStore(store, candidateRunId)
+
+   # Or the result folders downloaded by scpFiles
+   baseline = runCompare.loadRunFromCsv('results/baseline')
+   candidate = runCompare.loadRunFromCsv('results/candidate')
+
+   result = runCompare.compareRuns(baseline, candidate)
+   print(result.report())
+   if not result.passed:
+       sys.exit(1)
+"""
+
+import array
+import bisect
+import csv
+import glob
+import itertools
+import math
+import os
+import re
+import shutil
+import tempfile
+
+import resultCsv
+
+# Captions where a higher value is worse. Everything else is a throughput or a count of successes.
+lowerIsBetterPattern = re.compile(r'fail|error|abort|timeout|timed out|reset|drop|retr|latency|time|delay|jitter|loss',
+                                  re.IGNORECASE)
+
+# Captions that show how much load is applied. Used to find the sustain phase.
+sustainPattern = re.compile(r'simulated users|concurrent|active', re.IGNORECASE)
+
+# Captions that are never cumulative counters, even when they only go up during a run
+gaugePattern = re.compile(r'simulated users|concurrent|active|rate|throughput|/s\b|per sec|time|latency|%', re.IGNORECASE)
+
+# The denominators of a failure counter, replacing the word Failed. Successful is added to the failures.
+failureDenominators = ('Sent', 'Attempted', 'Attempts', 'Requested', 'Requests')
+
+
+class RunCompareException(Exception):
+    pass
+
+
+def _sourceKey(source):
+    """
+    HTTPClient from a run store and HTTP_Client from a result CSV are the same source.
+    """
+    return re.sub(r'[^a-z0-9]', '', source.lower())
+
+
+def _percentile(sortedValues, percent):
+    if not sortedValues:
+        return None
+
+    rank = (len(sortedValues) - 1) * percent / 100.0
+    lower = int(math.floor(rank))
+    upper = min(lower + 1, len(sortedValues) - 1)
+    return sortedValues[lower] + (sortedValues[upper] - sortedValues[lower]) * (rank - lower)
+
+
+def _toNumber(value):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+
+    return None if value != value else value
+
+
+def _parseElapsed(value):
+    """
+    Elapsed time in seconds from 90, 90.5 or 00:01:30.
+    """
+    number = _toNumber(value)
+    if number is not None:
+        return number
+
+    seconds = 0.0
+    for part in str(value).split(':'):
+        number = _toNumber(part)
+        if number is None:
+            return None
+        seconds = seconds * 60 + number
+
+    return seconds
+
+
+def loadRunFromStore(store, runId):
+    """
+    Description
+       Load the stats of a run recorded in a runHistory.RunHistoryStore.
+
+    Return
+       {source: {caption: (elapsedSeconds, values)}}. Both are array('d').
+    """
+    run = {}
+    # Captions of a source polled together have the same timestamps. Share one time axis between them.
+    timeAxes = {}
+    rows = store.runStats(runId)
+    if not rows:
+        raise RunCompareException('loadRunFromStore: runId {0} has no stats'.format(runId))
+
+    for (source, caption), samples in itertools.groupby(rows, key=lambda row: (row[0], row[1])):
+        times = array.array('d')
+        values = array.array('d')
+        for _, _, timestamp, value in samples:
+            value = _toNumber(value)
+            if value is not None:
+                times.append(timestamp / 1000.0)
+                values.append(value)
+
+        if values:
+            times = timeAxes.setdefault((source, times.tobytes()), times)
+            run.setdefault(source, {})[caption] = (times, values)
+
+    return run
+
+
+def _loadColumnStore(store, timeColumn, timeScale):
+    columns = store.columns()
+    timeName = next((name for name in columns if name.strip().lower() == timeColumn.lower()), None)
+    if timeName is None:
+        return {}
+
+    if store.columnType(timeName) == 'str':
+        elapsed = [_parseElapsed(value) for value in store.column(timeName)]
+    else:
+        elapsed = list(store.column(timeName))
+
+    # The other text columns (Ex: the URL of a per-URL CSV) identify the caption. The numeric columns are the stats.
+    keyNames = [name for name in columns if name != timeName and store.columnType(name) == 'str']
+    statNames = [name for name in columns if name != timeName and store.columnType(name) != 'str']
+
+    if keyNames:
+        keyColumns = [store.column(name) for name in keyNames]
+        rowsByKey = {}
+        for row in range(store.rows):
+            if elapsed[row] is not None:
+                key = ' | '.join(keyColumn[row] for keyColumn in keyColumns)
+                rowsByKey.setdefault(key, []).append(row)
+    else:
+        rowsByKey = {None: [row for row in range(store.rows) if elapsed[row] is not None]}
+
+    captions = {}
+    for key, rows in rowsByKey.items():
+        times = array.array('d', (elapsed[row] * timeScale for row in rows))
+        for name in statNames:
+            column = store.column(name)
+            values = array.array('d', (column[row] for row in rows))
+            caption = name if key is None else '{0} | {1}'.format(key, name)
+            # Drop the missing samples (NaN) but keep the shared time axis when there are none
+            if any(value != value for value in values):
+                pairs = [(time, value) for time, value in zip(times, values) if value == value]
+                captions[caption] = (array.array('d', (pair[0] for pair in pairs)), array.array('d', (pair[1] for pair in pairs)))
+            else:
+                captions[caption] = (times, values)
+
+    return captions
+
+
+def loadRunFromCsv(path, timeColumn='Elapsed Time', timeScale=1.0):
+    """
+    Description
+       Load the stats of a run from its result CSV files.
+
+    Parameters
+       path: A result CSV file, a downloaded result folder, or a folder ingested by resultCsv.
+       timeColumn: The column with the elapsed test time.
+       timeScale: Multiply the time column by this to get seconds. Ex: 0.001 for milliseconds.
+
+    Return
+       {source: {caption: (elapsedSeconds, values)}}. The source is the CSV file name.
+    """
+    run = {}
+    if os.path.isdir(path) and glob.glob(os.path.join(path, '**', 'schema.json'), recursive=True):
+        for schemaFile in sorted(glob.glob(os.path.join(path, '**', 'schema.json'), recursive=True)):
+            storeDir = os.path.dirname(schemaFile)
+            with resultCsv.ColumnStore(storeDir) as store:
+                run[os.path.basename(storeDir)] = _loadColumnStore(store, timeColumn, timeScale)
+    else:
+        csvFiles = sorted(glob.glob(os.path.join(path, '**', '*.csv'), recursive=True)) if os.path.isdir(path) else [path]
+        tempDir = tempfile.mkdtemp(prefix='runCompare')
+        try:
+            for index, csvFile in enumerate(csvFiles):
+                storeDir = os.path.join(tempDir, str(index))
+                resultCsv.ingestCsv(csvFile, storeDir)
+                source = os.path.splitext(os.path.basename(csvFile))[0]
+                with resultCsv.ColumnStore(storeDir) as store:
+                    run[source] = _loadColumnStore(store, timeColumn, timeScale)
+        finally:
+            shutil.rmtree(tempDir, ignore_errors=True)
+
+    run = {source: captions for source, captions in run.items() if captions}
+    if not run:
+        raise RunCompareException('loadRunFromCsv: No CSV with a "{0}" column in {1}'.format(timeColumn, path))
+
+    return run
+
+
+def _isCumulative(caption, values):
+    """
+    A counter only goes up during the run.
+    """
+    return not gaugePattern.search(caption) and len(values) > 1 and values[-1] > values[0] and all(later >= earlier for earlier, later in zip(values, values[1:]))
+
+
+def sustainWindow(run, sustainCaption=None, level=0.95):
+    """
+    Description
+       Find the sustain phase of a run: from the first to the last sample where the applied load
+       is at least level times its maximum.
+
+    Parameters
+       sustainCaption: The caption of the applied load. None = The first caption with
+                       Simulated Users, Concurrent or Active in its name.
+
+    Return
+       (startSeconds, endSeconds)
+    """
+    reference = None
+    for source in sorted(run):
+        for caption in sorted(run[source]):
+            if (caption == sustainCaption if sustainCaption else sustainPattern.search(caption)):
+                times, values = run[source][caption]
+                if values and max(values) > 0:
+                    reference = (times, values)
+                    break
+        if reference:
+            break
+
+    if reference is None:
+        if sustainCaption:
+            raise RunCompareException('sustainWindow: No such caption: {0}'.format(sustainCaption))
+
+        # No load caption. Trim 10% on each side of the run.
+        start = min(times[0] for captions in run.values() for times, values in captions.values() if times)
+        end = max(times[-1] for captions in run.values() for times, values in captions.values() if times)
+        return start + (end - start) * 0.1, end - (end - start) * 0.1
+
+    times, values = reference
+    threshold = max(values) * level
+    sustained = [time for time, value in zip(times, values) if value >= threshold]
+    return sustained[0], sustained[-1]
+
+
+def _asOfPositions(times, grid):
+    """
+    For each grid time, the index of the last sample at or before it. -1 = none.
+    """
+    return [bisect.bisect_right(times, gridTime) - 1 for gridTime in grid]
+
+
+def _summary(samples):
+    count = len(samples)
+    mean = sum(samples) / count
+    variance = sum((sample - mean) ** 2 for sample in samples) / (count - 1) if count > 1 else 0.0
+
+    # Consecutive stat samples are correlated. They carry less information than independent samples.
+    effectiveCount = count
+    if count > 2 and variance > 0:
+        lag1 = sum((samples[i] - mean) * (samples[i+1] - mean) for i in range(count - 1)) / ((count - 1) * variance)
+        if lag1 > 0:
+            effectiveCount = max(2.0, count * (1 - lag1) / (1 + lag1))
+
+    ordered = sorted(samples)
+    return {'mean': mean, 'p50': _percentile(ordered, 50), 'p95': _percentile(ordered, 95),
+            'variance': variance, 'count': effectiveCount}
+
+
+def _welchPValue(baseline, candidate):
+    """
+    Two-sided p-value of a difference of means, with the normal approximation.
+    """
+    standardError = math.sqrt(baseline['variance'] / baseline['count'] + candidate['variance'] / candidate['count'])
+    difference = candidate['mean'] - baseline['mean']
+    if standardError == 0:
+        return 1.0 if difference == 0 else 0.0
+
+    return math.erfc(abs(difference) / standardError / math.sqrt(2))
+
+
+def _proportionPValue(baselineFailures, baselineTotal, candidateFailures, candidateTotal):
+    pooled = (baselineFailures + candidateFailures) / float(baselineTotal + candidateTotal)
+    standardError = math.sqrt(pooled * (1 - pooled) * (1.0 / baselineTotal + 1.0 / candidateTotal))
+    difference = candidateFailures / float(candidateTotal) - baselineFailures / float(baselineTotal)
+    if standardError == 0:
+        return 1.0 if difference == 0 else 0.0
+
+    return math.erfc(abs(difference) / standardError / math.sqrt(2))
+
+
+def _relativeChange(baseline, candidate):
+    if baseline == 0:
+        return 0.0 if candidate == 0 else math.copysign(float('inf'), candidate)
+
+    return (candidate - baseline) / abs(baseline)
+
+
+class Comparison:
+    """
+    The result of compareRuns().
+
+    rows: One dict per compared caption: source, caption, kind (gauge, rate or failureRatio),
+          baseline, candidate (mean, or the ratio for failureRatio), baselineP50, candidateP50,
+          baselineP95, candidateP95, change (relative), pValue, regression.
+    regressions: The rows flagged as a regression.
+    window: The compared elapsed time (startSeconds, endSeconds).
+    """
+    def __init__(self, rows, window, missing):
+        self.rows = rows
+        self.window = window
+        self.missing = missing
+        self.regressions = [row for row in rows if row['regression']]
+
+    @property
+    def passed(self):
+        return not self.regressions
+
+    def report(self, limit=50):
+        lines = ['Compared {0} captions over elapsed {1:.0f}-{2:.0f}s: {3} regressions'.format(
+            len(self.rows), self.window[0], self.window[1], len(self.regressions))]
+
+        for row in sorted(self.regressions, key=lambda row: row['pValue'])[:limit]:
+            lines.append('\t{source}: {caption} [{kind}]: {baseline:.6g} -> {candidate:.6g} ({change:+.1%}) p={pValue:.2g}'.format(**row))
+
+        if self.missing:
+            lines.append('\tCaptions only in one run: {0}'.format(len(self.missing)))
+
+        return '\n'.join(lines)
+
+    def writeCsv(self, csvFile):
+        columns = ['source', 'caption', 'kind', 'baseline', 'candidate', 'baselineP50', 'candidateP50',
+                   'baselineP95', 'candidateP95', 'change', 'pValue', 'regression']
+        with open(csvFile, 'w', newline='') as csvFileObj:
+            writer = csv.DictWriter(csvFileObj, columns, extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(self.rows)
+
+
+def compareRuns(baseline, candidate, sustain=None, sustainCaption=None, alpha=0.01, minChange=0.05,
+                lowerIsBetter=None, sources=None, correction=True):
+    """
+    Description
+       Compare the sustain phase of two runs loaded by loadRunFromStore or loadRunFromCsv.
+
+    Parameters
+       sustain: (startSeconds, endSeconds) of elapsed time to compare. None = The overlap of the
+                sustain phases of both runs. See sustainWindow().
+       sustainCaption: The caption of the applied load to find the sustain phases with.
+       alpha: The p-value under which a change is significant.
+       minChange: The smallest relative change flagged as a regression. Ex: 0.05 = 5%.
+       lowerIsBetter: A function(caption) returning True when a higher value is worse.
+                      None = Captions with fail, error, timeout, latency, time, ... in their name.
+       sources: Only compare these stat sources.
+       correction: True = Divide alpha by the amount of compared captions (Bonferroni), so that
+                   per-URL sources with thousands of captions do not raise false alarms.
+
+    Return
+       A Comparison
+    """
+    if lowerIsBetter is None:
+        lowerIsBetter = lambda caption: bool(lowerIsBetterPattern.search(caption))
+
+    if sustain is None:
+        baselineWindow = sustainWindow(baseline, sustainCaption)
+        candidateWindow = sustainWindow(candidate, sustainCaption)
+        sustain = (max(baselineWindow[0], candidateWindow[0]), min(baselineWindow[1], candidateWindow[1]))
+
+    start, end = sustain
+    if end <= start:
+        raise RunCompareException('compareRuns: The sustain phases of both runs do not overlap: {0}'.format(sustain))
+
+    candidateSources = {_sourceKey(source): source for source in candidate}
+    rows = []
+    missing = []
+
+    for baselineSource in sorted(baseline):
+        if sources and baselineSource not in sources:
+            continue
+
+        candidateSource = candidateSources.get(_sourceKey(baselineSource))
+        if candidateSource is None:
+            missing.extend((baselineSource, caption) for caption in baseline[baselineSource])
+            continue
+
+        baselineCaptions = baseline[baselineSource]
+        candidateCaptions = candidate[candidateSource]
+        missing.extend((baselineSource, caption) for caption in set(baselineCaptions) ^ set(candidateCaptions))
+
+        # One grid for the source: the sustain phase at the coarsest sampling interval of both runs
+        intervals = []
+        for captions in (baselineCaptions, candidateCaptions):
+            times = next(iter(captions.values()))[0]
+            if len(times) > 1:
+                differences = sorted(later - earlier for earlier, later in zip(times, times[1:]))
+                intervals.append(differences[len(differences) // 2])
+        step = max(intervals + [1.0])
+        grid = [start + step * index for index in range(int((end - start) / step) + 1)]
+        if len(grid) < 3:
+            continue
+
+        positions = {}
+        def resample(series):
+            times, values = series
+            if id(times) not in positions:
+                positions[id(times)] = (times, _asOfPositions(times, grid))
+            indexes = positions[id(times)][1]
+            return [values[index] for index in indexes if index >= 0]
+
+        # The aligned samples of the counters, for the failure ratios
+        counters = {}
+        for caption in sorted(set(baselineCaptions) & set(candidateCaptions)):
+            baselineSamples = resample(baselineCaptions[caption])
+            candidateSamples = resample(candidateCaptions[caption])
+            if len(baselineSamples) < 3 or len(candidateSamples) < 3:
+                continue
+
+            kind = 'gauge'
+            if (_isCumulative(caption, baselineCaptions[caption][1]) and
+                    _isCumulative(caption, candidateCaptions[caption][1])):
+                kind = 'rate'
+                counters[caption] = (baselineSamples, candidateSamples)
+                baselineSamples = [(later - earlier) / step for earlier, later in zip(baselineSamples, baselineSamples[1:])]
+                candidateSamples = [(later - earlier) / step for earlier, later in zip(candidateSamples, candidateSamples[1:])]
+
+            baselineSummary = _summary(baselineSamples)
+            candidateSummary = _summary(candidateSamples)
+            change = _relativeChange(baselineSummary['mean'], candidateSummary['mean'])
+            pValue = _welchPValue(baselineSummary, candidateSummary)
+            worse = change > 0 if lowerIsBetter(caption) else change < 0
+            rows.append({'source': baselineSource, 'caption': caption, 'kind': kind,
+                         'baseline': baselineSummary['mean'], 'candidate': candidateSummary['mean'],
+                         'baselineP50': baselineSummary['p50'], 'candidateP50': candidateSummary['p50'],
+                         'baselineP95': baselineSummary['p95'], 'candidateP95': candidateSummary['p95'],
+                         'change': change, 'pValue': pValue,
+                         'regression': worse and abs(change) >= minChange})
+
+        rows.extend(_failureRatios(baselineSource, counters, minChange))
+
+    # Thousands of captions are tested at once. Bonferroni keeps the chance of any false alarm at alpha.
+    threshold = alpha / len(rows) if correction and rows else alpha
+    for row in rows:
+        row['regression'] = row['regression'] and row['pValue'] < threshold
+
+    return Comparison(rows, sustain, missing)
+
+
+def _failureRatios(source, counters, minChange):
+    """
+    Compare failure counters as a ratio of their attempts over the sustain phase.
+    """
+    rows = []
+    for caption, (baselineSamples, candidateSamples) in counters.items():
+        if 'Failed' not in caption:
+            continue
+
+        denominator = next((caption.replace('Failed', word) for word in failureDenominators
+                            if caption.replace('Failed', word) in counters), None)
+        addFailures = False
+        if denominator is None and caption.replace('Failed', 'Successful') in counters:
+            denominator = caption.replace('Failed', 'Successful')
+            addFailures = True
+        if denominator is None:
+            continue
+
+        counts = []
+        for failures, totals in ((baselineSamples, counters[denominator][0]), (candidateSamples, counters[denominator][1])):
+            failureCount = failures[-1] - failures[0]
+            totalCount = totals[-1] - totals[0] + (failureCount if addFailures else 0)
+            counts.extend([failureCount, totalCount])
+
+        baselineFailures, baselineTotal, candidateFailures, candidateTotal = counts
+        if baselineTotal <= 0 or candidateTotal <= 0 or baselineFailures < 0 or candidateFailures < 0:
+            continue
+
+        baselineRatio = baselineFailures / float(baselineTotal)
+        candidateRatio = candidateFailures / float(candidateTotal)
+        pValue = _proportionPValue(baselineFailures, baselineTotal, candidateFailures, candidateTotal)
+        rows.append({'source': source, 'caption': '{0} / {1}'.format(caption, denominator), 'kind': 'failureRatio',
+                     'baseline': baselineRatio, 'candidate': candidateRatio,
+                     'baselineP50': None, 'candidateP50': None, 'baselineP95': None, 'candidateP95': None,
+                     'change': _relativeChange(baselineRatio, candidateRatio), 'pValue': pValue,
+                     'regression': candidateRatio > baselineRatio * (1 + minChange)})
+
+    return rows
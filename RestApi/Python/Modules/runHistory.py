@@ -0,0 +1,303 @@
+"""
+Description
+   A local SQLite database of every test run: the runs, the config files (by hash),
+   the stats of each timestamp, the phase timings and the downloaded result files.
+   Query across runs without re-parsing thousands of CSV files.
+
+   The database is in WAL mode so that a reader (a dashboard, a nightly report)
+   does not block the runs that are writing into it. Stats are inserted in batches.
+
+Usage:
+   import runHistory
+
+   store = runHistory.RunHistoryStore('ixLoadRunHistory.db')
+   run = store.startRun(name='HTTP nightly', tag='nightly', configFile='IxL_Http_Ipv4Ftp_vm_8.20.rxf')
+   run.addStats('HTTPClient', 2000, {'HTTP Transactions': 1200, 'HTTP Simulated Users': 50})
+   with run.phase('runTraffic'):
+       ...
+   run.finish()
+
+   # p95 of HTTP Transactions over the last 30 nightly runs
+   store.percentile('HTTPClient', 'HTTP Transactions', 95, tag='nightly', lastRuns=30)
+
+   With IxL_RestApi, Main.enableRunHistory() does the above for pollStats, the phases and scpFiles.
+"""
+
+import contextlib
+import hashlib
+import math
+import os
+import sqlite3
+import threading
+import time
+
+schema = '''
+CREATE TABLE IF NOT EXISTS configs (
+    configId INTEGER PRIMARY KEY,
+    configHash TEXT NOT NULL UNIQUE,
+    configFile TEXT
+);
+CREATE TABLE IF NOT EXISTS runs (
+    runId INTEGER PRIMARY KEY,
+    name TEXT,
+    tag TEXT,
+    configId INTEGER REFERENCES configs(configId),
+    ixLoadVersion TEXT,
+    gateway TEXT,
+    startTime REAL NOT NULL,
+    endTime REAL,
+    status TEXT
+);
+CREATE INDEX IF NOT EXISTS runsByTag ON runs (tag, startTime);
+CREATE TABLE IF NOT EXISTS stats (
+    runId INTEGER NOT NULL,
+    source TEXT NOT NULL,
+    caption TEXT NOT NULL,
+    timestamp INTEGER NOT NULL,
+    value,
+    PRIMARY KEY (runId, source, caption, timestamp)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS phases (
+    runId INTEGER NOT NULL,
+    phase TEXT NOT NULL,
+    parent TEXT,
+    startTime REAL NOT NULL,
+    duration REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS phasesByRun ON phases (runId, phase);
+CREATE TABLE IF NOT EXISTS files (
+    runId INTEGER NOT NULL,
+    remotePath TEXT,
+    localPath TEXT,
+    size INTEGER,
+    status TEXT
+);
+CREATE INDEX IF NOT EXISTS filesByRun ON files (runId);
+'''
+
+
+class RunHistoryException(Exception):
+    pass
+
+
+def _percentile(sortedValues, percent):
+    """
+    Linear interpolation between the closest ranks.
+    """
+    if not sortedValues:
+        return None
+
+    rank = (len(sortedValues) - 1) * percent / 100.0
+    lower = int(math.floor(rank))
+    upper = min(lower + 1, len(sortedValues) - 1)
+    return sortedValues[lower] + (sortedValues[upper] - sortedValues[lower]) * (rank - lower)
+
+
+def configHash(configFile):
+    """
+    The sha256 of a local config file. For a path on the gateway server, the hash of the path.
+    """
+    digest = hashlib.sha256()
+    if configFile and os.path.isfile(configFile):
+        with open(configFile, 'rb') as configFileObj:
+            for block in iter(lambda: configFileObj.read(1048576), b''):
+                digest.update(block)
+    else:
+        digest.update(str(configFile).encode('utf-8'))
+
+    return digest.hexdigest()
+
+
+class RunHistoryStore:
+    def __init__(self, dbFile='ixLoadRunHistory.db', batchSize=5000):
+        """
+        Description
+           Open or create the run history database.
+
+        Parameters
+           dbFile: The SQLite database file.
+           batchSize: The amount of stat rows buffered before they are inserted in one transaction.
+        """
+        self.dbFile = dbFile
+        self.batchSize = batchSize
+        self.lock = threading.RLock()
+        self.pendingStats = []
+        self.connection = sqlite3.connect(dbFile, check_same_thread=False, timeout=30)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        with self.connection:
+            self.connection.executescript(schema)
+
+    def startRun(self, name=None, tag=None, configFile=None, ixLoadVersion=None, gateway=None):
+        """
+        Description
+           Record a new run.
+
+        Parameters
+           name: A name of your choice for the run.
+           tag: Groups runs for queries. Ex: nightly
+           configFile: The .rxf/.crf config file. Local files are hashed by content.
+
+        Return
+           A RunRecorder
+        """
+        with self.lock, self.connection:
+            configId = None
+            if configFile:
+                self.connection.execute('INSERT OR IGNORE INTO configs (configHash, configFile) VALUES (?, ?)',
+                                        (configHash(configFile), configFile))
+                configId = self.connection.execute('SELECT configId FROM configs WHERE configHash = ?',
+                                                   (configHash(configFile),)).fetchone()[0]
+
+            cursor = self.connection.execute(
+                'INSERT INTO runs (name, tag, configId, ixLoadVersion, gateway, startTime, status) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (name, tag, configId, ixLoadVersion, gateway, time.time(), 'running'))
+
+        return RunRecorder(self, cursor.lastrowid)
+
+    def addStats(self, runId, source, timestamp, statValues):
+        """
+        Buffer the stat values of one timestamp. Inserted once batchSize rows are buffered.
+        """
+        with self.lock:
+            self.pendingStats.extend((runId, source, caption, int(timestamp), value) for caption, value in statValues.items())
+            if len(self.pendingStats) >= self.batchSize:
+                self.flush()
+
+    def flush(self):
+        """
+        Insert the buffered stat rows in one transaction.
+        """
+        with self.lock:
+            if not self.pendingStats:
+                return
+
+            with self.connection:
+                self.connection.executemany('INSERT OR REPLACE INTO stats VALUES (?, ?, ?, ?, ?)', self.pendingStats)
+            self.pendingStats = []
+
+    def addPhase(self, runId, phase, startTime, duration, parent=None):
+        with self.lock, self.connection:
+            self.connection.execute('INSERT INTO phases VALUES (?, ?, ?, ?, ?)', (runId, phase, parent, startTime, duration))
+
+    def addFiles(self, runId, manifest):
+        """
+        Record the manifest of a result download. See sshAssistant.Connect.downloadFile.
+        """
+        with self.lock, self.connection:
+            self.connection.executemany('INSERT INTO files VALUES (?, ?, ?, ?, ?)',
+                                        [(runId, entry['remotePath'], entry['localPath'], entry.get('size'), entry['status'])
+                                         for entry in manifest])
+
+    def finishRun(self, runId, status='completed'):
+        self.flush()
+        with self.lock, self.connection:
+            self.connection.execute('UPDATE runs SET endTime = ?, status = ? WHERE runId = ?', (time.time(), status, runId))
+
+    def lastRuns(self, tag=None, lastRuns=30, status='completed'):
+        """
+        Returns the runIds of the latest runs, newest first.
+        status: Only the runs with this status. None = All the runs, also the failed and aborted ones.
+        """
+        conditions = [(column, value) for column, value in (('tag', tag), ('status', status)) if value is not None]
+        where = ' AND '.join('{0} = ?'.format(column) for column, value in conditions)
+        self.flush()
+        with self.lock:
+            rows = self.connection.execute('SELECT runId FROM runs {0} ORDER BY startTime DESC LIMIT ?'.format(
+                'WHERE ' + where if where else ''), [value for column, value in conditions] + [lastRuns])
+            return [row[0] for row in rows]
+
+    def statValues(self, source, caption, runIds):
+        """
+        Returns {runId: [(timestamp, value), ...]} ordered by timestamp.
+        """
+        self.flush()
+        values = {runId: [] for runId in runIds}
+        with self.lock:
+            for runId in runIds:
+                values[runId] = self.connection.execute(
+                    'SELECT timestamp, value FROM stats WHERE runId = ? AND source = ? AND caption = ? ORDER BY timestamp',
+                    (runId, source, caption)).fetchall()
+
+        return values
+
+    def runStats(self, runId):
+        """
+        Returns every stat row of a run: [(source, caption, timestamp, value), ...],
+        ordered by source, caption and timestamp. Reads the primary key index in order.
+        """
+        self.flush()
+        with self.lock:
+            return self.connection.execute(
+                'SELECT source, caption, timestamp, value FROM stats WHERE runId = ? ORDER BY source, caption, timestamp',
+                (runId,)).fetchall()
+
+    def percentile(self, source, caption, percent, tag=None, lastRuns=30, perRun=False, status='completed'):
+        """
+        Description
+           The percentile of a stat over the samples of the latest runs.
+
+        Parameters
+           source: The stat source. Ex: HTTPClient
+           caption: The stat name. Ex: HTTP Transactions
+           percent: Ex: 95
+           tag: Only the runs with this tag.
+           lastRuns: The amount of latest runs.
+           perRun: True = Return {runId: percentile}. False = One percentile over all the samples.
+           status: Only the runs with this status. None = All the runs.
+        """
+        runValues = self.statValues(source, caption, self.lastRuns(tag=tag, lastRuns=lastRuns, status=status))
+        if perRun:
+            return {runId: _percentile(sorted(value for timestamp, value in rows if value is not None), percent)
+                    for runId, rows in runValues.items()}
+
+        return _percentile(sorted(value for rows in runValues.values() for timestamp, value in rows if value is not None),
+                           percent)
+
+    def phaseDurations(self, phase, tag=None, lastRuns=30, status='completed'):
+        """
+        Returns {runId: total seconds spent in the phase} of the runs with this status. None = All the runs.
+        """
+        runIds = self.lastRuns(tag=tag, lastRuns=lastRuns, status=status)
+        with self.lock:
+            return {runId: self.connection.execute('SELECT TOTAL(duration) FROM phases WHERE runId = ? AND phase = ?',
+                                                   (runId, phase)).fetchone()[0]
+                    for runId in runIds}
+
+    def close(self):
+        self.flush()
+        with self.lock:
+            self.connection.close()
+
+
+class RunRecorder:
+    """
+    Writes the stats, phases and result files of one run. Returned by RunHistoryStore.startRun().
+    It is a stats sink for IxL_RestApi.Main.pollStats.
+    """
+    def __init__(self, store, runId):
+        self.store = store
+        self.runId = runId
+
+    def addStats(self, source, timestamp, statValues):
+        self.store.addStats(self.runId, source, timestamp, statValues)
+
+    def addPhase(self, phase, startTime, duration, parent=None):
+        self.store.addPhase(self.runId, phase, startTime, duration, parent=parent)
+
+    @contextlib.contextmanager
+    def phase(self, name, parent=None):
+        startTime = time.time()
+        try:
+            yield
+        finally:
+            self.addPhase(name, startTime, time.time() - startTime, parent=parent)
+
+    def addFiles(self, manifest):
+        self.store.addFiles(self.runId, manifest)
+
+    def flush(self):
+        self.store.flush()
+
+    def finish(self, status='completed'):
+        self.store.finishRun(self.runId, status=status)
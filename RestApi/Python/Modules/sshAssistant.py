@@ -13,6 +13,15 @@ Usage:
      stdout,stderr = sshClient.enterCommand('rm /mnt/ixload-share/http.rxf')
      stdout,stderr = sshClient.enterCommand('ls /mnt/ixload-share')
 
+     # Stream the output lines as they arrive, and get the exit code
+     execution = sshClient.streamCommand('tar -czf /tmp/results.tgz /mnt/ixload-share/Results', timeout=600)
+     for streamName, line in execution:
+         print(line, end='')
+     print(execution.exitCode)
+
+     # Run commands at the same time on one SSH connection
+     results = sshClient.runCommands(['du -sh /mnt/ixload-share/Results', 'df -h'], timeout=30)
+
   # windows
      stdout,stderr = sshClient.enterCommand('dir c:\\Results')
      for line in stdout:
@@ -22,8 +31,17 @@ Usage:
      sshClient.deleteFile('c:\\temp\\temp1\\file1.txt')
      sshClient.transferFile('c:\\Results\\file1.txt', '/home/hgee/file1.txt')
 
+  # Recursively download a result folder over 8 parallel SFTP channels
+     report = sshClient.downloadFile('C:/Results/17-12-20-089862', '/home/hgee/results', directory=True, channels=8)
+
+  # Or as one compressed tar stream, for folders with thousands of small files
+     report = sshClient.downloadFile('/mnt/ixload-share/Results/17-12', '/home/hgee/results', directory=True, archive=True)
+
   sshClient.close()
 
+  # One shared keep-alive connection per gateway, safe to use from several threads
+     sshClient = sshAssistant.getConnection(apiServerIp, username, password)
+
 Command line:
    Accepts password file containing the SSH password.
    You could also set the default password inside this file.
@@ -31,7 +49,9 @@ Command line:
    sshExecCommand passwordFile.txt
 """
 
-import paramiko, time, sys
+import paramiko, time, sys, os, re, stat, posixpath, queue, socket, threading, atexit, select, shlex, tarfile
+from io import StringIO
+from concurrent.futures import ThreadPoolExecutor
 
 #host = '192.168.70.169'
 #username = 'ixload'
@@ -42,14 +62,168 @@ import paramiko, time, sys
 #    with open(passwordFile, 'r') as pwdFile:
 #        password = pwdFile.read()
 
+# Errors worth retrying a file transfer for: the connection, not the file. The partial file is resumed on
+# the next attempt. IOError is OSError in Python 3: a missing file or a full disk is not retried.
+transientErrors = (socket.timeout, ConnectionError, EOFError, paramiko.SSHException)
+
+
+def remotePath(path):
+    """
+    Normalize a gateway path for SFTP. Ex: C:\\\\Results\\\\17-12 -> C:/Results/17-12
+    """
+    return re.sub(r'[\\/]+', '/', path).rstrip('/') or '/'
+
+
+class CommandTimeout(Exception):
+    pass
+
+
+class ArchiveError(Exception):
+    pass
+
+
+class _CountingReader:
+    """
+    A file object that counts the bytes read through it. For the progress of an archive stream.
+    """
+    def __init__(self, fileObj, name, progressCallback=None):
+        self.fileObj = fileObj
+        self.name = name
+        self.progressCallback = progressCallback
+        self.bytes = 0
+
+    def read(self, size=-1):
+        data = self.fileObj.read(size)
+        self.bytes += len(data)
+        if self.progressCallback:
+            self.progressCallback(self.name, self.bytes, None)
+        return data
+
+
+def _isSafeMember(member, root):
+    """
+    A tar member must not be written outside of the root folder, even through a link.
+    """
+    def inside(path):
+        path = os.path.realpath(path)
+        return path == root or path.startswith(root + os.sep)
+
+    target = os.path.join(root, *member.name.split('/'))
+    if os.path.isabs(member.name) or not inside(target):
+        return False
+
+    if member.issym():
+        return inside(os.path.join(os.path.dirname(target), member.linkname))
+
+    if member.islnk():
+        return inside(os.path.join(root, member.linkname))
+
+    return member.isfile() or member.isdir()
+
+
+class _ChannelReader:
+    """
+    Splits the stdout and stderr bytes of an exec channel into lines as they arrive.
+    """
+    def __init__(self, channel):
+        self.channel = channel
+        self.buffers = {'stdout': b'', 'stderr': b''}
+
+    def fileno(self):
+        return self.channel.fileno()
+
+    def readLines(self):
+        """
+        Returns the complete lines received so far: [(streamName, line), ...]
+        """
+        while self.channel.recv_ready():
+            self.buffers['stdout'] += self.channel.recv(32768)
+        while self.channel.recv_stderr_ready():
+            self.buffers['stderr'] += self.channel.recv_stderr(32768)
+
+        lines = []
+        for streamName, data in self.buffers.items():
+            if b'\n' in data:
+                completeLines, self.buffers[streamName] = data.rsplit(b'\n', 1)
+                lines.extend((streamName, line.decode('utf-8', 'replace') + '\n') for line in completeLines.split(b'\n'))
+
+        return lines
+
+    def remainingLines(self):
+        """
+        Returns the last lines without a line ending, once the command finished.
+        """
+        lines = self.readLines()
+        for streamName, data in self.buffers.items():
+            if data:
+                lines.append((streamName, data.decode('utf-8', 'replace')))
+                self.buffers[streamName] = b''
+
+        return lines
+
+    def finished(self):
+        # The remote host closes its side once the command exited and all its output was sent
+        return (self.channel.eof_received or self.channel.closed) and not self.channel.recv_ready() and \
+            not self.channel.recv_stderr_ready()
+
+    def exitCode(self, timeout=5):
+        # The exit status could arrive shortly after the end of the output
+        if self.channel.status_event.wait(timeout):
+            return self.channel.recv_exit_status()
+
+
+def _selectChannels(readers, timeout):
+    """
+    Wait until one of the channels has data or was closed by the remote host.
+    """
+    readable, writable, failed = select.select(readers, [], [], timeout)
+    return readable
+
+
+class CommandExecution:
+    """
+    The output of a command entered with Connect.streamCommand.
+    Iterate it for (streamName, line). The exitCode is set once the iteration is done.
+    """
+    def __init__(self, channel, command, timeout=None):
+        self.channel = channel
+        self.command = command
+        self.timeout = timeout
+        self.exitCode = None
+
+    def __iter__(self):
+        reader = _ChannelReader(self.channel)
+        deadline = None if self.timeout is None else time.time() + self.timeout
+        try:
+            while True:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    raise CommandTimeout(f'Command still running after {self.timeout} seconds: {self.command}')
+
+                if _selectChannels([reader], remaining):
+                    for line in reader.readLines():
+                        yield line
+
+                    if reader.finished():
+                        for line in reader.remainingLines():
+                            yield line
+                        break
+
+            remaining = 5 if deadline is None else max(deadline - time.time(), 0)
+            self.exitCode = reader.exitCode(timeout=remaining)
+        finally:
+            self.channel.close()
+
+
 class Connect:
-    def __init__(self, host, username, password, pkeyFile=None, port=22, timeout=10):
+    def __init__(self, host, username, password, pkeyFile=None, port=22, timeout=10, compress=True, keepAlive=30):
         self.host = host
         self.username = username
         self.password = password
         self.pkey = None
         self.port = port
         self.timeout = timeout
+        self.blockSize = 32768
 
         if pkeyFile:
             # Convert the pkey file into a string
@@ -57,27 +231,156 @@ class Connect:
             pkeyContents = pkeyFileOpen.read()
             pkeyFileOpen.close()
 
-            pkeyString = StringIO.StringIO(pkeyContents)
+            pkeyString = StringIO(pkeyContents)
             self.pkey = paramiko.RSAKey.from_private_key(pkeyString)
 
         try:
             self.sshClient = paramiko.SSHClient()
             self.sshClient.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            self.sshClient.connect(hostname=self.host, username=self.username, password=self.password, port=self.port, pkey=self.pkey, timeout=self.timeout)
-            print(f'\nSuccessfully SSH to {host}')
+            self.sshClient.connect(hostname=self.host, username=self.username, password=self.password, port=self.port, pkey=self.pkey, timeout=self.timeout,
+                                   compress=compress)
+            transport = self.sshClient.get_transport()
+            if keepAlive:
+                transport.set_keepalive(keepAlive)
+            print(f'\nSuccessfully SSH to {host}. Compression: {getattr(transport, "remote_compression", "none")}')
         except paramiko.SSHException:
             raise Exception(f'\nSSH Failed to connect: {host}')
 
-        self.sftp = self.sshClient.open_sftp()
+        # Each thread gets its own SFTP channel on the shared SSH transport. See the sftp property.
+        self.local = threading.local()
+        self.sftpLock = threading.Lock()
+        self.sftpChannels = {}
+        self.sftp = self.openSftpChannel()
+
+    @property
+    def sftp(self):
+        """
+        The SFTP channel of the calling thread, opened on first use.
+        An SFTP channel must not be used by two threads at once.
+        """
+        sftp = getattr(self.local, 'sftp', None)
+        if sftp is None or sftp.get_channel().closed:
+            sftp = self.openSftpChannel()
+            self.sftp = sftp
+
+        return sftp
+
+    @sftp.setter
+    def sftp(self, sftp):
+        thread = threading.current_thread()
+        self.local.sftp = sftp
+        with self.sftpLock:
+            # Close the channels of the threads that are gone. SSH servers limit the channels per connection.
+            for ident, (otherThread, otherSftp) in list(self.sftpChannels.items()):
+                if not otherThread.is_alive():
+                    otherSftp.close()
+                    del self.sftpChannels[ident]
+
+            self.sftpChannels[thread.ident] = (thread, sftp)
+
+    def isActive(self):
+        """
+        Returns True if the SSH transport is still connected.
+        """
+        transport = self.sshClient.get_transport()
+        return transport is not None and transport.is_active()
             
-    def enterCommand(self, command, commandInput=None):
-        stdin, stdout, stderr = self.sshClient.exec_command(command)
-        while not stdout.channel.exit_status_ready() and not stdout.channel.recv_ready():
-            time.sleep(1)
+    def enterCommand(self, command, commandInput=None, timeout=None):
+        """
+        Enter a command and wait for it to finish.
+
+        Parameters
+           command: The command to run on the remote host.
+           commandInput: Text to send to the stdin of the command.
+           timeout: Seconds to wait for the command. None = No limit.
+
+        Return
+           stdout, stderr: Lists of lines, with their line endings.
+        """
+        result = self.runCommand(command, commandInput=commandInput, timeout=timeout)
+        return result['stdout'], result['stderr']
+
+    def runCommand(self, command, commandInput=None, timeout=None):
+        """
+        Enter a command and wait for it to finish.
+
+        Return
+           {'command', 'exitCode', 'stdout', 'stderr'}. stdout and stderr are lists of lines.
+
+        Raises CommandTimeout if the command is still running after timeout seconds.
+        """
+        result = {'command': command, 'exitCode': None, 'stdout': [], 'stderr': []}
+        execution = self.streamCommand(command, commandInput=commandInput, timeout=timeout)
+        for streamName, line in execution:
+            result[streamName].append(line)
+
+        result['exitCode'] = execution.exitCode
+        return result
+
+    def streamCommand(self, command, commandInput=None, timeout=None):
+        """
+        Enter a command and get its output lines as soon as the remote host sends them.
+        The output is never buffered as a whole, so it works for commands with a lot of output.
+
+        Usage
+           execution = sshClient.streamCommand('tail -n 1000 /var/log/messages', timeout=60)
+           for streamName, line in execution:
+               print(streamName, line, end='')
+           print(execution.exitCode)
+
+        Return
+           A CommandExecution. Iterate it for (streamName, line) with streamName stdout or stderr.
+        """
+        return CommandExecution(self._openCommandChannel(command, commandInput), command, timeout)
+
+    def runCommands(self, commands, timeout=None):
+        """
+        Run several commands at the same time, each on its own channel of the SSH transport.
+        One select loop reads all of them.
+
+        Parameters
+           commands: A list of commands.
+           timeout: Seconds to wait for all of them. The commands still running are closed.
+
+        Return
+           A list of {'command', 'exitCode', 'stdout', 'stderr', 'timedOut'}, in the order of commands.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        readers = [_ChannelReader(self._openCommandChannel(command)) for command in commands]
+        results = [{'command': command, 'exitCode': None, 'stdout': [], 'stderr': [], 'timedOut': False}
+                   for command in commands]
+        running = dict(zip(readers, results))
 
-        stdoutString = stdout.readlines()
-        stderrString = stderr.readlines()
-        return stdoutString, stderrString
+        while running:
+            remaining = None if deadline is None else deadline - time.time()
+            if remaining is not None and remaining <= 0:
+                break
+
+            readable = _selectChannels(list(running), remaining)
+            for reader in readable:
+                for streamName, line in reader.readLines():
+                    running[reader][streamName].append(line)
+
+                if reader.finished():
+                    result = running.pop(reader)
+                    for streamName, line in reader.remainingLines():
+                        result[streamName].append(line)
+                    result['exitCode'] = reader.exitCode()
+
+        for reader, result in running.items():
+            result['timedOut'] = True
+            reader.channel.close()
+
+        return results
+
+    def _openCommandChannel(self, command, commandInput=None):
+        channel = self.sshClient.get_transport().open_session()
+        channel.exec_command(command)
+        if commandInput is not None:
+            channel.sendall(commandInput.encode('utf-8') if isinstance(commandInput, str) else commandInput)
+            channel.shutdown_write()
+
+        return channel
 
     def deleteFile(self, path):
         """
@@ -94,52 +397,550 @@ class Connect:
         ftpClient.get(sourceFilePath, destFilePath)
         ftpClient.close()
 
-    def downloadFile(self, remoteFile, localFile, directory=False):
-        # Copy remoteFile to localFile. Overwriting or creating as needed.
+    def openSftpChannel(self):
+        """
+        Open an additional SFTP channel on the existing SSH transport.
+        No new TCP connection or authentication is needed.
+        """
+        return paramiko.SFTPClient.from_transport(self.sshClient.get_transport())
+
+    def isRemoteDirectory(self, path):
+        """
+        Returns True if the remote path exists and is a folder.
+        """
+        try:
+            return stat.S_ISDIR(self.sftp.stat(remotePath(path)).st_mode)
+        except IOError:
+            return False
+
+    def walkRemote(self, remoteDir):
+        """
+        Walk a remote directory tree top-down like os.walk.
+
+        Yields
+           (remoteDir, [subDirNames], [SFTPAttributes of each file])
+        """
+        dirNames = []
+        fileAttrs = []
+        for attr in self.sftp.listdir_attr(remoteDir):
+            if stat.S_ISDIR(attr.st_mode):
+                dirNames.append(attr.filename)
+            else:
+                fileAttrs.append(attr)
+
+        yield remoteDir, dirNames, fileAttrs
+
+        for dirName in dirNames:
+            yield from self.walkRemote(posixpath.join(remoteDir, dirName))
+
+    def downloadFile(self, remoteFile, localFile, directory=False, channels=4, resume=False, retries=2,
+                     progressCallback=None, archive=False):
+        """
+        Copy remoteFile to localFile. Overwriting or creating as needed.
+
+        Parameters
+           remoteFile: The file or folder on the remote host. Windows paths may use either slash.
+           localFile: The local file. In directory mode, the local folder to create the remote folder in.
+           directory: True = Recursively download the remoteFile folder.
+           channels: The amount of SFTP channels opened on the SSH transport to download files in parallel.
+           resume: True = Continue partially downloaded files and skip the ones already complete.
+                   A shorter local file is only continued if its last block matches the remote file.
+                   False = Overwrite. The retries of a failed file always continue it.
+           retries: The amount of times to retry a file that failed with a transient error.
+           progressCallback: Called as progressCallback(remotePath, transferredBytes, totalBytes) after each block.
+           archive: True = In directory mode, pack the folder into one compressed tar stream on the remote host
+                    and unpack it while it downloads. See downloadArchive. Falls back to the per-file
+                    transfer if the remote host can't do it.
+
+        Return
+           A transfer report: {'files', 'failed', 'bytes', 'seconds', 'MBps', 'manifest'}
+           The manifest has one entry per file: {'remotePath', 'localPath', 'size', 'bytes', 'status', 'attempts', 'error'}
+        """
+        remoteFile = remotePath(remoteFile)
+
+        if directory and archive:
+            try:
+                return self.downloadArchive(remoteFile, localFile, progressCallback=progressCallback)
+            except (ArchiveError, tarfile.TarError, CommandTimeout) + transientErrors as errMsg:
+                print(f'\nArchive transfer of {remoteFile} failed: {errMsg}. Falling back to the per-file transfer.')
+
         if directory == False:
             print(f'\nDownloading file from: {remoteFile} to: {localFile}')
-            self.sftp.get(remoteFile, localFile)
+            attr = self.sftp.stat(remoteFile)
+            return self._runTransfers(self._getFile, [(remoteFile, localFile, attr)], channels=1, resume=resume,
+                                      retries=retries, progressCallback=progressCallback)
+
+        remoteParent = posixpath.dirname(remoteFile)
+        jobs = []
+        for remoteDir, dirNames, fileAttrs in self.walkRemote(remoteFile):
+            relativeDir = posixpath.relpath(remoteDir, remoteParent)
+            localDir = os.path.join(localFile, *relativeDir.split('/'))
+            os.makedirs(localDir, exist_ok=True)
+            for attr in fileAttrs:
+                jobs.append((posixpath.join(remoteDir, attr.filename), os.path.join(localDir, attr.filename), attr))
+
+        print(f'\nDownloading folder from: {remoteFile} to: {localFile}: {len(jobs)} files')
+        return self._runTransfers(self._getFile, jobs, channels=channels, resume=resume, retries=retries,
+                                  progressCallback=progressCallback)
+
+    def downloadArchive(self, remoteDir, localDir, timeout=None, progressCallback=None):
+        """
+        Download a folder as one compressed tar stream. The remote host runs tar and writes the
+        archive to stdout. It is unpacked while it downloads, so there is no archive file on either side.
+        Much faster than SFTP for result folders with thousands of small files: one stream instead
+        of several round-trips per file.
+
+        Linux gateways use tar. Windows gateways use the tar.exe that comes with Windows 10 and
+        Windows Server 2019 and later.
+
+        Parameters
+           remoteDir: The folder on the remote host.
+           localDir: The local folder to create the remote folder in.
+           timeout: Seconds to wait for the whole transfer. None = No limit.
+           progressCallback: Called as progressCallback(remoteDir, archiveBytes, None) as the archive downloads.
+
+        Return
+           A transfer report. See downloadFile. archiveBytes is the compressed size that was transferred.
+
+        Raises ArchiveError if tar failed on the remote host or if the archive has a member
+        that would be written outside of localDir.
+        """
+        startTime = time.time()
+        remoteDir = remotePath(remoteDir)
+        remoteParent, folderName = posixpath.split(remoteDir)
+        if re.match(r'[A-Za-z]:', remoteDir):
+            # C: alone is the current folder of drive C. A trailing backslash would escape the quote.
+            windowsParent = remoteParent.replace('/', '\\') + ('\\.' if remoteParent.endswith(':') else '')
+            command = 'tar.exe -czf - -C "{0}" "{1}"'.format(windowsParent, folderName)
+        else:
+            command = 'tar -czf - -C {0} {1}'.format(shlex.quote(remoteParent or '/'), shlex.quote(folderName))
+
+        print(f'\nDownloading folder as an archive from: {remoteDir} to: {localDir}')
+        os.makedirs(localDir, exist_ok=True)
+        root = os.path.realpath(localDir)
+        channel = self._openCommandChannel(command)
+        if timeout:
+            channel.settimeout(timeout)
+
+        archiveFile = _CountingReader(channel.makefile('rb'), remoteDir, progressCallback)
+        # Python 3.12 and later also check the members with their own data filter
+        extractFilter = {'filter': 'data'} if hasattr(tarfile, 'data_filter') else {}
+        manifest = []
+        try:
+            with tarfile.open(fileobj=archiveFile, mode='r|gz') as archive:
+                for member in archive:
+                    if not _isSafeMember(member, root):
+                        raise ArchiveError(f'Unsafe path in the archive of {remoteDir}: {member.name}')
 
-        if directory:
-            self.sftp.chdir(os.path.split(remoteFile)[0])
-            parent = os.path.split(remoteFile)[1]
+                    archive.extract(member, localDir, set_attrs=not member.isdir(), **extractFilter)
+                    if member.isfile():
+                        relativePath = posixpath.relpath(member.name, folderName)
+                        manifest.append({'remotePath': posixpath.join(remoteDir, relativePath),
+                                         'localPath': os.path.join(localDir, *member.name.split('/')),
+                                         'size': member.size, 'bytes': member.size, 'status': 'transferred',
+                                         'attempts': 1, 'error': None})
+        except socket.timeout:
+            raise CommandTimeout(f'Archive transfer still running after {timeout} seconds: {remoteDir}')
+        finally:
+            exitCode = channel.recv_exit_status() if channel.status_event.wait(5) else None
+            errorOutput = channel.recv_stderr(65536).decode('utf-8', 'replace') if channel.recv_stderr_ready() else ''
+            channel.close()
+
+        # GNU tar exits with 1 when a file changed while it was read. Ex: a result CSV of a running test
+        if exitCode not in (0, 1) or not manifest:
+            raise ArchiveError(f'tar failed on the remote host with exit code {exitCode}: {errorOutput.strip()}')
+
+        elapsedTime = max(time.time() - startTime, 0.000001)
+        transferredBytes = sum(entry['bytes'] for entry in manifest)
+        report = {'files': len(manifest), 'failed': 0, 'bytes': transferredBytes, 'archiveBytes': archiveFile.bytes,
+                  'seconds': round(elapsedTime, 3), 'MBps': round(transferredBytes / elapsedTime / 1000000, 3),
+                  'manifest': manifest}
+        print(f'\nTransferred {report["files"]} files, {transferredBytes} bytes ({archiveFile.bytes} compressed) in '
+              f'{report["seconds"]} seconds: {report["MBps"]} MB/s as one archive')
+        return report
+
+    def uploadFile(self, localFile, remoteFile, directory=False, channels=4, resume=False, retries=2,
+                   progressCallback=None):
+        """
+        Copy localFile to remoteFile. Overwriting or creating as needed.
+
+        Parameters
+           localFile: The local file or folder.
+           remoteFile: The remote file. In directory mode, the remote folder to create the local folder in.
+           directory: True = Recursively upload the localFile folder.
+           channels: The amount of SFTP channels opened on the SSH transport to upload files in parallel.
+           resume: True = Continue partially uploaded files and skip the ones already complete.
+                   A shorter remote file is only continued if its last block matches the local file.
+                   False = Overwrite. The retries of a failed file always continue it.
+           retries: The amount of times to retry a file that failed with a transient error.
+           progressCallback: Called as progressCallback(remotePath, transferredBytes, totalBytes) after each block.
+
+        Return
+           A transfer report. See downloadFile.
+        """
+        remoteFile = remotePath(remoteFile)
+
+        if directory == False:
+            print(f'\nUploading file from: {localFile} to: {remoteFile}')
+            return self._runTransfers(self._putFile, [(remoteFile, localFile, None)], channels=1, resume=resume,
+                                      retries=retries, progressCallback=progressCallback)
+
+        localFile = os.path.abspath(localFile)
+        localParent = os.path.dirname(localFile)
+        jobs = []
+        for localDir, dirNames, fileNames in os.walk(localFile):
+            relativeDir = os.path.relpath(localDir, localParent).replace(os.sep, '/')
+            remoteDir = posixpath.join(remoteFile, relativeDir)
             try:
-                os.mkdir(localFile)
-            except:
+                self.sftp.mkdir(remoteDir)
+            except IOError:
+                # Already exists
                 pass
-            
-            for walker in self.sftp_walk(parent):
-                try:
-                    os.mkdir(os.path.join(localFile, walker[0]))
-                except:
-                    pass
-                for file in walker[2]:
-                    self.get(os.path.join(walker[0], file), os.path.join(localFile, walker[0], file))
-                    
-                             
-        self.sftp.close()
-
-    def uploadFile(self, localFile, remoteFile, directory=False):
-        # Copy localFile to remoteFile. Overwriting or creating as needed.
-        if directory == False:
-            print(f'\nUploadinging file from: {localFile} to: {remoteFile}')
-            self.sftp.put(localFile, remoteFile)
-            self.sftp.close()
-
-        if directory:
-            # recursively upload a full directory
-            os.chdir(os.path.split(localFile)[0])
-            parent = os.path.split(localFile)[1]
-            for walker in os.walk(parent):
+
+            for fileName in fileNames:
+                jobs.append((posixpath.join(remoteDir, fileName), os.path.join(localDir, fileName), None))
+
+        print(f'\nUploading folder from: {localFile} to: {remoteFile}: {len(jobs)} files')
+        return self._runTransfers(self._putFile, jobs, channels=channels, resume=resume, retries=retries,
+                                  progressCallback=progressCallback)
+
+    def syncDirectory(self, remoteDir, localDir, manifest, channels=4, retries=2):
+        """
+        Incrementally mirror a remote folder that is still being written to.
+        Only new or changed files are transferred. Files that grew, like the result CSVs
+        during a run, only get the appended bytes.
+
+        Parameters
+           remoteDir: The remote folder.
+           localDir: The local folder to create the remote folder in.
+           manifest: <dict>: {remotePath: (size, mtime)} of the previous sync. Updated in place.
+                     Pass an empty dict for the first sync.
+           channels: The amount of parallel SFTP channels.
+           retries: The amount of retries for a file that failed with a transient error.
+
+        Return
+           A transfer report of the files that changed. See downloadFile.
+        """
+        remoteDir = remotePath(remoteDir)
+        remoteParent = posixpath.dirname(remoteDir)
+        jobs = []
+        try:
+            for currentDir, dirNames, fileAttrs in self.walkRemote(remoteDir):
+                relativeDir = posixpath.relpath(currentDir, remoteParent)
+                localCurrentDir = os.path.join(localDir, *relativeDir.split('/'))
+                os.makedirs(localCurrentDir, exist_ok=True)
+                for attr in fileAttrs:
+                    remoteFilePath = posixpath.join(currentDir, attr.filename)
+                    if manifest.get(remoteFilePath) != (attr.st_size, attr.st_mtime):
+                        jobs.append((remoteFilePath, os.path.join(localCurrentDir, attr.filename), attr))
+        except FileNotFoundError:
+            # The test didn't create the result folder yet
+            pass
+
+        if not jobs:
+            return {'files': 0, 'failed': 0, 'bytes': 0, 'seconds': 0, 'MBps': 0, 'manifest': []}
+
+        report = self._runTransfers(self._getFile, jobs, channels=channels, resume=True, retries=retries)
+        for (remoteFilePath, localFilePath, attr), entry in zip(jobs, report['manifest']):
+            if entry['status'] != 'failed':
+                manifest[remoteFilePath] = (attr.st_size, attr.st_mtime)
+
+        return report
+
+    def _isPartialCopy(self, sftp, remotePath, localPath, size):
+        """
+        True if the shorter file, of size bytes, ends with the same block as the same range of the other one.
+        Then it is a partial copy that can be continued, not an older version of the file.
+        """
+        length = min(self.blockSize, size)
+        with sftp.open(remotePath, 'rb') as remoteFileObj, open(localPath, 'rb') as localFileObj:
+            remoteFileObj.seek(size - length)
+            localFileObj.seek(size - length)
+            return remoteFileObj.read(length) == localFileObj.read(length)
+
+    def _getFile(self, sftp, remotePath, localPath, attr, resume=True, progressCallback=None):
+        """
+        Download one file with pipelined reads. Returns the amount of bytes transferred.
+        """
+        offset = 0
+        if resume and os.path.exists(localPath):
+            localStat = os.stat(localPath)
+            if localStat.st_size == attr.st_size and int(localStat.st_mtime) == attr.st_mtime:
+                # Completely downloaded already
+                return 0
+
+            if localStat.st_size < attr.st_size and self._isPartialCopy(sftp, remotePath, localPath, localStat.st_size):
+                offset = localStat.st_size
+
+        position = offset
+        with sftp.open(remotePath, 'rb') as remoteFileObj, open(localPath, 'ab' if offset else 'wb') as localFileObj:
+            remoteFileObj.seek(offset)
+            # Queue up all the read requests at once instead of one round-trip per block
+            remoteFileObj.prefetch(attr.st_size)
+            while True:
+                data = remoteFileObj.read(self.blockSize)
+                if not data:
+                    break
+                localFileObj.write(data)
+                position += len(data)
+                if progressCallback:
+                    progressCallback(remotePath, position, attr.st_size)
+
+        os.utime(localPath, (attr.st_atime, attr.st_mtime))
+        return position - offset
+
+    def _putFile(self, sftp, remotePath, localPath, attr=None, resume=True, progressCallback=None):
+        """
+        Upload one file with pipelined writes. Returns the amount of bytes transferred.
+        """
+        localStat = os.stat(localPath)
+        size = localStat.st_size
+        offset = 0
+        if resume:
+            try:
+                remoteAttr = sftp.stat(remotePath)
+            except IOError:
+                remoteAttr = None
+
+            if remoteAttr and remoteAttr.st_size == size and remoteAttr.st_mtime == int(localStat.st_mtime):
+                # Completely uploaded already
+                return 0
+
+            if remoteAttr and remoteAttr.st_size < size and self._isPartialCopy(sftp, remotePath, localPath, remoteAttr.st_size):
+                offset = remoteAttr.st_size
+
+        position = offset
+        with open(localPath, 'rb') as localFileObj, sftp.open(remotePath, 'ab' if offset else 'wb') as remoteFileObj:
+            # Don't wait for the server to acknowledge each write
+            remoteFileObj.set_pipelined(True)
+            localFileObj.seek(offset)
+            while True:
+                data = localFileObj.read(self.blockSize)
+                if not data:
+                    break
+                remoteFileObj.write(data)
+                position += len(data)
+                if progressCallback:
+                    progressCallback(remotePath, position, size)
+
+        sftp.utime(remotePath, (localStat.st_atime, localStat.st_mtime))
+        return position - offset
+
+    def _runTransfers(self, transferFunc, jobs, channels=4, resume=True, retries=2, progressCallback=None):
+        """
+        Fan out the file transfers across several SFTP channels of the same SSH transport.
+        Each job is (remotePath, localPath, remoteAttr).
+        """
+        startTime = time.time()
+        channels = max(1, min(channels, len(jobs)))
+
+        sftpChannels = queue.Queue()
+        if channels == 1:
+            openedChannels = []
+            sftpChannels.put(self.sftp)
+        else:
+            openedChannels = [self.openSftpChannel() for counter in range(channels)]
+            for sftp in openedChannels:
+                sftpChannels.put(sftp)
+
+        def transfer(job):
+            remoteFilePath, localFilePath, attr = job
+            entry = {'remotePath': remoteFilePath, 'localPath': localFilePath, 'size': attr.st_size if attr else None,
+                     'bytes': 0, 'status': 'failed', 'attempts': 0, 'error': None}
+            sftp = sftpChannels.get()
+            try:
+                for attempt in range(1, retries+2):
+                    entry['attempts'] = attempt
+                    try:
+                        # Resume what the previous attempt already transferred
+                        transferred = transferFunc(sftp, remoteFilePath, localFilePath, attr,
+                                                   resume=resume or attempt > 1, progressCallback=progressCallback)
+                        entry['bytes'] += transferred
+                        entry['status'] = 'transferred' if transferred else 'skipped'
+                        entry['error'] = None
+                        break
+                    except transientErrors as errMsg:
+                        entry['error'] = str(errMsg)
+                        print(f'\nTransfer failed: {remoteFilePath}: {errMsg}. Attempt {attempt}/{retries+1}')
+                        if attempt == retries+1:
+                            break
+
+                        time.sleep(min(0.5 * 2 ** (attempt-1), 5))
+                        if sftp.get_channel().closed:
+                            try:
+                                sftp = self._replaceSftpChannel(sftp, openedChannels)
+                            except transientErrors as errMsg:
+                                entry['error'] = f'Failed to reopen the SFTP channel: {errMsg}'
+                                break
+                    except Exception as errMsg:
+                        # A missing file, a permission or a full disk: retrying does not help
+                        entry['error'] = str(errMsg)
+                        print(f'\nTransfer failed: {remoteFilePath}: {errMsg}')
+                        break
+            finally:
+                sftpChannels.put(sftp)
+
+            if entry['size'] is None:
                 try:
-                    self.sftp.mkdir(os.path.join(remoteFile, walker[0]))
-                except:
+                    entry['size'] = os.path.getsize(localFilePath)
+                except OSError:
+                    # The local file to upload is gone. Its entry failed already.
                     pass
-                
-                for file in walker[2]:
-                    self.put(os.path.join(walker[0], file, os.path.join(remoteFile, walker[0], file)))
+
+            return entry
+
+        try:
+            if channels == 1:
+                manifest = [transfer(job) for job in jobs]
+            else:
+                with ThreadPoolExecutor(max_workers=channels) as pool:
+                    manifest = list(pool.map(transfer, jobs))
+        finally:
+            for sftp in openedChannels:
+                sftp.close()
+
+        elapsedTime = max(time.time() - startTime, 0.000001)
+        transferredBytes = sum(entry['bytes'] for entry in manifest)
+        report = {'files': len(jobs), 'failed': len([entry for entry in manifest if entry['status'] == 'failed']),
+                  'bytes': transferredBytes, 'seconds': round(elapsedTime, 3),
+                  'MBps': round(transferredBytes / elapsedTime / 1000000, 3), 'manifest': manifest}
+        print(f'\nTransferred {report["files"]} files, {transferredBytes} bytes in {report["seconds"]} seconds: '
+              f'{report["MBps"]} MB/s over {channels} SFTP channels. Failed: {report["failed"]}')
+        return report
+
+    def _replaceSftpChannel(self, sftp, openedChannels):
+        """
+        Reopen an SFTP channel that the server closed.
+        """
+        newSftp = self.openSftpChannel()
+        if sftp is getattr(self.local, 'sftp', None):
+            self.sftp = newSftp
+        else:
+            openedChannels.remove(sftp)
+            openedChannels.append(newSftp)
+
+        return newSftp
 
     def close(self):
-        self.sftp.close()
+        with self.sftpLock:
+            for thread, sftp in self.sftpChannels.values():
+                sftp.close()
+            self.sftpChannels = {}
+
         self.sshClient.close()
 
+
+# The pooled connections, one per gateway and user. See getConnection().
+connections = {}
+connectionsLock = threading.Lock()
+
+
+def getConnection(host, username, password, pkeyFile=None, port=22, compress=True):
+    """
+    Description
+       Returns the shared keep-alive connection to a gateway. It is created on first use
+       and created again if the previous one was dropped. Every caller shares one SSH transport,
+       so only the first call pays for the TCP connection, the key exchange and the authentication.
+
+       The connection is safe to use from several threads: each thread gets its own SFTP channel
+       and each enterCommand opens its own exec channel.
+
+    Parameters
+       Same as Connect.
+    """
+    key = (host, port, username, compress)
+    with connectionsLock:
+        connection = connections.get(key)
+        if connection is None or not connection.isActive():
+            if connection:
+                connection.close()
+
+            connection = Connect(host, username, password, pkeyFile=pkeyFile, port=port, compress=compress)
+            connections[key] = connection
+
+        return connection
+
+
+def closeConnection(host, username=None, port=22):
+    """
+    Close the pooled connections to a gateway. The next getConnection() reconnects.
+    """
+    with connectionsLock:
+        for key in [key for key in connections if key[0] == host and key[1] == port and username in (None, key[2])]:
+            connections.pop(key).close()
+
+
+def closeConnections():
+    with connectionsLock:
+        for connection in connections.values():
+            connection.close()
+        connections.clear()
+
+
+atexit.register(closeConnections)
+
+
+class DirectorySyncer(threading.Thread):
+    def __init__(self, sshClient, remoteDir, localDir, interval=30, channels=4, reconnect=None):
+        """
+        Description
+           A background thread that calls Connect.syncDirectory every interval seconds
+           so that a result folder is mostly downloaded by the time the test ends.
+
+        Parameters
+           sshClient: A Connect object. Used by this thread only until stop() returns.
+           remoteDir: The remote folder to mirror.
+           localDir: The local folder to create the remote folder in.
+           interval: Seconds between two syncs.
+           channels: The amount of parallel SFTP channels.
+           reconnect: A function returning a new Connect object when the SSH connection was dropped.
+                      Ex: lambda: getConnection(host, username, password)
+
+        Usage
+           syncer = DirectorySyncer(sshClient, '/mnt/ixload-share/Results/17-12', '/home/hgee/results')
+           syncer.start()
+           ... run the test ...
+           report = syncer.stop()
+        """
+        threading.Thread.__init__(self, name='DirectorySyncer', daemon=True)
+        self.sshClient = sshClient
+        self.remoteDir = remoteDir
+        self.localDir = localDir
+        self.interval = interval
+        self.channels = channels
+        self.reconnect = reconnect
+        self.manifest = {}
+        self.syncLock = threading.Lock()
+        self.stopEvent = threading.Event()
+        self.syncCount = 0
+        self.transferredBytes = 0
+        self.lastError = None
+
+    def run(self):
+        while not self.stopEvent.wait(self.interval):
+            try:
+                self.syncOnce()
+            except transientErrors + (OSError,) as errMsg:
+                # Try again on the next interval
+                self.lastError = errMsg
+                print(f'\nDirectorySyncer: sync failed: {errMsg}')
+
+    def syncOnce(self):
+        with self.syncLock:
+            if self.reconnect and not self.sshClient.isActive():
+                self.sshClient = self.reconnect()
+
+            report = self.sshClient.syncDirectory(self.remoteDir, self.localDir, self.manifest, channels=self.channels)
+            self.syncCount += 1
+            self.transferredBytes += report['bytes']
+            return report
+
+    def stop(self, finalSync=True):
+        """
+        Stop the background syncs. Returns the report of the final sync.
+        """
+        self.stopEvent.set()
+        self.join()
+        if finalSync:
+            return self.syncOnce()
+
@@ -0,0 +1,222 @@
+"""
+Description
+   An on-disk catalog of the stat sources and stat captions of each IxLoad version.
+   It is filled from a session once per IxLoad version. After that, captions are looked up
+   locally, misspelled captions get the closest matches as suggestions, and the statsDict
+   of pollStats is validated before any session is created.
+
+   The catalog of a version is the JSON file statCatalog_<ixLoadVersion>.json in the cache
+   folder. The stat sources of a session depend on its config: the stat sources of each new
+   config are added to the catalog of the version.
+
+Usage:
+   import statCatalog
+
+   catalog = statCatalog.StatCatalog('9.00.0.347')
+   for statSource, caption, suggestions in catalog.validate({'HTTPClient': ['HTTP Transactons']}):
+       print(statSource, caption, 'Did you mean:', suggestions)
+
+   # Raise StatCatalogException with all the problems
+   catalog.check(statsDict)
+
+   With IxL_RestApi, Main.enableStatCatalog() fills the catalog from the session.
+"""
+
+import difflib
+import json
+import os
+import re
+import time
+
+defaultCacheDir = os.path.join(os.path.expanduser('~'), '.ixLoadStatCatalog')
+
+
+class StatCatalogException(Exception):
+    pass
+
+
+def _normalize(name):
+    return ' '.join(name.lower().split())
+
+
+def closeMatches(name, names, maxMatches=3):
+    """
+    The names closest to a misspelled name, closest first. A name that only differs
+    in case or spaces comes first.
+    """
+    matches = [eachName for eachName in names if _normalize(eachName) == _normalize(name)]
+    normalizedNames = {}
+    for eachName in names:
+        normalizedNames.setdefault(_normalize(eachName), eachName)
+
+    for match in difflib.get_close_matches(_normalize(name), list(normalizedNames), n=maxMatches, cutoff=0.6):
+        if normalizedNames[match] not in matches:
+            matches.append(normalizedNames[match])
+
+    return matches[:maxMatches]
+
+
+class StatCatalog:
+    def __init__(self, ixLoadVersion, cacheDir=None):
+        """
+        Description
+           Open the catalog of an IxLoad version. Empty if it was never filled.
+
+        Parameters
+           ixLoadVersion: <str>: Ex: 9.00.0.347
+           cacheDir: <str>: The folder of the catalog files. None = ~/.ixLoadStatCatalog
+        """
+        self.ixLoadVersion = str(ixLoadVersion)
+        self.cacheDir = cacheDir or defaultCacheDir
+        self.catalogFile = os.path.join(self.cacheDir, 'statCatalog_{0}.json'.format(re.sub(r'[^\w.-]', '_', self.ixLoadVersion)))
+        self.statSources = {}
+        self.updated = None
+        self.load()
+
+    def load(self):
+        if os.path.isfile(self.catalogFile):
+            with open(self.catalogFile) as catalogFileObj:
+                catalog = json.load(catalogFileObj)
+            self.statSources = catalog['statSources']
+            self.updated = catalog.get('updated')
+
+    def save(self):
+        """
+        Write the catalog file. A reader never sees a partly written file.
+        """
+        os.makedirs(self.cacheDir, exist_ok=True)
+        tempFile = '{0}.{1}.tmp'.format(self.catalogFile, os.getpid())
+        with open(tempFile, 'w') as catalogFileObj:
+            json.dump({'ixLoadVersion': self.ixLoadVersion, 'updated': self.updated, 'statSources': self.statSources},
+                      catalogFileObj, indent=2, sort_keys=True)
+        os.replace(tempFile, self.catalogFile)
+
+    def isEmpty(self):
+        return not self.statSources
+
+    def missingSources(self, statSources):
+        """
+        The stat sources that are not in the catalog yet.
+        """
+        return [statSource for statSource in statSources if statSource not in self.statSources]
+
+    def update(self, statCatalog):
+        """
+        Description
+           Add stat sources and captions, and save the catalog if anything is new.
+
+        Parameters
+           statCatalog: {statSource: configuredStats}. The format of Main.getStatCatalog.
+                        configuredStats is a list of {'caption', ...} or a list of captions.
+
+        Return
+           True if the catalog changed.
+        """
+        changed = False
+        for statSource, configuredStats in statCatalog.items():
+            captions = self.statSources.setdefault(statSource, [])
+            for row in configuredStats:
+                caption = row['caption'] if isinstance(row, dict) else row
+                if caption not in captions:
+                    captions.append(caption)
+                    changed = True
+
+        if changed:
+            self.updated = time.time()
+            self.save()
+
+        return changed
+
+    def captions(self, statSource):
+        return list(self.statSources.get(statSource, []))
+
+    def resolveSource(self, statSource):
+        """
+        The stat source as spelled in the catalog, if it only differs in case or spaces. Else None.
+        """
+        if statSource in self.statSources:
+            return statSource
+
+        matches = [eachSource for eachSource in self.statSources if _normalize(eachSource) == _normalize(statSource)]
+        return matches[0] if len(matches) == 1 else None
+
+    def resolve(self, statSource, caption):
+        """
+        The caption as spelled in the catalog, if it only differs in case or spaces. Else None.
+        """
+        captions = self.statSources.get(self.resolveSource(statSource), [])
+        if caption in captions:
+            return caption
+
+        matches = [eachCaption for eachCaption in captions if _normalize(eachCaption) == _normalize(caption)]
+        return matches[0] if len(matches) == 1 else None
+
+    def suggest(self, statSource, caption=None, maxMatches=3):
+        """
+        The closest captions of the stat source. Without caption, the closest stat sources.
+        """
+        if caption is None:
+            return closeMatches(statSource, list(self.statSources), maxMatches)
+
+        return closeMatches(caption, self.statSources.get(self.resolveSource(statSource), []), maxMatches)
+
+    def resolveStatsDict(self, statsDict):
+        """
+        Returns a copy of a statsDict with the stat sources and captions spelled as in the catalog.
+        The unknown ones are kept as they are.
+        """
+        resolved = {}
+        for statSource, captions in statsDict.items():
+            catalogSource = self.resolveSource(statSource) or statSource
+            resolved[catalogSource] = [self.resolve(catalogSource, caption) or caption for caption in captions]
+
+        return resolved
+
+    def validate(self, statsDict):
+        """
+        Description
+           Verify the stat sources and captions of a statsDict without a session.
+
+        Return
+           [(statSource, caption, suggestions), ...] for each unknown one. caption is None for an unknown stat source.
+           Empty if all of them are in the catalog.
+        """
+        if self.isEmpty():
+            raise StatCatalogException('No stat catalog for IxLoad version {0} in {1}. Fill it with Main.enableStatCatalog()'.format(
+                self.ixLoadVersion, self.cacheDir))
+
+        problems = []
+        for statSource, captions in statsDict.items():
+            if statSource not in self.statSources:
+                problems.append((statSource, None, self.suggest(statSource)))
+                continue
+
+            for caption in captions:
+                if caption not in self.statSources[statSource]:
+                    problems.append((statSource, caption, self.suggest(statSource, caption)))
+
+        return problems
+
+    def check(self, statsDict):
+        """
+        Raise StatCatalogException with all the unknown stat sources and captions of a statsDict.
+        """
+        problems = self.validate(statsDict)
+        if problems:
+            raise StatCatalogException('Unknown stats for IxLoad version {0}:\n\t{1}'.format(
+                self.ixLoadVersion, '\n\t'.join(problemText(*problem) for problem in problems)))
+
+
+def problemText(statSource, caption, suggestions):
+    """
+    One line for a problem returned by StatCatalog.validate.
+    """
+    if caption is None:
+        text = 'Unknown stat source: {0}'.format(statSource)
+    else:
+        text = '{0}: Unknown caption: {1}'.format(statSource, caption)
+
+    if suggestions:
+        text += '. Did you mean: {0}'.format(', '.join(suggestions))
+
+    return text
@@ -0,0 +1,248 @@
+"""
+Description
+   Keep the stats of a multi-day soak run in bounded memory.
+
+   The samples of the latest recentSeconds are kept at full resolution. Older samples are
+   rolled into buckets with the min, max, mean and last value of the samples they replace.
+   Buckets go through tiers of growing size: by default 60 second buckets for 6 hours, then
+   600 second buckets for the rest of the run. A 72 hour run at a 2 second interval keeps
+   about 1100 points per stat instead of 130000.
+
+   lttb() downsamples a series for plotting (Largest-Triangle-Three-Buckets): it keeps the
+   points that preserve the visual shape of the curve, peaks and dips included.
+
+Usage:
+   import statCompaction
+
+   store = statCompaction.CompactingStatStore(recentSeconds=600)
+   restObj.pollStats(statsDict, statsSinks=[store])
+
+   times, values = store.series('HTTPClient', 'HTTP Transactions', maxPoints=1000)
+   for bucket in store.buckets('HTTPClient', 'HTTP Transactions'):
+       print(bucket['start'], bucket['min'], bucket['max'], bucket['mean'], bucket['last'])
+
+   With IxL_RestApi, Main.enableStatCompaction() adds the store to the pollStats sinks.
+"""
+
+import array
+import collections
+import csv
+import math
+
+# (bucket seconds, seconds the buckets are kept before they roll into the next tier). None = Kept.
+defaultTiers = ((60, 6 * 3600), (600, None))
+
+
+class StatCompactionException(Exception):
+    pass
+
+
+def lttb(times, values, maxPoints):
+    """
+    Description
+       Largest-Triangle-Three-Buckets downsampling.
+
+    Parameters
+       times, values: The series, ordered by time.
+       maxPoints: The amount of points to keep. The first and last points are always kept.
+
+    Return
+       (times, values) as array('d')
+    """
+    count = len(times)
+    if maxPoints >= count or maxPoints < 3:
+        return array.array('d', times), array.array('d', values)
+
+    every = (count - 2) / float(maxPoints - 2)
+    selected = [0]
+    previous = 0
+    for bucket in range(maxPoints - 2):
+        # The average point of the next bucket is the third corner of the triangles
+        nextStart = int(math.floor((bucket + 1) * every)) + 1
+        nextEnd = min(int(math.floor((bucket + 2) * every)) + 1, count)
+        span = nextEnd - nextStart
+        averageTime = sum(times[nextStart:nextEnd]) / span
+        averageValue = sum(values[nextStart:nextEnd]) / span
+
+        start = int(math.floor(bucket * every)) + 1
+        end = int(math.floor((bucket + 1) * every)) + 1
+        previousTime, previousValue = times[previous], values[previous]
+        largestArea = -1
+        for index in range(start, end):
+            area = abs((previousTime - averageTime) * (values[index] - previousValue) -
+                       (previousTime - times[index]) * (averageValue - previousValue))
+            if area > largestArea:
+                largestArea, previous = area, index
+
+        selected.append(previous)
+
+    selected.append(count - 1)
+    return array.array('d', (times[index] for index in selected)), array.array('d', (values[index] for index in selected))
+
+
+class _CompactedSeries:
+    """
+    The samples of one stat: a full resolution window, then one deque of buckets per tier.
+    A bucket is [start, count, min, max, sum, last].
+    """
+    __slots__ = ('recent', 'tiers', 'buckets')
+
+    def __init__(self, tiers):
+        self.recent = collections.deque()
+        self.tiers = tiers
+        self.buckets = [collections.deque() for tier in tiers]
+
+    def add(self, time, value, recentSeconds):
+        self.recent.append((time, value))
+        while self.recent and self.recent[0][0] <= time - recentSeconds:
+            sampleTime, sampleValue = self.recent.popleft()
+            self._merge(0, [sampleTime, 1, sampleValue, sampleValue, sampleValue, sampleValue])
+
+        for tier, (bucketSeconds, keepSeconds) in enumerate(self.tiers):
+            if keepSeconds is None:
+                continue
+
+            buckets = self.buckets[tier]
+            while buckets and buckets[0][0] + bucketSeconds <= time - recentSeconds - keepSeconds:
+                bucket = buckets.popleft()
+                if tier + 1 < len(self.tiers):
+                    self._merge(tier + 1, bucket)
+
+    def _merge(self, tier, bucket):
+        bucketSeconds = self.tiers[tier][0]
+        start = math.floor(bucket[0] / bucketSeconds) * bucketSeconds
+        buckets = self.buckets[tier]
+        if buckets and buckets[-1][0] == start:
+            last = buckets[-1]
+            last[1] += bucket[1]
+            last[2] = min(last[2], bucket[2])
+            last[3] = max(last[3], bucket[3])
+            last[4] += bucket[4]
+            last[5] = bucket[5]
+        else:
+            buckets.append([start, bucket[1], bucket[2], bucket[3], bucket[4], bucket[5]])
+
+    def allBuckets(self):
+        """
+        The buckets of all the tiers, oldest first, with their size in seconds.
+        """
+        for tier in range(len(self.tiers) - 1, -1, -1):
+            for bucket in self.buckets[tier]:
+                yield self.tiers[tier][0], bucket
+
+
+class CompactingStatStore:
+    def __init__(self, recentSeconds=600, tiers=defaultTiers, timeScale=0.001, sources=None):
+        """
+        Description
+           A pollStats sink that keeps the recent samples and compacts the older ones.
+
+        Parameters
+           recentSeconds: The samples of the latest recentSeconds are kept at full resolution. 0 = Compact all of them.
+           tiers: ((bucketSeconds, keepSeconds), ...): The bucket tiers, smallest bucket first. Each bucket
+                  size must be a multiple of the one before. keepSeconds = None keeps the buckets of the tier.
+                  The buckets of the last tier are dropped after keepSeconds if it is not None.
+           timeScale: Multiply the polled timestamps by this to get seconds. pollStats timestamps are milliseconds.
+           sources: Only these stat sources. None = All.
+        """
+        if recentSeconds < 0:
+            raise StatCompactionException('CompactingStatStore: recentSeconds cannot be negative: {0}'.format(recentSeconds))
+
+        tiers = tuple(tuple(tier) for tier in tiers)
+        if not tiers:
+            raise StatCompactionException('CompactingStatStore: At least one tier is required')
+
+        for (smaller, keep), (larger, nextKeep) in zip(tiers, tiers[1:]):
+            if larger % smaller or keep is None:
+                raise StatCompactionException('CompactingStatStore: Each bucket size must be a multiple of the one '
+                                              'before, and only the last tier can keep its buckets: {0}'.format(tiers))
+
+        self.recentSeconds = recentSeconds
+        self.tiers = tiers
+        self.timeScale = timeScale
+        self.sources = sources
+        self.stats = {}
+        self.samples = 0
+
+    def addStats(self, statSource, timestamp, statValues):
+        if self.sources is not None and statSource not in self.sources:
+            return
+
+        time = timestamp * self.timeScale
+        for caption, value in statValues.items():
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                continue
+
+            series = self.stats.get((statSource, caption))
+            if series is None:
+                series = self.stats[(statSource, caption)] = _CompactedSeries(self.tiers)
+            series.add(time, value, self.recentSeconds)
+            self.samples += 1
+
+    def captions(self):
+        """
+        Returns [(statSource, caption), ...]
+        """
+        return sorted(self.stats)
+
+    def buckets(self, statSource, caption):
+        """
+        The compacted buckets of a stat, oldest first:
+        [{'start', 'seconds', 'count', 'min', 'max', 'mean', 'last'}, ...]
+        The samples still at full resolution are not included. See series().
+        """
+        return [{'start': bucket[0], 'seconds': bucketSeconds, 'count': bucket[1], 'min': bucket[2],
+                 'max': bucket[3], 'mean': bucket[4] / bucket[1], 'last': bucket[5]}
+                for bucketSeconds, bucket in self.stats[(statSource, caption)].allBuckets()]
+
+    def series(self, statSource, caption, maxPoints=None):
+        """
+        Description
+           The whole run of a stat: the mean of each bucket at the start of the bucket,
+           then the samples at full resolution.
+
+        Parameters
+           maxPoints: Downsample to this many points with lttb(). None = All the points.
+
+        Return
+           (times, values) as array('d'). Times are in seconds.
+        """
+        compacted = self.stats[(statSource, caption)]
+        times = array.array('d')
+        values = array.array('d')
+        for bucketSeconds, bucket in compacted.allBuckets():
+            times.append(bucket[0])
+            values.append(bucket[4] / bucket[1])
+
+        for time, value in compacted.recent:
+            times.append(time)
+            values.append(value)
+
+        if maxPoints:
+            return lttb(times, values, maxPoints)
+
+        return times, values
+
+    def points(self):
+        """
+        The amount of samples and buckets kept in memory, over all the stats.
+        """
+        return sum(len(series.recent) + sum(len(buckets) for buckets in series.buckets) for series in self.stats.values())
+
+    def writeCsv(self, csvFile):
+        """
+        Write the buckets and the samples of every stat:
+        Stat Source, Caption, Start, Seconds, Count, Min, Max, Mean, Last. A sample is a bucket of 0 seconds.
+        """
+        with open(csvFile, 'w', newline='') as csvFileObj:
+            writer = csv.writer(csvFileObj)
+            writer.writerow(['Stat Source', 'Caption', 'Start', 'Seconds', 'Count', 'Min', 'Max', 'Mean', 'Last'])
+            for statSource, caption in self.captions():
+                for bucket in self.buckets(statSource, caption):
+                    writer.writerow([statSource, caption, bucket['start'], bucket['seconds'], bucket['count'],
+                                     bucket['min'], bucket['max'], bucket['mean'], bucket['last']])
+
+                for time, value in self.stats[(statSource, caption)].recent:
+                    writer.writerow([statSource, caption, time, 0, 1, value, value, value, value])
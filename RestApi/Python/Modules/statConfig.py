@@ -0,0 +1,191 @@
+"""
+Description
+   Resolve stat captions against the configuredStats of each stat source and plan the
+   fewest PATCH requests that enable exactly these stats and disable the others.
+
+   The configuredStats list accepts filter queries on PATCH, so a range of stats is
+   enabled or disabled in one request:
+      .../configuredStats                            All the stats of the source
+      .../configuredStats?filter="objectID le 10"    The stats with objectID <= 10
+      .../configuredStats?filter="objectID ge 20"    The stats with objectID >= 20
+      .../configuredStats/15                         The stat with objectID 15
+
+   A plan is at most one PATCH of the whole list, then nested ranges on the lowest and
+   on the highest objectIDs, then one PATCH per stat that is still in the wrong state.
+
+Usage:
+   import statConfig
+
+   resolved, unknown = statConfig.resolveStats(catalog, {'HTTPClient': ['HTTP Transactions']})
+   patches = statConfig.planPatches(catalog['HTTPClient'], resolved['HTTPClient'].values())
+
+   With IxL_RestApi, Main.configureStats(statsDict) does the above and applies the plan.
+
+Requirements
+   Python2.7 and Python3
+"""
+
+from __future__ import absolute_import, print_function
+
+
+def resolveStats(catalog, statsDict):
+    """
+    Description
+       Find the objectID of each caption.
+
+    Parameters
+       catalog: {statSource: configuredStats}: configuredStats is the list of {'objectID', 'caption', 'enabled'}.
+       statsDict: {statSource: [caption, ...]}: The stats to find. The format of Main.pollStats.
+
+    Return
+       ({statSource: {caption: objectID}}, {statSource: [unknown caption, ...]})
+       A stat source missing from the catalog has all of its captions unknown.
+    """
+    resolved = {}
+    unknown = {}
+    for statSource, captions in statsDict.items():
+        objectIds = dict((row['caption'], row['objectID']) for row in catalog.get(statSource, []))
+        resolved[statSource] = {}
+        for caption in captions:
+            if caption in objectIds:
+                resolved[statSource][caption] = objectIds[caption]
+            else:
+                unknown.setdefault(statSource, []).append(caption)
+
+    return resolved, unknown
+
+
+def _rangeColors(target):
+    """
+    Description
+       Paint target[:i] with nested ranges that all start at the first stat, the largest one first.
+       k ranges give k runs of states. The stats still in the wrong state get a PATCH each.
+
+    Return
+       (costs, colors): costs[i] is the fewest PATCHes for target[:i].
+       colors(i) returns the state of each stat of target[:i] after the ranges.
+    """
+    # cost[x][value]: The fewest PATCHes for target[:x] when stat x-1 ends up in value. back: The value of stat x-2.
+    cost = [None]
+    back = [None]
+    for x, targetState in enumerate(target):
+        row = {}
+        rowBack = {}
+        for value in (False, True):
+            if x == 0:
+                row[value], rowBack[value] = 1, None
+            else:
+                stay, switch = cost[x][value], cost[x][not value] + 1
+                row[value], rowBack[value] = (stay, value) if stay <= switch else (switch, not value)
+            row[value] += targetState != value
+        cost.append(row)
+        back.append(rowBack)
+
+    costs = [0] + [min(row.values()) for row in cost[1:]]
+
+    def colors(i):
+        states = []
+        value = min((False, True), key=lambda value: cost[i][value]) if i else None
+        for x in range(i, 0, -1):
+            states.append(value)
+            value = back[x][value]
+        return states[::-1]
+
+    return costs, colors
+
+
+def _rangePatches(ids, states, filterOperator):
+    """
+    The nested range PATCHes that paint the states, the largest range first.
+    ids and states are ordered from the end the ranges start at.
+    """
+    patches = []
+    for x in range(len(states) - 1, -1, -1):
+        if x == len(states) - 1 or states[x] != states[x + 1]:
+            patches.append((None, 'objectID {0} {1}'.format(filterOperator, ids[x]), states[x]))
+    return patches
+
+
+def planPatches(configuredStats, enabledIds):
+    """
+    Description
+       The fewest PATCH requests that enable the stats of enabledIds and disable the others.
+
+       A PATCH of the whole list or of a range overwrites the PATCHes before it, so a plan is:
+       at most one PATCH of the whole list, nested "objectID le" ranges on the lowest objectIDs,
+       nested "objectID ge" ranges on the highest objectIDs, then one PATCH per stat left.
+
+    Parameters
+       configuredStats: The list of {'objectID', 'enabled'} of one stat source.
+       enabledIds: The objectIDs to enable.
+
+    Return
+       [(objectID, filterQuery, enabled), ...] in the order to apply them.
+       objectID is None for a PATCH of the list. filterQuery is None for no filter.
+    """
+    rows = sorted(configuredStats, key=lambda row: row['objectID'])
+    ids = [row['objectID'] for row in rows]
+    current = [bool(row.get('enabled')) for row in rows]
+    enabledIds = set(enabledIds)
+    target = [objectId in enabledIds for objectId in ids]
+    total = len(ids)
+
+    # The le ranges paint [0, i). The ge ranges paint [j, total).
+    leftCosts, leftColors = _rangeColors(target)
+    rightCosts, rightColors = _rangeColors(target[::-1])
+
+    best = None
+    # baseline: None = Keep the current states. False/True = PATCH the whole list first.
+    for baseline in (None, False, True):
+        states = current if baseline is None else [baseline] * total
+        mismatched = [0]
+        for state, targetState in zip(states, target):
+            mismatched.append(mismatched[-1] + (state != targetState))
+
+        # bestRight[i]: The cheapest (cost, j) with j >= i. The cost counts the stats of [0, j) in the wrong state.
+        bestRight = [None] * (total + 1)
+        for j in range(total, -1, -1):
+            cost = mismatched[j] + rightCosts[total - j]
+            bestRight[j] = (cost, j) if j == total or cost < bestRight[j + 1][0] else bestRight[j + 1]
+
+        for i in range(total + 1):
+            cost = (baseline is not None) + leftCosts[i] - mismatched[i] + bestRight[i][0]
+            if best is None or cost < best[0]:
+                best = (cost, baseline, i, bestRight[i][1])
+
+    cost, baseline, i, j = best
+    patches = []
+    states = list(current)
+    if baseline is not None:
+        patches.append((None, None, baseline))
+        states = [baseline] * total
+
+    states[:i] = leftColors(i)
+    patches.extend(_rangePatches(ids[:i], states[:i], 'le'))
+    states[j:] = rightColors(total - j)[::-1]
+    patches.extend(_rangePatches(ids[j:][::-1], states[j:][::-1], 'ge'))
+
+    for objectId, state, targetState in zip(ids, states, target):
+        if state != targetState:
+            patches.append((objectId, None, targetState))
+
+    # A range of all the stats is a PATCH of the whole list
+    if total:
+        wholeList = ('objectID le {0}'.format(ids[-1]), 'objectID ge {0}'.format(ids[0]))
+        patches = [(objectId, None if filterQuery in wholeList else filterQuery, enabled)
+                   for objectId, filterQuery, enabled in patches]
+
+    return patches
+
+
+def patchUrl(configuredStatsUrl, objectId, filterQuery):
+    """
+    The URL of a planned PATCH.
+    """
+    if objectId is not None:
+        return '{0}/{1}'.format(configuredStatsUrl, objectId)
+
+    if filterQuery:
+        return '{0}?filter="{1}"'.format(configuredStatsUrl, filterQuery)
+
+    return configuredStatsUrl
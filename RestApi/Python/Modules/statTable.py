@@ -0,0 +1,379 @@
+"""
+Description
+   Join the stats of several stat sources (HTTPClient, HTTPServer, L2-L3 Stats, ...) into one
+   wide table with one row per timestamp and one column per stat.
+
+   The stat sources report at slightly different timestamps and sometimes skip an interval:
+      - outer: A row starts at each sample time, and takes in the samples of every source up to
+               tolerance seconds later. A source without a sample in a row has a gap.
+      - asof:  One row per sample time of the source "on". Each column takes the last sample at
+               or before the row time, at most tolerance seconds old.
+   Gaps are filled with the previous value, a linear interpolation, a constant, or left as NaN.
+
+   All the captions of a stat source share one time axis, so the row of each sample is found
+   once per time axis with a merge of sorted times, and each caption is a plain gather.
+
+   LiveStatTable is a pollStats sink that joins the samples as they are polled. A row is only
+   added once every stat source has reported past it, so the rows never change afterwards.
+
+Usage:
+   import statTable, runCompare
+
+   run = runCompare.loadRunFromCsv('results/17-12-20-089862')
+   table = statTable.joinStats(run, how='outer', tolerance=0.5, fill='previous')
+   table.writeCsv('wide.csv')
+
+   # Live, on every stat polling tick
+   table = statTable.LiveStatTable(tolerance=0.5, maxRows=600)
+   restObj.pollStats(statsDict, statsSinks=[table])
+   print(table.lastRow())
+"""
+
+import array
+import bisect
+import csv
+import heapq
+
+nan = float('nan')
+
+
+class StatTableException(Exception):
+    pass
+
+
+class StatTable:
+    """
+    The wide table: times is an array('d') of the row times in seconds and columns is
+    {(statSource, caption): array('d')} with NaN for a gap.
+    """
+    def __init__(self, times=None, columns=None):
+        self.times = times if times is not None else array.array('d')
+        self.columns = columns if columns is not None else {}
+
+    def __len__(self):
+        return len(self.times)
+
+    def names(self):
+        return list(self.columns)
+
+    def column(self, statSource, caption):
+        return self.columns[(statSource, caption)]
+
+    def row(self, index):
+        """
+        Returns {'time': seconds, (statSource, caption): value, ...}
+        """
+        row = {'time': self.times[index]}
+        for name, column in self.columns.items():
+            row[name] = column[index]
+        return row
+
+    def rows(self):
+        """
+        Yields (time, [value of each column, in the order of names()]).
+        """
+        columns = list(self.columns.values())
+        for index, time in enumerate(self.times):
+            yield time, [column[index] for column in columns]
+
+    def extend(self, other):
+        """
+        Append the rows of another table. A column that only one of them has is NaN in the other rows.
+        """
+        count, otherCount = len(self.times), len(other.times)
+        for name in other.columns:
+            if name not in self.columns:
+                self.columns[name] = array.array('d', [nan]) * count
+
+        for name, column in self.columns.items():
+            column.extend(other.columns[name] if name in other.columns else array.array('d', [nan]) * otherCount)
+
+        self.times.extend(other.times)
+
+    def dropFirstRows(self, count):
+        del self.times[:count]
+        for column in self.columns.values():
+            del column[:count]
+
+    def writeCsv(self, csvFile):
+        """
+        Write the table with the columns named "<statSource>: <caption>". Gaps are empty cells.
+        """
+        with open(csvFile, 'w', newline='') as csvFileObj:
+            writer = csv.writer(csvFileObj)
+            writer.writerow(['Time'] + ['{0}: {1}'.format(statSource, caption) for statSource, caption in self.columns])
+            for time, values in self.rows():
+                writer.writerow([time] + ['' if value != value else value for value in values])
+
+
+def _timeAxes(run, sources=None):
+    """
+    The distinct time axes of a run: {id(times): (times, [((statSource, caption), values), ...])}
+    """
+    axes = {}
+    for statSource in sorted(run):
+        if sources is not None and statSource not in sources:
+            continue
+
+        for caption, (times, values) in run[statSource].items():
+            axes.setdefault(id(times), (times, []))[1].append(((statSource, caption), values))
+
+    return axes
+
+
+def _rowStarts(axes, tolerance):
+    """
+    Merge the sorted time axes into row start times. A row takes in the samples up to tolerance seconds after its start.
+    """
+    grid = array.array('d')
+    for time in heapq.merge(*axes):
+        if not grid or time - grid[-1] > tolerance:
+            grid.append(time)
+    return grid
+
+
+def _outerPositions(times, grid):
+    """
+    For each sample, the index of its row: the last row starting at or before it.
+    """
+    positions = []
+    row = 0
+    lastRow = len(grid) - 1
+    for time in times:
+        while row < lastRow and grid[row + 1] <= time:
+            row += 1
+        positions.append(row)
+    return positions
+
+
+def _asOfPositions(times, grid, tolerance):
+    """
+    For each row, the index of the last sample at or before it, at most tolerance seconds old. -1 = none.
+    """
+    positions = []
+    sample = -1
+    lastSample = len(times) - 1
+    for rowTime in grid:
+        while sample < lastSample and times[sample + 1] <= rowTime:
+            sample += 1
+        if sample >= 0 and (tolerance is None or rowTime - times[sample] <= tolerance):
+            positions.append(sample)
+        else:
+            positions.append(-1)
+    return positions
+
+
+def _fillGaps(column, grid, fill, maxGap, carry=None):
+    """
+    Fill the NaN of a column in place.
+
+    Parameters
+       fill: 'previous', 'linear', None for no fill, or a number.
+       maxGap: Do not fill a gap longer than this many seconds. None = No limit.
+       carry: (time, value) of the last value before the column. Only for 'previous'.
+
+    Return
+       The carry for the next rows.
+    """
+    if fill is None:
+        return carry
+
+    if fill == 'previous':
+        lastTime, lastValue = carry or (None, None)
+        for index, value in enumerate(column):
+            if value == value:
+                lastTime, lastValue = grid[index], value
+            elif lastValue is not None and (maxGap is None or grid[index] - lastTime <= maxGap):
+                column[index] = lastValue
+        return (lastTime, lastValue) if lastValue is not None else carry
+
+    if fill == 'linear':
+        known = [index for index, value in enumerate(column) if value == value]
+        for before, after in zip(known, known[1:]):
+            span = grid[after] - grid[before]
+            if after - before < 2 or (maxGap is not None and span > maxGap):
+                continue
+            slope = (column[after] - column[before]) / span if span else 0.0
+            for index in range(before + 1, after):
+                column[index] = column[before] + slope * (grid[index] - grid[before])
+        return carry
+
+    value = float(fill)
+    for index in range(len(column)):
+        if column[index] != column[index]:
+            column[index] = value
+    return carry
+
+
+def _gather(axes, grid, how, tolerance):
+    """
+    The columns of the table, one gather per caption.
+    """
+    columns = {}
+    for times, captions in axes.values():
+        if how == 'asof':
+            positions = _asOfPositions(times, grid, tolerance)
+            for name, values in captions:
+                columns[name] = array.array('d', (values[position] if position >= 0 else nan for position in positions))
+        else:
+            positions = _outerPositions(times, grid)
+            for name, values in captions:
+                column = array.array('d', [nan]) * len(grid)
+                for sample, row in enumerate(positions):
+                    column[row] = values[sample]
+                columns[name] = column
+
+    return dict(sorted(columns.items()))
+
+
+def joinStats(run, how='outer', on=None, tolerance=0.5, fill='previous', maxGap=None, sources=None):
+    """
+    Description
+       Join the stat sources of a run into one wide table.
+
+    Parameters
+       run: {statSource: {caption: (times, values)}}. See runCompare.loadRunFromStore and loadRunFromCsv.
+       how: 'outer' = A row per group of sample times of all the sources.
+            'asof' = A row per sample time of the source "on".
+       on: The stat source of the rows with how='asof'.
+       tolerance: outer: The samples up to this many seconds after the start of a row are in the row.
+                  Keep it below the polling interval.
+                  asof: The oldest sample a row takes, in seconds before the row time. None = No limit.
+       fill: How to fill the gaps: 'previous', 'linear', None for NaN, or a number. Ex: 0
+       maxGap: Do not fill a gap longer than this many seconds. None = No limit.
+       sources: Only these stat sources. None = All.
+
+    Return
+       A StatTable
+    """
+    if how not in ('outer', 'asof'):
+        raise StatTableException('joinStats: how must be outer or asof: {0}'.format(how))
+
+    axes = _timeAxes(run, sources)
+    if how == 'asof':
+        if on not in run:
+            raise StatTableException('joinStats: how=asof needs the stat source of the rows with on=. Got: {0}'.format(on))
+        grid = _rowStarts([times for times, captions in _timeAxes(run, [on]).values()], 0)
+    else:
+        grid = _rowStarts([times for times, captions in axes.values()], tolerance)
+
+    columns = _gather(axes, grid, how, tolerance)
+    for column in columns.values():
+        _fillGaps(column, grid, fill, maxGap)
+
+    return StatTable(grid, columns)
+
+
+class LiveStatTable:
+    def __init__(self, tolerance=0.5, fill='previous', maxGap=None, maxRows=None, timeScale=0.001, sources=None):
+        """
+        Description
+           A pollStats sink that keeps the outer join of the polled stats up to date.
+           Each row is added once every stat source has reported past it.
+           pollStats calls flush() at the end of the test for the last rows.
+
+        Parameters
+           tolerance, fill, maxGap: See joinStats. fill='linear' is not available live.
+           maxRows: Keep only the latest rows. None = Keep all of them.
+           timeScale: Multiply the polled timestamps by this to get seconds. pollStats timestamps are milliseconds.
+           sources: Only these stat sources. None = All.
+        """
+        if fill == 'linear':
+            raise StatTableException('LiveStatTable: fill=linear needs the samples after a gap. Use joinStats after the run.')
+
+        self.tolerance = tolerance
+        self.fill = fill
+        self.maxGap = maxGap
+        self.maxRows = maxRows
+        self.timeScale = timeScale
+        self.sources = sources
+        self.table = StatTable()
+        # The samples not in a row yet: {statSource: (times, {caption: values})}
+        self.pending = {}
+        self.lastTimes = {}
+        self.carry = {}
+        self.nextRowStart = float('-inf')
+        self.lateSamples = 0
+
+    def addStats(self, statSource, timestamp, statValues):
+        if self.sources is not None and statSource not in self.sources:
+            return
+
+        time = timestamp * self.timeScale
+        if time < self.nextRowStart:
+            # Older than the rows already added. Ex: a stat source that reported late.
+            self.lateSamples += 1
+            return
+
+        times, captions = self.pending.setdefault(statSource, (array.array('d'), {}))
+        for caption, value in statValues.items():
+            if caption not in captions:
+                captions[caption] = array.array('d', [nan]) * len(times)
+            try:
+                captions[caption].append(float(value))
+            except (TypeError, ValueError):
+                captions[caption].append(nan)
+
+        times.append(time)
+        for caption, values in captions.items():
+            if len(values) < len(times):
+                values.append(nan)
+
+        self.lastTimes[statSource] = max(time, self.lastTimes.get(statSource, time))
+        self.update()
+
+    def update(self, final=False):
+        """
+        Add the rows every stat source has reported past. final=True adds all the pending rows.
+
+        Return
+           The amount of rows added.
+        """
+        if not self.lastTimes:
+            return 0
+
+        watermark = float('inf') if final else min(self.lastTimes.values()) - self.tolerance
+        grid = _rowStarts([times for times, captions in self.pending.values()], self.tolerance)
+        # A row is final once all the samples it could take in are known
+        finalRows = bisect.bisect_right(grid, watermark)
+        if finalRows == 0:
+            return 0
+
+        nextRowStart = grid[finalRows] if finalRows < len(grid) else float('inf')
+        grid = grid[:finalRows]
+        axes = {}
+        for statSource, (times, captions) in self.pending.items():
+            consumed = bisect.bisect_left(times, nextRowStart)
+            axes[statSource] = (times[:consumed], [((statSource, caption), values[:consumed]) for caption, values in captions.items()])
+            del times[:consumed]
+            for values in captions.values():
+                del values[:consumed]
+
+        newRows = StatTable(grid, _gather(axes, grid, 'outer', self.tolerance))
+        for name, column in newRows.columns.items():
+            self.carry[name] = _fillGaps(column, grid, self.fill, self.maxGap, self.carry.get(name))
+
+        # The columns that did not report in these rows are still filled from the previous rows
+        if self.fill == 'previous':
+            for name in self.table.columns:
+                if name not in newRows.columns:
+                    column = array.array('d', [nan]) * len(grid)
+                    self.carry[name] = _fillGaps(column, grid, self.fill, self.maxGap, self.carry.get(name))
+                    newRows.columns[name] = column
+
+        self.table.extend(newRows)
+        self.nextRowStart = nextRowStart
+
+        if self.maxRows and len(self.table) > self.maxRows + self.maxRows // 4:
+            self.table.dropFirstRows(len(self.table) - self.maxRows)
+
+        return len(grid)
+
+    def flush(self):
+        self.update(final=True)
+
+    def lastRow(self):
+        """
+        The latest row: {'time': seconds, (statSource, caption): value, ...}. None before the first row.
+        """
+        return self.table.row(len(self.table) - 1) if len(self.table) else None
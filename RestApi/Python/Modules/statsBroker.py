@@ -0,0 +1,354 @@
+"""
+Description
+   One stats poller per session, shared by every local consumer of its stats.
+
+   A Robot suite, a live dashboard, a CSV recorder and an SLA watchdog that each poll
+   /ixLoad/stats/*/values multiply the load on the gateway. The broker runs pollStats once
+   and sends each new sample to every subscriber over a Unix socket (or a localhost TCP
+   port where Unix sockets are not available). Every subscriber gets the same samples,
+   each timestamp of each stat source once.
+
+   Each subscriber has its own bounded queue and sender thread, so a slow subscriber never
+   delays the poller or the other subscribers. When its queue is full, the oldest samples are
+   dropped and the subscriber is told how many, or it is disconnected (overflow='disconnect').
+
+   The protocol is one JSON object per line:
+      subscriber -> broker:  {"sources": ["HTTPClient"]}   (null = all the stat sources)
+      broker -> subscriber:  {"statSource": "HTTPClient", "timestamp": 2000, "values": {...}}
+                             {"event": "dropped", "count": 12}
+                             {"event": "end"}
+
+Usage:
+   # In the script that runs the test
+   broker = restObj.startStatsBroker(statsDict)
+   print(broker.address)
+
+   # In any local process
+   import statsBroker
+
+   for sample in statsBroker.StatsSubscriber(address, sources=['HTTPClient']):
+       print(sample['timestamp'], sample['values']['HTTP Transactions'])
+"""
+
+import collections
+import json
+import os
+import socket
+import tempfile
+import threading
+
+
+class StatsBrokerException(Exception):
+    pass
+
+
+class _BrokerStopped(Exception):
+    pass
+
+
+def defaultAddress(apiServerIp, sessionId):
+    """
+    The address of the broker of a session: a Unix socket in the temp folder.
+    """
+    return os.path.join(tempfile.gettempdir(), 'ixLoadStats_{0}_{1}.sock'.format(apiServerIp, sessionId))
+
+
+def _socketFamily(address):
+    if isinstance(address, str):
+        if not hasattr(socket, 'AF_UNIX'):
+            raise StatsBrokerException('Unix sockets are not available here. Use a (host, port) address.')
+        return socket.AF_UNIX
+
+    return socket.AF_INET
+
+
+def _encode(message):
+    return (json.dumps(message) + '\n').encode('utf-8')
+
+
+class _Subscriber(threading.Thread):
+    """
+    Sends the samples queued for one subscriber from its own thread.
+    """
+    def __init__(self, broker, connection, sources):
+        threading.Thread.__init__(self, name='StatsSubscriber', daemon=True)
+        self.broker = broker
+        self.connection = connection
+        self.sources = set(sources) if sources else None
+        self.queue = collections.deque()
+        self.condition = threading.Condition()
+        self.closed = False
+        self.finishing = False
+        self.dropped = 0
+        self.droppedNotSent = 0
+        self.sent = 0
+
+    def put(self, statSource, message):
+        """
+        Queue a sample. Returns False once the subscriber is gone.
+        """
+        if self.sources is not None and statSource is not None and statSource not in self.sources:
+            return True
+
+        with self.condition:
+            if self.closed:
+                return False
+
+            if len(self.queue) >= self.broker.queueSize:
+                if self.broker.overflow == 'disconnect':
+                    self.closed = True
+                    self.condition.notify()
+                    return False
+
+                self.queue.popleft()
+                self.dropped += 1
+                self.droppedNotSent += 1
+
+            self.queue.append(message)
+            self.condition.notify()
+            return True
+
+    def finish(self):
+        """
+        Close the connection once the queued samples are sent.
+        """
+        with self.condition:
+            self.finishing = True
+            self.condition.notify()
+
+    def run(self):
+        try:
+            while True:
+                with self.condition:
+                    while not self.queue and not self.closed and not self.finishing:
+                        self.condition.wait()
+
+                    if self.closed or (self.finishing and not self.queue):
+                        break
+
+                    messages = list(self.queue)
+                    self.queue.clear()
+                    if self.droppedNotSent:
+                        messages.insert(0, _encode({'event': 'dropped', 'count': self.droppedNotSent}))
+                        self.droppedNotSent = 0
+
+                # Send outside the lock. The poller keeps queueing meanwhile.
+                self.connection.sendall(b''.join(messages))
+                self.sent += len(messages)
+        except OSError:
+            pass
+        finally:
+            with self.condition:
+                self.closed = True
+            self.connection.close()
+            self.broker._removeSubscriber(self)
+
+
+class StatsBroker:
+    def __init__(self, restObj, statsDict=None, address=None, pollStatInterval=2, queueSize=1000,
+                 overflow='dropOldest', replay=100):
+        """
+        Description
+           Poll the stats of a session once and serve them to local subscribers.
+
+        Parameters
+           restObj: An IxL_RestApi.Main object connected to a session.
+           statsDict: The stats to poll, in the format of pollStats. Every subscriber gets all the values
+                      of these stat sources. None = All the stat sources of the loaded config.
+           address: A Unix socket path, or a (host, port) tuple for TCP. None = defaultAddress().
+           pollStatInterval: Seconds between two stat polls.
+           queueSize: The amount of samples queued for a subscriber that reads slower than the poller.
+           overflow: 'dropOldest' = Drop the oldest queued samples of a full queue and tell the subscriber.
+                     'disconnect' = Disconnect a subscriber whose queue is full.
+           replay: The amount of latest samples sent to a new subscriber first.
+        """
+        if overflow not in ('dropOldest', 'disconnect'):
+            raise StatsBrokerException('overflow must be dropOldest or disconnect: {0}'.format(overflow))
+
+        self.restObj = restObj
+        self.statsDict = statsDict
+        self.address = address or defaultAddress(restObj.apiServerIp, restObj.sessionId)
+        self.pollStatInterval = pollStatInterval
+        self.queueSize = queueSize
+        self.overflow = overflow
+        self.lock = threading.Lock()
+        self.subscribers = []
+        self.history = collections.deque(maxlen=replay)
+        self.samples = 0
+        self.stopEvent = threading.Event()
+        self.finished = threading.Event()
+        self.pollError = None
+        self.server = None
+
+    def start(self):
+        """
+        Listen on the address and start polling. Raises StatsBrokerException if a broker already serves the address.
+        """
+        family = _socketFamily(self.address)
+        if family == socket.AF_UNIX and os.path.exists(self.address):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.address)
+                probe.close()
+                raise StatsBrokerException('A stats broker already polls this session: {0}'.format(self.address))
+            except OSError:
+                # Left over by a broker that did not stop cleanly
+                os.unlink(self.address)
+
+        self.server = socket.socket(family, socket.SOCK_STREAM)
+        self.server.bind(self.address)
+        self.server.listen(16)
+        if family == socket.AF_INET:
+            self.address = self.server.getsockname()
+
+        threading.Thread(target=self._accept, name='StatsBrokerAccept', daemon=True).start()
+        self.pollThread = threading.Thread(target=self._poll, name='StatsBrokerPoller', daemon=True)
+        self.pollThread.start()
+        return self
+
+    def _poll(self):
+        statsDict = self.statsDict
+        try:
+            if statsDict is None:
+                statsDict = {statSource: [] for statSource in self.restObj.getStatSources()}
+
+            self.restObj.pollStats(statsDict, pollStatInterval=self.pollStatInterval, statsSinks=[self])
+        except _BrokerStopped:
+            pass
+        except Exception as errMsg:
+            self.pollError = errMsg
+            self.restObj.logError('StatsBroker: pollStats failed: {0}'.format(errMsg))
+        finally:
+            # Under the lock, so that a subscriber accepted from now on gets the end from _accept
+            with self.lock:
+                self.finished.set()
+                subscribers = list(self.subscribers)
+            for subscriber in subscribers:
+                subscriber.put(None, _encode({'event': 'end'}))
+                subscriber.finish()
+
+    def addStats(self, statSource, timestamp, statValues):
+        """
+        The pollStats sink: each new timestamp of each stat source, once.
+        """
+        if self.stopEvent.is_set():
+            raise _BrokerStopped()
+
+        self.samples += 1
+        self._broadcast(statSource, _encode({'statSource': statSource, 'timestamp': timestamp, 'values': statValues}))
+
+    def _broadcast(self, statSource, message):
+        with self.lock:
+            if statSource is not None:
+                self.history.append((statSource, message))
+            subscribers = list(self.subscribers)
+
+        for subscriber in subscribers:
+            subscriber.put(statSource, message)
+
+    def _accept(self):
+        while not self.stopEvent.is_set():
+            try:
+                connection, peer = self.server.accept()
+            except OSError:
+                break
+
+            try:
+                connection.settimeout(5)
+                hello = b''
+                while not hello.endswith(b'\n'):
+                    data = connection.recv(4096)
+                    if not data:
+                        break
+                    hello += data
+                connection.settimeout(None)
+                sources = json.loads(hello.decode('utf-8') or '{}').get('sources')
+            except (OSError, ValueError):
+                connection.close()
+                continue
+
+            subscriber = _Subscriber(self, connection, sources)
+            with self.lock:
+                for statSource, message in self.history:
+                    subscriber.put(statSource, message)
+                if self.finished.is_set():
+                    subscriber.put(None, _encode({'event': 'end'}))
+                    subscriber.finish()
+                self.subscribers.append(subscriber)
+            subscriber.start()
+
+    def _removeSubscriber(self, subscriber):
+        with self.lock:
+            if subscriber in self.subscribers:
+                self.subscribers.remove(subscriber)
+
+    def stats(self):
+        """
+        Returns {'samples': polled samples, 'subscribers': [{'sources', 'queued', 'sent', 'dropped'}, ...]}
+        """
+        with self.lock:
+            return {'samples': self.samples,
+                    'subscribers': [{'sources': sorted(subscriber.sources) if subscriber.sources else None,
+                                     'queued': len(subscriber.queue), 'sent': subscriber.sent,
+                                     'dropped': subscriber.dropped} for subscriber in self.subscribers]}
+
+    def wait(self, timeout=None):
+        """
+        Block until the test is done and pollStats returned.
+        """
+        return self.finished.wait(timeout)
+
+    def stop(self):
+        """
+        Stop polling at the next sample, and close the subscribers once their queues are sent.
+        """
+        self.stopEvent.set()
+        if self.server:
+            self.server.close()
+            if _socketFamily(self.address) == socket.AF_UNIX and os.path.exists(self.address):
+                os.unlink(self.address)
+
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for subscriber in subscribers:
+            subscriber.finish()
+
+
+class StatsSubscriber:
+    def __init__(self, address, sources=None, timeout=None):
+        """
+        Description
+           Connect to the stats broker of a session. Iterate it for the samples.
+
+        Parameters
+           address: The address of the broker. See StatsBroker.address and defaultAddress().
+           sources: <list>: Only get the samples of these stat sources. None = All.
+           timeout: Seconds to wait for a sample before socket.timeout is raised. None = No limit.
+        """
+        self.connection = socket.socket(_socketFamily(address), socket.SOCK_STREAM)
+        self.connection.connect(address)
+        self.connection.settimeout(timeout)
+        self.connection.sendall(_encode({'sources': sources}))
+        self.reader = self.connection.makefile('rb')
+        self.dropped = 0
+        self.ended = False
+
+    def __iter__(self):
+        """
+        Yields {'statSource', 'timestamp', 'values'} until the test is done.
+        """
+        for line in self.reader:
+            message = json.loads(line.decode('utf-8'))
+            if message.get('event') == 'dropped':
+                self.dropped += message['count']
+            elif message.get('event') == 'end':
+                self.ended = True
+                break
+            else:
+                yield message
+
+        self.close()
+
+    def close(self):
+        self.reader.close()
+        self.connection.close()
@@ -0,0 +1,202 @@
+"""
+Description
+   Record a span-based timeline of a test run and write it in the Chrome
+   trace-event format. Open the file in chrome://tracing or https://ui.perfetto.dev
+   to see where the wall-clock time goes and which waits overlap.
+
+   Events are appended to the file as each span finishes, using the JSON array
+   format of the trace-event spec. A run that crashes still leaves a readable trace.
+
+Usage:
+   tracer = traceEvents.TraceRecorder('ixLoadTrace.json')
+
+   with tracer.span('connect', ixLoadVersion='9.00.0.347'):
+       with tracer.span('verifyStatus', url=url):
+           ...
+
+   tracer.close()
+
+Requirements
+   Python2.7 and Python3
+"""
+
+from __future__ import absolute_import, print_function
+import atexit
+import json
+import os
+import threading
+import time
+
+# time.perf_counter does not exist in Python2.7
+_clock = getattr(time, 'perf_counter', time.time)
+
+
+class _NoSpan(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, tb):
+        return False
+
+
+class _Span(object):
+    def __init__(self, tracer, name, category, args):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        self.start = self.tracer.now()
+        self.tracer._pushSpan(self)
+        return self
+
+    def __exit__(self, excType, excValue, tb):
+        duration = self.tracer.now() - self.start
+        self.tracer._popSpan(self)
+        if excType is not None:
+            self.args['error'] = '{0}: {1}'.format(excType.__name__, excValue)
+
+        parent = self.tracer.currentSpan()
+        for listener in self.tracer.listeners:
+            listener(self.name, self.category, self.tracer.startEpoch + self.start / 1000000.0, duration / 1000000.0,
+                     parent.name if parent else None, self.args)
+
+        self.tracer.addEvent({'name': self.name, 'cat': self.category, 'ph': 'X',
+                              'ts': self.start, 'dur': duration, 'args': self.args})
+        return False
+
+
+class TraceRecorder(object):
+    def __init__(self, traceFile=None, processName='IxLoad'):
+        """
+        Description
+           Collect spans and write them to a Chrome trace-event JSON file.
+
+        Parameters
+           traceFile: <str>: The trace file to create. None = no trace file. Every span is a
+                      no-op unless a listener is added.
+           processName: <str>: The process name shown in the trace viewer.
+        """
+        self.traceFile = traceFile
+        self.enabled = traceFile is not None
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.namedThreads = set()
+        self.fileObj = None
+        self.listeners = []
+        self.startClock = _clock()
+        self.startEpoch = time.time()
+
+        if self.enabled:
+            self.fileObj = open(traceFile, 'w')
+            self.fileObj.write('[\n')
+            self.firstEvent = True
+            self.addEvent({'name': 'process_name', 'ph': 'M', 'args': {'name': processName}})
+            atexit.register(self.close)
+
+    def addListener(self, listener):
+        """
+        Description
+           Call a function each time a span finishes, even if no trace file is written.
+           Ex: To store the phase timings of a run.
+
+        Parameters
+           listener: Called as listener(name, category, startTime, duration, parentName, args).
+                     startTime is in seconds since the epoch and duration in seconds.
+        """
+        self.listeners.append(listener)
+        self.enabled = True
+
+    def removeListener(self, listener):
+        """
+        Description
+           Stop calling a function added by addListener. Spans are no-ops again once no trace
+           file is written and no listener is left.
+        """
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+        self.enabled = self.traceFile is not None or bool(self.listeners)
+
+    def now(self):
+        """
+        Returns the elapsed time in microseconds since the recorder was created.
+        """
+        return int((_clock() - self.startClock) * 1000000)
+
+    def span(self, name, category='ixload', **args):
+        """
+        Description
+           A context manager that records the time spent inside the with block.
+           Spans opened inside other spans on the same thread are nested in the viewer.
+
+        Parameters
+           name: <str>: The span name. Ex: connect, verifyStatus, pollStats.
+           category: <str>: The trace-event category.
+           args: Extra details shown when selecting the span.
+        """
+        if not self.enabled:
+            return _NoSpan()
+
+        return _Span(self, name, category, args)
+
+    def instant(self, name, category='ixload', **args):
+        """
+        Record a single point in time. Ex: a state transition.
+        """
+        if self.enabled:
+            self.addEvent({'name': name, 'cat': category, 'ph': 'i', 's': 't', 'ts': self.now(), 'args': args})
+
+    def currentSpan(self):
+        stack = getattr(self.local, 'stack', [])
+        if stack:
+            return stack[-1]
+
+    def _pushSpan(self, span):
+        if not hasattr(self.local, 'stack'):
+            self.local.stack = []
+        self.local.stack.append(span)
+
+    def _popSpan(self, span):
+        stack = self.local.stack
+        if stack and stack[-1] is span:
+            stack.pop()
+
+    def addEvent(self, event):
+        if not self.enabled:
+            return
+
+        thread = threading.current_thread()
+        event['pid'] = self.pid
+        event['tid'] = thread.ident
+
+        with self.lock:
+            if self.fileObj is None:
+                return
+
+            if thread.ident not in self.namedThreads:
+                self.namedThreads.add(thread.ident)
+                self._write({'name': 'thread_name', 'ph': 'M', 'pid': self.pid, 'tid': thread.ident,
+                             'args': {'name': thread.name}})
+            self._write(event)
+
+    def _write(self, event):
+        if not self.firstEvent:
+            self.fileObj.write(',\n')
+
+        self.firstEvent = False
+        self.fileObj.write(json.dumps(event))
+        self.fileObj.flush()
+
+    def close(self):
+        """
+        Terminate the JSON array and close the trace file.
+        """
+        with self.lock:
+            if self.fileObj is None:
+                return
+
+            self.fileObj.write('\n]\n')
+            self.fileObj.close()
+            self.fileObj = None
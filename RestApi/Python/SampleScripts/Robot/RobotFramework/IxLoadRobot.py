@@ -138,6 +138,8 @@ class IxLoadRobot(object):
         _le - lower or equal to_
         
         _ge - greater or equal to_
+
+        The server evaluates the filters. After `Enable Local Filters`, they are evaluated locally on a cached copy of the list.
         
         Example: Retrieve the active test from the IxLoad Test. On the active test retrieve the list of communities(nettraffics) with a specific name.
 
@@ -150,6 +152,22 @@ class IxLoadRobot(object):
         '''
         return self._run_keyword("cget", kwargs)
 
+    def enable_local_filters(self, **kwargs):
+        '''Evaluate the Cget filters locally, on lists fetched once and kept for a number of seconds.
+
+        A loop of filtered Cget calls on the same list then sends one request instead of one per call. The lists are fetched again after the given seconds, or when Config, Append Item, Delete Item, Clear List or an operation changes them.
+
+        Only use it for lists that do not change on their own (not stats or test states) and that no other session or script changes. When no object matches locally, the server filter is used. seconds=0 turns it off.
+
+        It needs restFilter.py, from RestApi/Python/Modules, copied next to ixLoadRobotFwWrapper.py in the RobotFramework folder of the IxLoad installation.
+
+        Example:
+
+            _Enable Local Filters  seconds=60_
+
+        '''
+        return self._run_keyword("enable_local_filters", kwargs)
+
     def config(self, object, **kwargs):
         '''Modify a primitive field on a specified object.
 
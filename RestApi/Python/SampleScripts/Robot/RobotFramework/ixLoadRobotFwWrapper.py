@@ -1,4 +1,6 @@
 import sys, os
+import copy
+import time
 
 import IxRestUtils as IxRestUtils
 import IxLoadUtils as IxLoadUtils
@@ -20,6 +22,10 @@ class ixLoadRobotFwWrapper(object):
 
     def __init__(self, ):
         self.connection = None
+        # Evaluate the Cget filters locally on lists kept this many seconds. None = Off, the server filters them.
+        self.localFilterSeconds = None
+        # { list url : (fetch time, list object, restFilter.IndexedList) }
+        self.filteredLists = {}
 
     def missingKeywordFunc(self, keyword, kwargs):
         raise Exception("Keyword %s does not exist." % (keyword))
@@ -58,6 +64,7 @@ class ixLoadRobotFwWrapper(object):
         return self.connection.httpGet(newSessionUrl, errorCodes=ixLoadRobotFwWrapper.kErrorCodes)
 
     def delete_session(self, session=None):
+        self.invalidateFilteredLists(session._url_)
         return self.connection.httpDelete(session._url_)
 
     def get_ixload_test(self, session=None):
@@ -175,12 +182,75 @@ class ixLoadRobotFwWrapper(object):
                 url = "%s/%s" % (object._url_, field)
 
                 if filter is not None:
+                    if self.localFilterSeconds:
+                        filteredList = self.cgetFiltered(url, filter)
+                        if filteredList is not None:
+                            return filteredList
+
                     url = "%s?filter=%s" % (url, filter)
 
                 return self.connection.httpGet(url, errorCodes=ixLoadRobotFwWrapper.kErrorCodes)
         except Exception:
             raise Exception("Error on executing Keyword 'Cget': Failed to get field '%s' on object %s. Object fields : %s" %(field, object, object.jsonOptions))
 
+    def enable_local_filters(self, seconds=30):
+        '''
+            This method makes Cget evaluate its filters locally, on lists kept for the given amount of seconds,
+            or until a keyword of this library changes them. Only for lists that do not change on their own
+            (not stats or run states) and that are not changed by another session. seconds=0 turns it off.
+            It needs restFilter.py of RestApi/Python/Modules, next to this file or on the Python path.
+        '''
+        if seconds:
+            # Fail now rather than at the first filtered Cget
+            import restFilter
+
+        self.localFilterSeconds = float(seconds) if seconds else None
+        self.invalidateFilteredLists()
+
+    def cgetFiltered(self, url, filter):
+        '''
+            This method evaluates a Cget filter locally, on the list at url.
+            It returns a list object of the same type as the connection returns, or None if no object matches,
+            if url is not a list or if the filter is not known locally: the server filter then decides, since it
+            can match more loosely than the local eq.
+        '''
+        import restFilter
+
+        try:
+            restFilter.compile(filter)
+        except restFilter.RestFilterException:
+            return None
+
+        cached = self.filteredLists.get(url)
+        if cached is None or time.time() - cached[0] > self.localFilterSeconds:
+            listObj = self.connection.httpGet(url, errorCodes=ixLoadRobotFwWrapper.kErrorCodes)
+            if not listObj.isContainerObject() or not isinstance(listObj, list):
+                return None
+            cached = self.filteredLists[url] = (time.time(), listObj, restFilter.IndexedList(listObj))
+
+        fetchTime, listObj, indexedList = cached
+        matches = indexedList.query(filter)
+        if not matches:
+            return None
+
+        # The same list type and attributes (_url_, ...) as the list returned by the connection
+        filteredList = copy.copy(listObj)
+        del filteredList[:]
+        filteredList.extend(matches)
+        return filteredList
+
+    def invalidateFilteredLists(self, url=None):
+        '''
+            This method drops the cached lists that a change on url can change: the lists above it and under it.
+            Without url, all of them.
+        '''
+        url = IxLoadUtils.stripApiAndVersionFromURL(url).lower().rstrip('/') if url else None
+
+        for listUrl in list(self.filteredLists.keys()):
+            listPath = IxLoadUtils.stripApiAndVersionFromURL(listUrl).lower().rstrip('/')
+            if url is None or listPath == url or listPath.startswith(url + '/') or url.startswith(listPath + '/'):
+                del self.filteredLists[listUrl]
+
     def config(self, **kwargs):
         if not '_object_' in kwargs:
             raise Exception("No object provided to Config keyword")
@@ -192,6 +262,7 @@ class ixLoadRobotFwWrapper(object):
 
         reply = self.connection.httpPatch(url, kwargs)
         self.checkRequestReply("Config", kwargs, reply)
+        self.invalidateFilteredLists(url)
 
         self.connection.refreshData(object)
 
@@ -208,6 +279,7 @@ class ixLoadRobotFwWrapper(object):
         reply = self.connection.httpDelete(object._url_)
 
         self.checkRequestReply("Clear List", kwargs, reply)
+        self.invalidateFilteredLists(object._url_)
         self.connection.refreshData(object)
 
     def appendItem(self, **kwargs):
@@ -222,6 +294,7 @@ class ixLoadRobotFwWrapper(object):
 
         reply = self.connection.httpPost(object._url_, kwargs)
         self.checkRequestReply("Append Item", kwargs, reply)
+        self.invalidateFilteredLists(object._url_)
 
         newObjLocation = reply.headers.get("Location")
         newObjLocation = IxLoadUtils.stripApiAndVersionFromURL(newObjLocation)
@@ -236,6 +309,7 @@ class ixLoadRobotFwWrapper(object):
 
         reply = self.connection.httpDelete(kwargs['_object_']._url_)
         self.checkRequestReply("Delete Item", kwargs, reply)
+        self.invalidateFilteredLists(kwargs['_object_']._url_)
 
     def runKeyword(self, keyword, **kwargs):
         params = ixLoadRobotFwWrapper.processArguments(**kwargs)
@@ -280,6 +354,9 @@ class ixLoadRobotFwWrapper(object):
 
             IxLoadUtils.performGenericOperation(self.connection, operationUrl, params)
 
+            # An operation can change any list of the session. Ex: loadTest
+            self.invalidateFilteredLists()
+
         except Exception as ex:
             status = 0
             error = str(ex)